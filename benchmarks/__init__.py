@@ -0,0 +1,11 @@
+"""
+Benchmarks, run from the project root as modules: python -m benchmarks.<name>.
+Django is set up here so that the modules can import the project directly.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dent_image.settings")
+django.setup()
@@ -0,0 +1,81 @@
+"""
+Memory and speed of the streaming export by number of annotations.
+
+    python -m benchmarks.export --annotations 10000 100000 1000000
+
+For every size, test data (100 annotations per image) is inserted in the
+configured database inside a transaction that is rolled back at the end, then
+exported as NDJSON and COCO. The peak of the memory allocated by Python while
+exporting stays the same whatever the size.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from django.db import connection, transaction
+from django.http import QueryDict
+
+from dent_image_api.export import Export
+from dent_image_api.models import Annotation, Image
+
+ANNOTATIONS_PER_IMAGE = 100
+
+
+def create_data(annotations_count):
+    images = Image.objects.bulk_create(
+        Image(name=f"benchmark {i}", file=f"images/benchmark_{i}.jpg")
+        for i in range(max(annotations_count // ANNOTATIONS_PER_IMAGE, 1))
+    )
+    # plain SQL, creating millions of model instances would take longer than the export
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Annotation._meta.db_table} (
+                image_id, class_id, shape, tags, meta, version, updated_at,
+                confirmed, confidence_percent, min_x, min_y, max_x, max_y
+            )
+            SELECT image.id, 'tooth',
+                '{{"start_x": 10, "start_y": 20, "end_x": 110, "end_y": 220}}',
+                '["48"]', '{{"confirmed": true, "confidence_percent": 0.9}}',
+                1, now(), true, 0.9, 10, 20, 110, 220
+            FROM unnest(%s::bigint[]) AS image(id), generate_series(1, %s)
+            LIMIT %s
+            """,
+            [[image.pk for image in images], ANNOTATIONS_PER_IMAGE, annotations_count],
+        )
+
+
+def measure(export_format):
+    export = Export(QueryDict())
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in export.chunks(export_format))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{export_format:<7} {export.annotations:>9} annotations   "
+        f"{size / 2**20:8.1f} MiB in {elapsed:6.1f} s   "
+        f"{export.annotations / elapsed:9.0f} annotations/s   "
+        f"peak memory {peak / 2**20:6.2f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--annotations", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    args = parser.parse_args()
+
+    for annotations_count in args.annotations:
+        with transaction.atomic():
+            create_data(annotations_count)
+            for export_format in ("ndjson", "coco"):
+                measure(export_format)
+            transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare the encoding and decoding speed and size of the API formats on an image
+with realistic annotations.
+
+    python -m benchmarks.formats --boxes 500
+"""
+
+import argparse
+import io
+import json
+import random
+import statistics
+import time
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from dent_image_api.formats import json_loads, msgpack, orjson
+from dent_image_api.parsers import FastJSONParser, MessagePackParser
+from dent_image_api.renderers import FastJSONRenderer, MessagePackRenderer
+
+
+def image_payload(boxes):
+    """An image as returned by the API, with `boxes` detected annotations."""
+    rng = random.Random(0)
+    annotations = []
+    for i in range(boxes):
+        x, y = rng.randrange(3000), rng.randrange(1500)
+        annotations.append(
+            {
+                "id": 100000 + i,
+                "image": 1,
+                "class_id": rng.choice(["tooth", "caries", "filling", "crown"]),
+                "shape": {
+                    "start_x": x,
+                    "start_y": y,
+                    "end_x": x + rng.randrange(20, 200),
+                    "end_y": y + rng.randrange(20, 300),
+                },
+                "tags": [str(rng.randrange(11, 49))],
+                "meta": {
+                    "confirmed": rng.random() < 0.5,
+                    "confidence_percent": round(rng.random(), 4),
+                    "model": "detector-v3",
+                },
+                "relations": [{"type": "inside", "id": 100000 + rng.randrange(boxes)}],
+                "surface": rng.sample(["mesial", "distal", "occlusal", "buccal"], 2),
+            }
+        )
+    return {
+        "id": 1,
+        "file": "http://0.0.0.0:8080/media/images/panoramic.jpg",
+        "name": "panoramic",
+        "annotations": annotations,
+    }
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--boxes", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    data = image_payload(args.boxes)
+    codecs = [("json", JSONRenderer(), JSONParser())]
+    if orjson is not None:
+        codecs.append(("json (orjson)", FastJSONRenderer(), FastJSONParser()))
+    if msgpack is not None:
+        codecs.append(("msgpack", MessagePackRenderer(), MessagePackParser()))
+
+    print(f"image with {args.boxes} annotations, median of {args.repeat} runs")
+    for name, renderer, parser in codecs:
+        encoded = renderer.render(data)
+        assert parser.parse(io.BytesIO(encoded)) == data
+        encode_ms = measure(lambda: renderer.render(data), args.repeat)
+        decode_ms = measure(lambda: parser.parse(io.BytesIO(encoded)), args.repeat)
+        print(
+            f"{name:<14} encode {encode_ms:7.2f} ms   decode {decode_ms:7.2f} ms   "
+            f"size {len(encoded) / 1024:7.1f} KiB"
+        )
+
+    # the `annotations` field of multipart uploads
+    annotations = json.dumps(data["annotations"])
+    stdlib_ms = measure(lambda: json.loads(annotations), args.repeat)
+    fast_ms = measure(lambda: json_loads(annotations), args.repeat)
+    print(
+        f"multipart annotations field   json.loads {stdlib_ms:7.2f} ms   "
+        f"json_loads {fast_ms:7.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
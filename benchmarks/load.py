@@ -0,0 +1,145 @@
+"""
+HTTP load test of a running server, with optionally slow clients.
+
+    python -m benchmarks.load http://0.0.0.0:8080/api/v1/async/images/1/ \
+        --concurrency 1000 --duration 30 --read-rate 16384
+
+Every client opens a connection, sends one GET and reads the whole response,
+at most `--read-rate` bytes per second when given (a viewer on a slow network),
+then starts over. Requests still running after `--duration` are cancelled and
+reported as unfinished.
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import time
+from urllib.parse import urlsplit
+
+READ_SIZE = 4096
+
+
+async def connect(host, port, receive_buffer):
+    # a small receive window, as over the internet, so that the server cannot
+    # hand the whole response to the kernel at once
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.setblocking(False)
+    try:
+        await asyncio.get_running_loop().sock_connect(sock, (host, port))
+    except OSError:
+        sock.close()
+        raise
+    return await asyncio.open_connection(sock=sock)
+
+
+async def fetch(url, read_rate, receive_buffer):
+    """GET `url` over a new connection, return (status, body size)."""
+    parts = urlsplit(url)
+    reader, writer = await connect(parts.hostname, parts.port or 80, receive_buffer)
+    try:
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        size = 0
+        while chunk := await reader.read(READ_SIZE):
+            size += len(chunk)
+            if read_rate:
+                await asyncio.sleep(len(chunk) / read_rate)
+        return status, size
+    finally:
+        writer.close()
+
+
+async def client(url, read_rate, receive_buffer, results):
+    while True:
+        start = time.monotonic()
+        results["in_flight"] += 1
+        try:
+            status, size = await fetch(url, read_rate, receive_buffer)
+        except (OSError, ValueError, IndexError) as exc:
+            results["errors"].append(type(exc).__name__)
+            await asyncio.sleep(0.1)
+            continue
+        finally:
+            results["in_flight"] -= 1
+        results["latencies"].append(time.monotonic() - start)
+        results["statuses"][status] = results["statuses"].get(status, 0) + 1
+        results["bytes"] += size
+
+
+async def run(url, concurrency, duration, read_rate, receive_buffer):
+    """Run the clients for `duration` seconds, then cancel the pending requests."""
+    results = {"latencies": [], "statuses": {}, "errors": [], "bytes": 0}
+    results["in_flight"] = 0
+    tasks = [
+        asyncio.create_task(client(url, read_rate, receive_buffer, results))
+        for _ in range(concurrency)
+    ]
+    await asyncio.sleep(duration)
+    unfinished = results["in_flight"]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    results["unfinished"] = unfinished
+    return results
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--read-rate",
+        type=int,
+        default=0,
+        help="Bytes per second read by every client, 0 for as fast as possible.",
+    )
+    parser.add_argument(
+        "--receive-buffer",
+        type=int,
+        default=64 * 1024,
+        help="Socket receive buffer of every client, in bytes.",
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        run(
+            args.url,
+            args.concurrency,
+            args.duration,
+            args.read_rate,
+            args.receive_buffer,
+        )
+    )
+
+    latencies = sorted(results["latencies"])
+    print(f"{args.url}, {args.concurrency} clients, {args.duration:g} s")
+    print(f"responses   {len(latencies)} ({len(latencies) / args.duration:.1f}/s)")
+    print(f"statuses    {results['statuses']}")
+    print(f"errors      {len(results['errors'])} {sorted(set(results['errors']))}")
+    print(f"unfinished  {results['unfinished']} requests still running at the end")
+    print(f"received    {results['bytes'] / 2**20:.1f} MiB")
+    if latencies:
+        print(
+            f"latency     p50 {percentile(latencies, 0.5) * 1000:.0f} ms   "
+            f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms   "
+            f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms   "
+            f"mean {statistics.mean(latencies) * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
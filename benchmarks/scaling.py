@@ -0,0 +1,90 @@
+"""
+Throughput of the production server by number of gunicorn workers.
+
+    python -m benchmarks.scaling http://0.0.0.0:8080/api/v1/images/1/ \
+        --workers 1 2 4 8 --concurrency 64 --duration 20
+
+Starts `gunicorn -c gunicorn.conf.py` with every worker count in turn (extra
+environment such as `GUNICORN_THREADS=4` or `DB__CONN_MAX_AGE=0` is passed on),
+runs the load test of `benchmarks.load` against it and prints one line per
+worker count. Requests per second grow with the workers until the CPU cores (of
+the server and of PostgreSQL) are saturated.
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import socket
+import subprocess
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.load import percentile, run
+
+STARTUP_TIMEOUT = 30
+
+
+def wait_for_port(host, port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not listen on {host}:{port}")
+
+
+def measure(url, workers, args):
+    parts = urlsplit(url)
+    env = {
+        **os.environ,
+        "APP_PORT": str(parts.port or 80),
+        "GUNICORN_WORKERS": str(workers),
+        "DJANGO_DEBUG": "0",
+        # a throwaway one, required with DEBUG off
+        "DJANGO_SECRET_KEY": os.environ.get("DJANGO_SECRET_KEY")
+        or secrets.token_urlsafe(50),
+    }
+    process = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(parts.hostname, parts.port or 80, process)
+        # warm up the workers and their database connections
+        asyncio.run(run(url, args.concurrency, 2, 0, 64 * 1024))
+        return asyncio.run(run(url, args.concurrency, args.duration, 0, 64 * 1024))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("url")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.url}, {args.concurrency} clients, {args.duration:g} s per run")
+    print(f"{os.cpu_count()} CPU cores")
+    for workers in args.workers:
+        results = measure(args.url, workers, args)
+        latencies = sorted(results["latencies"])
+        print(
+            f"{workers:>3} workers   {len(latencies) / args.duration:8.1f} req/s   "
+            f"p50 {percentile(latencies, 0.5) * 1000:6.0f} ms   "
+            f"p99 {percentile(latencies, 0.99) * 1000:6.0f} ms   "
+            f"errors {len(results['errors'])}   statuses {results['statuses']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
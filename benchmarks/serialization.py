@@ -0,0 +1,117 @@
+"""
+Compare the DRF serializers with the `.values()` read path of the list endpoints.
+
+    python -m benchmarks.serialization --images 100 --annotations 50
+
+Test data is created in the configured database inside a transaction that is
+rolled back at the end.
+"""
+
+import argparse
+import statistics
+import time
+
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from dent_image_api.models import Annotation, Image
+from dent_image_api.representations import (
+    ANNOTATION_VALUES,
+    IMAGE_VALUES,
+    annotation_representations,
+    image_representations,
+)
+from dent_image_api.serializers import AnnotationSerializer, ImageSerializer
+
+
+def create_data(images_count, annotations_count):
+    images = Image.objects.bulk_create(
+        Image(name=f"benchmark {i}", file=f"images/benchmark_{i}.jpg")
+        for i in range(images_count)
+    )
+    Annotation.objects.bulk_create(
+        Annotation(
+            image=image,
+            class_id="tooth",
+            shape={"start_x": j, "start_y": j, "end_x": j + 10, "end_y": j + 10},
+            tags=["48", 36],
+            meta={"confirmed": True, "confidence_percent": 0.9},
+            relations=[{"type": "inside", "id": j}],
+        )
+        for image in images
+        for j in range(annotations_count)
+    )
+    return images
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def report(name, serializer_ms, values_ms):
+    print(
+        f"{name:<12} serializer {serializer_ms:9.2f} ms   "
+        f"values {values_ms:9.2f} ms   speedup x{serializer_ms / values_ms:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--annotations", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    request = Request(
+        APIRequestFactory().get("/api/v1/images/", HTTP_HOST="0.0.0.0:8080")
+    )
+    with transaction.atomic():
+        images = create_data(args.images, args.annotations)
+        image_ids = [image.pk for image in images]
+
+        def serialize_images():
+            queryset = Image.objects.filter(pk__in=image_ids).prefetch_related(
+                Prefetch("annotations", queryset=Annotation.objects.order_by("id"))
+            )
+            return ImageSerializer(
+                queryset, many=True, context={"request": request}
+            ).data
+
+        def represent_images():
+            rows = Image.objects.filter(pk__in=image_ids).values(*IMAGE_VALUES)
+            return image_representations(rows, request)
+
+        annotations = Annotation.objects.filter(image_id=image_ids[0])
+
+        def serialize_annotations():
+            return AnnotationSerializer(annotations.all(), many=True).data
+
+        def represent_annotations():
+            return annotation_representations(annotations.values(*ANNOTATION_VALUES))
+
+        print(
+            f"{args.images} images with {args.annotations} annotations each, "
+            f"median of {args.repeat} runs"
+        )
+        report(
+            "images",
+            measure(serialize_images, args.repeat),
+            measure(represent_images, args.repeat),
+        )
+        report(
+            "annotations",
+            measure(serialize_annotations, args.repeat),
+            measure(represent_annotations, args.repeat),
+        )
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture(autouse=True, scope="session")
+def media_root(tmp_path_factory):
+    """
+    Keep the files uploaded by tests out of the project MEDIA_ROOT, along with
+    the renditions, tiles and partial uploads derived from the settings.
+    """
+    root = str(tmp_path_factory.mktemp("media"))
+    with override_settings(
+        MEDIA_ROOT=root,
+        RENDITION_CACHE_ROOT=os.path.join(root, "renditions"),
+        IMAGE_TILES_ROOT=os.path.join(root, "tiles"),
+        UPLOAD_SESSION_ROOT=str(tmp_path_factory.mktemp("uploads")),
+    ):
+        yield
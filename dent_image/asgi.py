@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dent_image.dent_image.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dent_image.settings")
+# sync code runs in a new thread for every request under ASGI, so persistent
+# connections would never be reused, only piled up
+os.environ.setdefault("DB__CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -9,10 +9,13 @@ https://docs.djangoproject.com/en/5.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
+import importlib.util
 import os
 import typing
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,13 +24,25 @@ DJANGO_SETTINGS_MODULE = "dent_image.settings"
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-9#-gbrgk#9k&j7h3^jq41s4q5ozjg2o9b57!ps6ghpc!rzf=g@"
-
-# TODO: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS: typing.List[str] = ["0.0.0.0"]
+# SECURITY WARNING: don't run with debug turned on in production! The production
+# server mode of docker-entrypoint.sh sets DJANGO_DEBUG=0.
+DEBUG = os.environ.get("DJANGO_DEBUG", "1") == "1"
+
+# SECURITY WARNING: keep the secret key used in production secret! The key below
+# is public and only used in development, DJANGO_SECRET_KEY is required with
+# DEBUG off.
+SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY", "")
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("Set DJANGO_SECRET_KEY when DJANGO_DEBUG is off.")
+    SECRET_KEY = "django-insecure-9#-gbrgk#9k&j7h3^jq41s4q5ozjg2o9b57!ps6ghpc!rzf=g@"
+
+# comma separated host names the server answers to, e.g. "api.example.com"
+ALLOWED_HOSTS: typing.List[str] = [
+    host.strip()
+    for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "0.0.0.0").split(",")
+    if host.strip()
+]
 
 
 # Application definition
@@ -85,6 +100,11 @@ DATABASES = {
         "PASSWORD": "postgres",
         "HOST": "database",
         "PORT": "5432",
+        # keep the connection of every worker thread open across requests instead of
+        # connecting for each one, and check it before reusing it after an error.
+        # Set DB__CONN_MAX_AGE=0 under ASGI, where every request has its own thread.
+        "CONN_MAX_AGE": int(os.environ.get("DB__CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -127,19 +147,114 @@ STATIC_URL = "static/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    # Storage of uploaded images. Use "dent_image_api.storage.HashedDirectoryStorage"
+    # to spread files over hash-prefix subdirectories, or
+    # "dent_image_api.storage.ContentAddressedStorage" to also store each distinct
+    # file once, named after the hash of its content.
+    "images": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+}
+
+# Delivery of media files, see dent_image_api/delivery.py. Set MEDIA_OFFLOAD to
+# "x-accel-redirect" behind nginx, with an internal location aliased to MEDIA_ROOT
+# at MEDIA_ACCEL_REDIRECT_LOCATION, or to "x-sendfile" behind Apache
+# (mod_xsendfile) or lighttpd, to let the proxy send the file bytes.
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_REDIRECT_LOCATION = "/protected-media/"
+# Files under these MEDIA_ROOT relative prefixes never change once written and are
+# cached by clients for a year, e.g. ["images/"] with ContentAddressedStorage.
+MEDIA_IMMUTABLE_PREFIXES = []
+
+# Uploaded files are hashed while they stream in, see dent_image_api/uploadhandlers.py
+FILE_UPLOAD_HANDLERS = [
+    "dent_image_api.uploadhandlers.HashingMemoryFileUploadHandler",
+    "dent_image_api.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+
+# Downscaled renditions of images, see dent_image_api/renditions.py
+RENDITION_CACHE_ROOT = os.path.join(MEDIA_ROOT, "renditions")
+RENDITION_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RENDITION_WIDTHS = [64, 128, 256, 512, 1024]
+# widths rendered by a background job after every upload, instead of on first use
+RENDITION_PREBUILD_WIDTHS = []
+
+# Deep-zoom tile pyramids of images, see dent_image_api/tiles.py
+IMAGE_TILES_ENABLED = True
+IMAGE_TILES_ROOT = os.path.join(MEDIA_ROOT, "tiles")
+IMAGE_TILE_SIZE = 256
+
+# Resumable uploads, see dent_image_api/uploads.py. Partial files are kept in
+# UPLOAD_SESSION_ROOT, which should be on the file system of MEDIA_ROOT so that
+# finalizing an upload moves the file instead of copying it. Sessions are deleted
+# by a background job UPLOAD_SESSION_TTL seconds after they were created.
+UPLOAD_SESSION_ROOT = os.path.join(BASE_DIR, "uploads")
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 64 * 1024 * 1024
+
+# Largest number of operations accepted by POST /api/v1/annotations/batch/
+ANNOTATION_BATCH_MAX_OPERATIONS = 1000
+
+# Background jobs queued in the database, see dent_image_api/jobs.py, and run by
+# `python manage.py run_jobs`. A failed job is retried after JOB_RETRY_DELAY
+# seconds, doubled on every attempt up to JOB_RETRY_MAX_DELAY. A claimed job is
+# reserved for its worker for JOB_LEASE seconds, after which another worker may
+# claim it again (its worker died).
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+JOB_LEASE = 300
+JOB_POLL_INTERVAL = 1.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Cached annotation lists, see dent_image_api/caching.py. Correct with any
+    # backend; a shared one such as
+    # "django.core.cache.backends.memcached.PyMemcacheCache" (LOCATION "127.0.0.1:11211")
+    # or "django.core.cache.backends.filebased.FileBasedCache" is shared by the workers.
+    "annotations": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "annotations",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+ANNOTATION_CACHE_ALIAS = "annotations"
+
+# database connections used at the same time by the async views of one ASGI process
+ASYNC_DATABASE_CONNECTIONS = 10
+
+# JSON is encoded and decoded with orjson when it is installed, and application/msgpack
+# is negotiated from Accept/Content-Type when msgpack is (see dent_image_api/formats.py)
+MSGPACK_ENABLED = importlib.util.find_spec("msgpack") is not None
+
 REST_FRAMEWORK = {
     "DEFAULT_PARSER_CLASSES": [
-        "rest_framework.parsers.JSONParser",
+        "dent_image_api.parsers.FastJSONParser",
         "rest_framework.parsers.FormParser",
         "rest_framework.parsers.MultiPartParser",
+        *(["dent_image_api.parsers.MessagePackParser"] if MSGPACK_ENABLED else []),
     ],
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework.renderers.JSONRenderer",
+        "dent_image_api.renderers.FastJSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
+        *(["dent_image_api.renderers.MessagePackRenderer"] if MSGPACK_ENABLED else []),
     ),
+    "DEFAULT_PAGINATION_CLASS": "dent_image_api.pagination.IdCursorPagination",
+    "PAGE_SIZE": 100,
 }
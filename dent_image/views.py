@@ -1,7 +1,13 @@
-import markdown
 import os
+import posixpath
 
+import markdown
+from django.conf import settings
 from django.http import HttpResponse
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+
+from dent_image_api.delivery import file_response
 
 
 def home(request):
@@ -13,3 +19,16 @@ def home(request):
     markdown_content = markdown.markdown(readme_content)
 
     return HttpResponse(markdown_content)
+
+
+@require_safe
+def media(request, path, document_root=None):
+    """
+    Serve a media file with strong validators, byte ranges and cache headers, or
+    hand it to the front proxy, see `dent_image_api.delivery`. `document_root`
+    defaults to MEDIA_ROOT.
+    """
+    document_root = document_root or settings.MEDIA_ROOT
+    path = posixpath.normpath(path).lstrip("/")
+    # raises SuspiciousFileOperation, answered with 400, for paths outside the root
+    return file_response(request, safe_join(document_root, path))
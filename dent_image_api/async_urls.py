@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path("images/", async_views.image_list, name="async-image-list"),
+    path("images/<int:pk>/", async_views.image_detail, name="async-image-detail"),
+    path("images/<int:pk>/file/", async_views.image_file, name="async-image-file"),
+    path(
+        "images/<int:image_id>/annotations/",
+        async_views.annotation_list,
+        name="async-image-annotations",
+    ),
+    path(
+        "images/<int:image_id>/annotations/<int:pk>/",
+        async_views.annotation_detail,
+        name="async-image-annotation-detail",
+    ),
+]
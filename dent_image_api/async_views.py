@@ -0,0 +1,209 @@
+"""
+Async variants of the read endpoints, for ASGI deployments.
+
+They return the same JSON as the sync viewsets (`representations`), read the
+database with the async ORM and stream image files without holding a thread
+between chunks, so that slow clients only cost a coroutine. Writes, content
+negotiation and the browsable API stay on the sync viewsets.
+"""
+
+import asyncio
+import contextlib
+import functools
+import mimetypes
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException
+
+from .conditional import file_validators, resource_validators, set_validators
+from .delivery import file_response
+from .filters import filter_annotations, filter_by_bbox, filter_images
+from .models import Annotation, Image
+from .pagination import IdCursorPagination
+from .renderers import FastJSONRenderer
+from .representations import (
+    ANNOTATION_VALUES,
+    IMAGE_VALUES,
+    aimage_representations,
+    annotation_representation,
+    annotation_representations,
+)
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+_database_slots = asyncio.Semaphore(settings.ASYNC_DATABASE_CONNECTIONS)
+
+
+def _json_response(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status, content_type="application/json"
+    )
+
+
+@contextlib.asynccontextmanager
+async def _database_access():
+    """
+    Bound the number of database connections of the async views in this process.
+    Under ASGI every request gets its own connection on its first query, which
+    Django only closes once the response is finished, so they are closed here.
+    """
+    async with _database_slots:
+        try:
+            yield
+        finally:
+            await sync_to_async(_close_connections)()
+
+
+def _close_connections():
+    for connection in connections.all(initialized_only=True):
+        # tests run inside a transaction
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def async_read_view(view):
+    """
+    Answer GET and HEAD only, with the status and error bodies of DRF for its
+    exceptions and for Http404. Streamed bodies are sent after the database
+    connection is released.
+    """
+
+    @require_safe
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            async with _database_access():
+                return await view(request, *args, **kwargs)
+        except APIException as exc:
+            # like rest_framework.views.exception_handler()
+            if isinstance(exc.detail, (list, dict)):
+                return _json_response(exc.detail, status=exc.status_code)
+            return _json_response({"detail": exc.detail}, status=exc.status_code)
+        except Http404:
+            return _json_response({"detail": "Not found."}, status=404)
+
+    return wrapper
+
+
+async def _conditional_response(request, validators, handler):
+    """
+    Answer with 304 Not Modified from `validators`, a (version, updated_at) tuple
+    or None, or with the response of `await handler()`.
+    """
+    if validators is None:
+        return await handler()
+
+    etag, last_modified = resource_validators(*validators, "json")
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await handler()
+    return set_validators(response, etag, last_modified)
+
+
+async def _validators(queryset):
+    return await queryset.values_list("version", "updated_at").afirst()
+
+
+@async_read_view
+async def image_list(request):
+    queryset = filter_images(Image.objects.all(), request.GET).values(*IMAGE_VALUES)
+    paginator = IdCursorPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    data = await aimage_representations(page, request)
+    return _json_response(paginator.get_paginated_data(data))
+
+
+@async_read_view
+async def image_detail(request, pk):
+    async def handler():
+        row = await Image.objects.filter(pk=pk).values(*IMAGE_VALUES).afirst()
+        if row is None:
+            raise Http404
+        return _json_response((await aimage_representations([row], request))[0])
+
+    validators = await _validators(Image.objects.filter(pk=pk))
+    if validators is None:
+        raise Http404
+    return await _conditional_response(request, validators, handler)
+
+
+@async_read_view
+async def annotation_list(request, image_id):
+    queryset = Annotation.objects.filter(image_id=image_id)
+    if request.GET.get("direction") == "external":
+        queryset = queryset.filter(confirmed=True)
+    queryset = filter_annotations(queryset, request.GET)
+    queryset = filter_by_bbox(queryset, request.GET).values(*ANNOTATION_VALUES)
+
+    async def handler():
+        paginator = IdCursorPagination()
+        page = await paginator.apaginate_queryset(queryset, request)
+        data = annotation_representations(page)
+        return _json_response(paginator.get_paginated_data(data))
+
+    # every annotation write touches the image, so its version covers the list
+    validators = await _validators(Image.objects.filter(pk=image_id))
+    return await _conditional_response(request, validators, handler)
+
+
+@async_read_view
+async def annotation_detail(request, image_id, pk):
+    queryset = Annotation.objects.filter(image_id=image_id, pk=pk)
+
+    async def handler():
+        row = await queryset.values(*ANNOTATION_VALUES).afirst()
+        if row is None:
+            raise Http404
+        return _json_response(annotation_representation(row))
+
+    validators = await _validators(queryset)
+    if validators is None:
+        raise Http404
+    return await _conditional_response(request, validators, handler)
+
+
+@async_read_view
+async def image_file(request, pk):
+    name = await Image.objects.filter(pk=pk).values_list("file", flat=True).afirst()
+    if not name:
+        raise Http404
+
+    path = Image._meta.get_field("file").storage.path(name)
+    if settings.MEDIA_OFFLOAD:
+        # the front proxy sends the file
+        return await asyncio.to_thread(file_response, request, path)
+    try:
+        stat = await asyncio.to_thread(os.stat, path)
+    except OSError:
+        raise Http404
+
+    etag, last_modified = file_validators(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        response = StreamingHttpResponse(
+            _read_chunks(path), content_type=content_type or "application/octet-stream"
+        )
+        response["Content-Length"] = stat.st_size
+        response["Last-Modified"] = http_date(last_modified)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    return response
+
+
+async def _read_chunks(path):
+    # every read runs in a worker thread, which is released between chunks
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        while chunk := await asyncio.to_thread(file.read, FILE_CHUNK_SIZE):
+            yield chunk
+    finally:
+        file.close()
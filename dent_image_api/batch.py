@@ -0,0 +1,212 @@
+"""
+Batches of annotation operations, applied together in one transaction.
+
+Every operation of a batch is validated before anything is written, with the
+annotations and images it refers to loaded (and locked) by one query each.
+The batch is then applied like `ImageSerializer._update_annotations()`: one
+delete, one bulk update and one bulk insert, whatever the number of operations.
+An annotation may only appear in one operation of a batch, so the result does
+not depend on the order in which the operations are applied.
+"""
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+
+from .models import Annotation, Image
+from .serializers import (
+    ANNOTATION_DATA_FIELDS,
+    AnnotationSerializer,
+    BatchAnnotationSerializer,
+)
+
+NOT_APPLIED = {
+    "status": 424,
+    "detail": "Not applied, another operation of the batch failed.",
+}
+
+
+class BatchError(Exception):
+    """A batch that was not applied, with the result of every operation."""
+
+    def __init__(self, results):
+        super().__init__(results)
+        self.results = results
+
+
+def apply_operations(operations):
+    """
+    Apply the validated `operations` of an `AnnotationBatchSerializer` and return
+    the result of each of them, or raise BatchError without writing anything.
+    """
+    with transaction.atomic():
+        # images before annotations, like every annotation write
+        images = _lock_images(_image_ids(operations))
+        annotations = _lock_annotations(operations)
+        moved_image_ids = {a.image_id for a in annotations.values()} - images.keys()
+        if moved_image_ids:
+            # annotations moved by a transaction committed meanwhile
+            images.update(_lock_images(moved_image_ids))
+        context = {"images": images}
+
+        changes = _Changes()
+        results = []
+        for operation in operations:
+            try:
+                result = _prepare(operation, annotations, context, changes)
+            except _OperationError as exc:
+                result = {"status": exc.status, **exc.body}
+            results.append({"op": operation["op"], **result})
+
+        if any(result["status"] >= 400 for result in results):
+            raise BatchError(
+                [
+                    result if result["status"] >= 400 else _not_applied(result)
+                    for result in results
+                ]
+            )
+
+        changes.apply()
+
+    for result in results:
+        if "instance" in result:
+            result["data"] = AnnotationSerializer(result.pop("instance")).data
+    return results
+
+
+class _OperationError(Exception):
+    def __init__(self, status, body):
+        super().__init__(body)
+        self.status = status
+        self.body = body
+
+
+class _Changes:
+    """The writes of a batch, applied with one query (and one touch) per kind."""
+
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted_ids = []
+        self.update_fields = set()
+        self.changed_ids = set()
+
+    def claim(self, annotation_id):
+        if annotation_id in self.changed_ids:
+            raise _OperationError(
+                400, {"detail": "The annotation is changed by another operation."}
+            )
+        self.changed_ids.add(annotation_id)
+
+    def apply(self):
+        if self.deleted_ids:
+            Annotation.objects.filter(pk__in=self.deleted_ids).delete()
+        if self.updated:
+            fields = [f for f in ANNOTATION_DATA_FIELDS if f in self.update_fields]
+            if "image" in self.update_fields:
+                fields.append("image")
+            # also touches the images annotations are moved away from
+            Annotation.objects.bulk_update(self.updated, fields)
+        if self.created:
+            Annotation.objects.bulk_create(self.created)
+
+
+def _annotation_ids(operations):
+    return [operation["id"] for operation in operations if "id" in operation]
+
+
+def _lock_annotations(operations):
+    # rows are locked in the same order by every transaction, to avoid deadlocks
+    return {
+        annotation.pk: annotation
+        for annotation in Annotation.objects.select_for_update()
+        .filter(pk__in=_annotation_ids(operations))
+        .order_by("pk")
+    }
+
+
+def _image_ids(operations):
+    """The images the annotations of `operations` belong to or are moved to."""
+    image_ids = set(
+        Annotation.objects.filter(pk__in=_annotation_ids(operations)).values_list(
+            "image_id", flat=True
+        )
+    )
+    for operation in operations:
+        try:
+            image_ids.add(int(operation.get("data", {})["image"]))
+        except (KeyError, TypeError, ValueError):
+            # no image, or an invalid one reported by the serializer
+            pass
+    return image_ids
+
+
+def _lock_images(image_ids):
+    """Lock the images with `image_ids`, before the writes touch them in any order."""
+    return {
+        image.pk: image
+        for image in Image.objects.select_for_update()
+        .filter(pk__in=image_ids)
+        .order_by("pk")
+        .only("pk")
+    }
+
+
+def _prepare(operation, annotations, context, changes):
+    """Validate `operation`, queue its change in `changes` and return its result."""
+    if operation["op"] == "create":
+        serializer = BatchAnnotationSerializer(data=operation["data"], context=context)
+        annotation = Annotation(**_validated(serializer))
+        _clean(annotation)
+        changes.created.append(annotation)
+        return {"status": 201, "instance": annotation}
+
+    annotation_id = operation["id"]
+    try:
+        annotation = annotations.get(annotation_id)
+        if annotation is None:
+            raise _OperationError(404, {"detail": "Not found."})
+        if operation.get("version", annotation.version) != annotation.version:
+            raise _OperationError(
+                412, {"detail": f"The annotation is at version {annotation.version}."}
+            )
+        changes.claim(annotation_id)
+
+        if operation["op"] == "delete":
+            changes.deleted_ids.append(annotation_id)
+            return {"status": 204, "id": annotation_id}
+
+        serializer = BatchAnnotationSerializer(
+            annotation,
+            data=operation["data"],
+            partial=operation["op"] == "partial_update",
+            context=context,
+        )
+        validated_data = _validated(serializer)
+        for key, value in validated_data.items():
+            setattr(annotation, key, value)
+        _clean(annotation)
+    except _OperationError as exc:
+        exc.body = {"id": annotation_id, **exc.body}
+        raise
+
+    changes.update_fields.update(validated_data)
+    changes.updated.append(annotation)
+    return {"status": 200, "instance": annotation}
+
+
+def _not_applied(result):
+    result = {key: value for key, value in result.items() if key != "instance"}
+    return {**result, **NOT_APPLIED}
+
+
+def _validated(serializer):
+    if not serializer.is_valid():
+        raise _OperationError(400, {"errors": serializer.errors})
+    return serializer.validated_data
+
+
+def _clean(annotation):
+    try:
+        annotation.clean()
+    except DjangoValidationError as exc:
+        raise _OperationError(400, {"errors": {"non_field_errors": exc.messages}})
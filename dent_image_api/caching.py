@@ -0,0 +1,52 @@
+"""
+Response cache of the annotation lists of images.
+
+Entries are stored in the `ANNOTATION_CACHE_ALIAS` cache and keyed by image id,
+image version, renderer format and full request URL (direction, cursor, page
+size, ...). Every write to the annotations of an image touches the image (see
+`ImageQuerySet.touch()`), so its next list requests read a new version and
+miss the entries of the previous one: nothing has to be deleted from the cache,
+which stays correct on any backend, shared by the workers or not. Entries of
+previous versions expire after the TIMEOUT of the cache.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+
+class AnnotationListCacheMixin:
+    """
+    Serve the annotation list of an image from the response cache. Used with
+    `ConditionalGetMixin`, which reads the version of the image for the request.
+    """
+
+    def list(self, request, *args, **kwargs):
+        image_id = self.kwargs.get("image_id")
+        validators = getattr(self, "validators", None)
+        if image_id is None or validators is None:
+            # no image, nothing to cache
+            return super().list(request, *args, **kwargs)
+
+        cache = caches[settings.ANNOTATION_CACHE_ALIAS]
+        key = self._annotation_list_key(image_id, validators[0], request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            # the list was read after the version, so it is at least as recent
+            cache.set(key, response.data)
+        return response
+
+    @staticmethod
+    def _annotation_list_key(image_id, version, request):
+        url_hash = hashlib.md5(
+            request.build_absolute_uri().encode(), usedforsecurity=False
+        ).hexdigest()
+        return (
+            f"annotations:{image_id}:{version}:"
+            f"{request.accepted_renderer.format}:{url_hash}"
+        )
@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import VersionConflict
+
+
+def resource_validators(version, updated_at, format):
+    """ETag and Last-Modified timestamp of a resource represented in `format`."""
+    # the representation depends on the format, so does the ETag
+    return quote_etag(f"{version}-{format}"), int(updated_at.timestamp())
+
+
+def if_match_versions(request):
+    """
+    Versions of the strong ETags in the `If-Match` header of `request`, in any
+    format, or None without the header or with `*`.
+    """
+    etags = parse_etags(request.headers.get("If-Match", ""))
+    if not etags or etags == ["*"]:
+        return None
+    versions = set()
+    for etag in etags:
+        # a weak ETag never matches with the strong comparison of If-Match
+        if not etag.startswith("W/"):
+            version = etag.strip('"').split("-", 1)[0]
+            if version.isdigit():
+                versions.add(int(version))
+    return versions
+
+
+def file_validators(stat):
+    """ETag and Last-Modified timestamp of a file from its `os.stat()` result."""
+    return quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}"), int(stat.st_mtime)
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ["Accept"])
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GET requests (`If-None-Match`, `If-Modified-Since`) of the
+    list and retrieve actions with 304 Not Modified, without building the body.
+
+    Views return the validators of the requested resource from `get_validators()`
+    as a `(version, updated_at)` tuple, or None when the resource has none. They
+    are kept in `self.validators` for the rest of the request.
+    """
+
+    def get_validators(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validators = self.validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = resource_validators(
+            *validators, request.accepted_renderer.format
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The resource was modified, it no longer matches If-Match."
+    default_code = "precondition_failed"
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The resource was modified by another request, try again."
+    default_code = "conflict"
+
+
+class ConditionalWriteMixin:
+    """
+    Optimistic concurrency for the update and destroy actions. A write is based on
+    the version of the `If-Match` ETags, or without the header on the version the
+    request read, and starts with one conditional UPDATE of that version in the
+    write transaction (`VersionedQuerySet.claim()`): writers never hold row locks
+    while a request is read and validated, and never silently overwrite each
+    other. A stale `If-Match` is answered with 412 Precondition Failed, a row
+    changed while the request was handled with 409 Conflict.
+
+    Updates answer with the validators of the new version, for the next write.
+    """
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        instance = self.updated_instance
+        etag, last_modified = resource_validators(
+            instance.version, instance.updated_at, request.accepted_renderer.format
+        )
+        return set_validators(response, etag, last_modified)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self.claim(serializer.instance)
+            super().perform_update(serializer)
+        self.updated_instance = serializer.instance
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self.claim(instance)
+            super().perform_destroy(instance)
+
+    def claim(self, instance):
+        claim_version(self.request, instance)
+
+
+def claim_version(request, instance):
+    """
+    Base the write of `request` to `instance` on the version of its `If-Match`
+    ETags, or on the version of `instance` without the header, see
+    `ConditionalWriteMixin`. Must run in the write transaction.
+    """
+    versions = if_match_versions(request)
+    if versions is not None and instance.version not in versions:
+        raise PreconditionFailed()
+    try:
+        type(instance).objects.claim(instance.pk, instance.version)
+    except VersionConflict:
+        raise PreconditionFailed() if versions is not None else Conflict()
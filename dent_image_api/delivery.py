@@ -0,0 +1,192 @@
+"""
+Delivery of files from the disk: media files, renditions and tiles.
+
+Responses carry strong validators built from the file metadata, answer
+conditional requests with 304 Not Modified or 412 Precondition Failed, and
+single byte ranges with 206 Partial Content. With `MEDIA_OFFLOAD` set, the body
+is left to the front proxy (nginx `X-Accel-Redirect`, Apache or lighttpd
+`X-Sendfile`), which then also answers ranges, so that workers only look up the
+file and never push its bytes.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .conditional import file_validators
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_response(request, path):
+    """
+    Answer `request` with the file at the absolute `path`, raise Http404 when it
+    is missing or a directory.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+
+    etag, last_modified = file_validators(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, stat.st_size, etag, last_modified)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control(path)
+    return response
+
+
+def _file_response(request, path, size, etag, last_modified):
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or "application/octet-stream"
+
+    offloaded = _offload_response(path, content_type)
+    if offloaded is not None:
+        response = offloaded
+    else:
+        byte_range = None
+        if _if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.headers.get("Range"), size)
+
+        if byte_range is None:
+            response = _body_response(request, open(path, "rb"), size, content_type)
+        elif not byte_range:
+            response = HttpResponse(status=416, content_type=content_type)
+            response["Content-Range"] = f"bytes */{size}"
+        else:
+            file = open(path, "rb")
+            file.seek(byte_range.start)
+            response = _body_response(
+                request,
+                _FileRange(file, len(byte_range)),
+                len(byte_range),
+                content_type,
+            )
+            first, last = byte_range[0], byte_range[-1]
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+        response["Accept-Ranges"] = "bytes"
+
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return response
+
+
+def _body_response(request, file, length, content_type):
+    if request.method == "HEAD":
+        file.close()
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = FileResponse(file, content_type=content_type)
+    response["Content-Length"] = length
+    return response
+
+
+def _offload_response(path, content_type):
+    """Empty response telling the front proxy to send the file, or None."""
+    if settings.MEDIA_OFFLOAD == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return response
+
+    if settings.MEDIA_OFFLOAD == "x-accel-redirect":
+        name = _media_name(path)
+        # only MEDIA_ROOT is aliased by the internal location
+        if name is None:
+            return None
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_LOCATION + quote(
+            name
+        )
+        return response
+
+    return None
+
+
+def _media_name(path):
+    """Path of `path` relative to MEDIA_ROOT, with slashes, or None outside it."""
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    path = os.path.abspath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def cache_control(path):
+    """
+    Files under MEDIA_IMMUTABLE_PREFIXES never change once written and are cached
+    for a year, the others are revalidated with their ETag on every use.
+    """
+    name = _media_name(path)
+    if name is not None and any(
+        name.startswith(prefix) for prefix in settings.MEDIA_IMMUTABLE_PREFIXES
+    ):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return "no-cache"
+
+
+def parse_range(header, size):
+    """
+    The byte range of a `Range` header on a file of `size` bytes, as a `range`
+    of offsets. None means that the header is absent or not supported (several
+    ranges, other units, invalid syntax) and the whole file is sent, an empty
+    range that it cannot be satisfied.
+    """
+    match = _BYTE_RANGE.match(header or "")
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if first:
+        first = int(first)
+        if first >= size:
+            return range(0)
+        last = int(last) if last else size - 1
+        if last < first:
+            return None
+        return range(first, min(last, size - 1) + 1)
+    if last:
+        # suffix range, the last `last` bytes
+        return range(max(size - int(last), 0), size)
+    return None
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Whether a `Range` header applies to the current file, per `If-Range`."""
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', "W/")):
+        # weak entity tags never match
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+class _FileRange:
+    """Read at most `length` bytes of `file` from its current position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,197 @@
+"""
+Streaming export of images and their annotations, e.g. for model training.
+
+Images and annotations are read with server-side cursors (`iterator()`) and
+written out piece by piece, so memory stays flat whatever the size of the
+tables. Two formats are produced:
+
+- NDJSON: one image per line, as returned by the API, with its annotations
+- COCO: one JSON object with `categories` (the class ids), `images` (with
+  their recorded dimensions) and `annotations`, whose `bbox` is
+  `[x, y, width, height]` and `attributes` holds the other fields of the
+  annotation
+
+The selection follows the list endpoints: `direction=external` keeps confirmed
+annotations only, and the filters of `annotation_filter()` keep the matching
+annotations and the images having at least one of them.
+"""
+
+import contextlib
+import datetime
+import itertools
+from operator import itemgetter
+
+from django.db import connection, transaction
+
+from .filters import filter_annotations, filter_images
+from .models import Annotation, Image
+from .renderers import FastJSONRenderer
+from .representations import (
+    ANNOTATION_VALUES,
+    IMAGE_VALUES,
+    annotation_representation,
+    file_url,
+    image_representation,
+)
+
+# rows fetched per round trip of the server-side cursors
+CHUNK_SIZE = 2000
+# bytes collected before they are handed to the client
+BUFFER_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "annotations.ndjson"),
+    "coco": ("application/json", "annotations.coco.json"),
+}
+
+
+class Export:
+    """
+    Export of the images and annotations selected by `query_params`. Iterate
+    over `ndjson()` or `coco()` for the bytes of the document; `images` and
+    `annotations` count what was written so far.
+    """
+
+    def __init__(self, query_params, request=None):
+        self.request = request
+        self.image_queryset = filter_images(Image.objects.all(), query_params)
+        annotations = Annotation.objects.filter(
+            image_id__in=self.image_queryset.values("pk")
+        )
+        if query_params.get("direction") == "external":
+            annotations = annotations.filter(confirmed=True)
+        self.annotation_queryset = filter_annotations(annotations, query_params)
+        self.images = 0
+        self.annotations = 0
+        self._render = FastJSONRenderer().render
+
+    def chunks(self, export_format):
+        return getattr(self, export_format)()
+
+    def ndjson(self):
+        with _snapshot():
+            yield from _buffered(self._ndjson_lines())
+
+    def coco(self):
+        with _snapshot():
+            yield from _buffered(self._coco_pieces())
+
+    def _ndjson_lines(self):
+        images = self._image_rows()
+        annotations = itertools.groupby(
+            self.annotation_queryset.order_by("image_id", "id")
+            .values(*ANNOTATION_VALUES)
+            .iterator(chunk_size=CHUNK_SIZE),
+            key=itemgetter("image_id"),
+        )
+        # both are ordered by image id, annotations of an image follow each other
+        image_id, rows = next(annotations, (None, None))
+        for image in images:
+            represented = []
+            if image_id == image["id"]:
+                represented = [annotation_representation(row) for row in rows]
+                image_id, rows = next(annotations, (None, None))
+            self.images += 1
+            self.annotations += len(represented)
+            yield self._render(image_representation(image, represented, self.request))
+            yield b"\n"
+
+    def _coco_pieces(self):
+        class_ids = sorted(
+            self.annotation_queryset.order_by()
+            .values_list("class_id", flat=True)
+            .distinct()
+        )
+        categories = {class_id: number for number, class_id in enumerate(class_ids, 1)}
+        yield b'{"info":'
+        yield self._render(
+            {
+                "description": "dent_image export",
+                "date_created": datetime.datetime.now(datetime.timezone.utc),
+            }
+        )
+        yield b',"categories":'
+        yield self._render(
+            [{"id": number, "name": name} for name, number in categories.items()]
+        )
+        yield b',"images":['
+        yield from _joined(self._coco_image(row) for row in self._image_rows())
+        yield b'],"annotations":['
+        rows = (
+            self.annotation_queryset.order_by("id")
+            .values(*ANNOTATION_VALUES, "min_x", "min_y", "max_x", "max_y")
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        yield from _joined(self._coco_annotation(row, categories) for row in rows)
+        yield b"]}"
+
+    def _image_rows(self):
+        return (
+            self.image_queryset.order_by("id")
+            .values(*IMAGE_VALUES)
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+
+    def _coco_image(self, row):
+        self.images += 1
+        return self._render(
+            {
+                "id": row["id"],
+                "file_name": row["file"],
+                "coco_url": file_url(row["file"], self.request),
+                "width": row["width"],
+                "height": row["height"],
+                "name": row["name"],
+            }
+        )
+
+    def _coco_annotation(self, row, categories):
+        self.annotations += 1
+        annotation = {
+            "id": row["id"],
+            "image_id": row["image_id"],
+            "category_id": categories[row["class_id"]],
+            "iscrowd": 0,
+            "attributes": {
+                key: value
+                for key, value in annotation_representation(row).items()
+                if key not in ("id", "image", "class_id")
+            },
+        }
+        if row["min_x"] is not None:
+            width, height = row["max_x"] - row["min_x"], row["max_y"] - row["min_y"]
+            annotation["bbox"] = [row["min_x"], row["min_y"], width, height]
+            annotation["area"] = width * height
+        return self._render(annotation)
+
+
+@contextlib.contextmanager
+def _snapshot():
+    """
+    Transaction in which all the queries of an export see the same data, and
+    which the server-side cursors need not outlive (WITH HOLD).
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
+
+
+def _joined(items):
+    for index, item in enumerate(items):
+        if index:
+            yield b","
+        yield item
+
+
+def _buffered(pieces):
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) >= BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,92 @@
+"""Query parameter filters of the list endpoints."""
+from django.db.models import Exists, OuterRef, Q
+from rest_framework import serializers
+
+from .models import Annotation
+
+BBOX_MODES = ("intersects", "contains")
+
+
+def filter_by_bbox(queryset, query_params):
+    """
+    Filter annotations by the region given as `bbox=x0,y0,x1,y1`.
+
+    With `bbox_mode=intersects` (the default) annotations overlapping the region
+    are kept, with `bbox_mode=contains` only annotations lying inside it.
+    """
+    bbox = query_params.get("bbox")
+    if bbox is None:
+        return queryset
+
+    try:
+        x0, y0, x1, y1 = (int(value) for value in bbox.split(","))
+    except ValueError:
+        raise serializers.ValidationError(
+            {"bbox": ["Bounding box must be four integers: x0,y0,x1,y1."]}
+        )
+    min_x, max_x = sorted((x0, x1))
+    min_y, max_y = sorted((y0, y1))
+
+    mode = query_params.get("bbox_mode", "intersects")
+    if mode == "intersects":
+        return queryset.filter(
+            min_x__lte=max_x, max_x__gte=min_x, min_y__lte=max_y, max_y__gte=min_y
+        )
+    if mode == "contains":
+        return queryset.filter(
+            min_x__gte=min_x, max_x__lte=max_x, min_y__gte=min_y, max_y__lte=max_y
+        )
+    raise serializers.ValidationError(
+        {"bbox_mode": [f"Mode must be one of {', '.join(BBOX_MODES)}."]}
+    )
+
+
+def annotation_filter(query_params):
+    """
+    Return the condition on annotations given by the query parameters:
+
+    - `class_id`, repeatable: the class is one of the given ones
+    - `tag`, repeatable: the annotation has all the given tags
+    - `min_confidence` / `max_confidence`: bounds of `confidence_percent`
+    """
+    condition = Q()
+
+    class_ids = query_params.getlist("class_id")
+    if class_ids:
+        condition &= Q(class_id__in=class_ids)
+
+    for tag in query_params.getlist("tag"):
+        # tags are stored as strings by the API, but may be integers
+        tag_condition = Q(tags__contains=[tag])
+        if tag.isdigit():
+            tag_condition |= Q(tags__contains=[int(tag)])
+        condition &= tag_condition
+
+    for param, lookup in [
+        ("min_confidence", "confidence_percent__gte"),
+        ("max_confidence", "confidence_percent__lte"),
+    ]:
+        if param in query_params:
+            try:
+                value = float(query_params[param])
+            except ValueError:
+                raise serializers.ValidationError({param: ["Must be a number."]})
+            condition &= Q(**{lookup: value})
+
+    return condition
+
+
+def filter_annotations(queryset, query_params):
+    """Filter annotations by `annotation_filter()`."""
+    condition = annotation_filter(query_params)
+    return queryset.filter(condition) if condition else queryset
+
+
+def filter_images(queryset, query_params):
+    """Keep the images having at least one annotation matching `annotation_filter()`."""
+    condition = annotation_filter(query_params)
+    if not condition:
+        return queryset
+    return queryset.filter(
+        Exists(Annotation.objects.filter(condition, image=OuterRef("pk")))
+    )
@@ -0,0 +1,35 @@
+"""
+Optional fast codecs of the API: orjson for JSON and msgpack for MessagePack.
+Both are optional; without orjson the stdlib `json` module is used, without
+msgpack the MessagePack renderer and parser are not enabled.
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+# a run of digits that may be an integer outside the 64-bit range, which orjson
+# would decode as a float
+_LONG_DIGITS = re.compile(rb"\d{20,}")
+
+
+def json_loads(data):
+    """
+    Decode a JSON document from `str` or `bytes`. Errors are raised as
+    `json.JSONDecodeError`, whichever codec is used. Documents with numbers of
+    20 digits or more are left to the stdlib, which keeps large integers exact.
+    """
+    if orjson is not None:
+        encoded = data.encode() if isinstance(data, str) else data
+        if not _LONG_DIGITS.search(encoded):
+            return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,197 @@
+"""
+Bulk ingest of images and their annotations from a directory and a manifest.
+
+A manifest lists one image per entry, either as JSON lines:
+
+    {"file": "2024/0001.jpg", "name": "Patient 1", "annotations": [{...}, ...]}
+
+or as CSV with a header and the columns `file`, `name` and `annotations` (a JSON
+list). `file` is relative to the directory, `name` defaults to the file name and
+`annotations`, in the format of the API, to none. Without a manifest every image
+file of the directory is ingested, in path order.
+
+Entries are decoded, validated and written to the images storage by
+`prepare_entry()`, in worker processes that never use the database; the
+`ingest_images` command inserts the rows.
+"""
+
+import csv
+import hashlib
+import io
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils._os import safe_join
+from PIL import Image as PILImage
+
+from .formats import json_loads
+from .metadata import file_metadata
+from .models import Annotation, Image, StoredFile
+from .serializers import AnnotationsInImageSerializer
+
+IMAGE_EXTENSIONS = {".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff"}
+
+
+class EntryError(Exception):
+    """An entry that cannot be ingested, reported and skipped."""
+
+
+def read_entries(directory, manifest=None):
+    """
+    Yield the entries of `manifest`, or of the image files of `directory`, as
+    (line number, entry) pairs. Entries that cannot be parsed are yielded as
+    EntryError instances.
+    """
+    if manifest is None:
+        yield from _directory_entries(directory)
+    elif manifest.lower().endswith(".csv"):
+        yield from _csv_entries(manifest)
+    else:
+        yield from _jsonl_entries(manifest)
+
+
+def _directory_entries(directory):
+    number = 0
+    for root, directories, files in os.walk(directory):
+        # sorted, so that the position of an entry is the same in every run
+        directories.sort()
+        for filename in sorted(files):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                number += 1
+                path = os.path.join(root, filename)
+                yield number, {"file": os.path.relpath(path, directory)}
+
+
+def _jsonl_entries(manifest):
+    with open(manifest, encoding="utf-8") as lines:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json_loads(line)
+            except ValueError:
+                yield number, EntryError("Invalid JSON.")
+                continue
+            if not isinstance(entry, dict):
+                yield number, EntryError("An entry must be a JSON object.")
+                continue
+            yield number, entry
+
+
+def _csv_entries(manifest):
+    with open(manifest, newline="", encoding="utf-8") as rows:
+        reader = csv.DictReader(rows)
+        for row in reader:
+            entry = {key: value for key, value in row.items() if value}
+            if "annotations" in entry:
+                try:
+                    entry["annotations"] = json_loads(entry["annotations"])
+                except ValueError:
+                    yield reader.line_num, EntryError("Invalid JSON in annotations.")
+                    continue
+            yield reader.line_num, entry
+
+
+def prepare_entry(directory, entry):
+    """
+    Validate the image file and the annotations of `entry` and store the file.
+    Return the values of the rows to insert, raise EntryError if it is invalid.
+    """
+    relative_path = entry.get("file")
+    if not isinstance(relative_path, str) or not relative_path:
+        raise EntryError("An entry needs a file.")
+    try:
+        path = safe_join(directory, relative_path)
+    except SuspiciousFileOperation:
+        raise EntryError(f"{relative_path} is outside the directory.")
+
+    filename = os.path.basename(path)
+    name = entry.get("name") or filename
+    if (
+        not isinstance(name, str)
+        or len(name) > Image._meta.get_field("name").max_length
+    ):
+        raise EntryError("Invalid name.")
+
+    annotations = [
+        _validate_annotation(index, data)
+        for index, data in enumerate(entry.get("annotations") or [])
+    ]
+
+    data = _read_image(path, relative_path)
+    field = Image._meta.get_field("file")
+    content = ContentFile(data, name=filename)
+    # spares the content addressed storage from hashing it again
+    content.content_hash = hashlib.sha256(data).hexdigest()
+    metadata = file_metadata(content)
+    try:
+        stored_name = field.storage.save(
+            field.generate_filename(None, filename), content, field.max_length
+        )
+    except (OSError, SuspiciousFileOperation) as exc:
+        raise EntryError(f"Cannot store {relative_path}: {exc}.")
+
+    return {
+        "file": stored_name,
+        "source": path,
+        "name": name,
+        "metadata": metadata,
+        "annotations": annotations,
+        "size": len(data),
+    }
+
+
+def _read_image(path, relative_path):
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except OSError as exc:
+        raise EntryError(f"Cannot read {relative_path}: {exc.strerror}.")
+    try:
+        with PILImage.open(io.BytesIO(data)) as image:
+            image.verify()
+    except Exception:
+        raise EntryError(f"{relative_path} is not a valid image.")
+    return data
+
+
+def _validate_annotation(index, data):
+    if isinstance(data, dict):
+        data = {key: value for key, value in data.items() if key != "id"}
+    serializer = AnnotationsInImageSerializer(data=data)
+    if not serializer.is_valid():
+        raise EntryError(f"Annotation {index}: {serializer.errors}")
+
+    values = dict(serializer.validated_data)
+    try:
+        Annotation(**values).clean()
+    except DjangoValidationError as exc:
+        raise EntryError(f"Annotation {index}: {' '.join(exc.messages)}")
+    return values
+
+
+def restore_missing_files(rows):
+    """
+    Store again the files of the prepared `rows` that were deleted as unreferenced
+    after `prepare_entry()` found them already stored, by a deduplicating
+    storage. Must run once the files are acquired, in the same transaction.
+    """
+    storage = Image._meta.get_field("file").storage
+    for row in rows:
+        if not storage.exists(row["file"]):
+            with open(row["source"], "rb") as file:
+                storage.save(row["file"], File(file))
+
+
+def discard_files(names):
+    """Delete the stored files of a batch that was not committed."""
+    names = set(names)
+    # a deduplicating storage may have returned files of existing images, the
+    # ones stored before StoredFile are only referenced by their image
+    legacy = set(Image.objects.filter(file__in=names).values_list("file", flat=True))
+    StoredFile.objects.delete_unreferenced(
+        names - legacy, Image._meta.get_field("file").storage
+    )
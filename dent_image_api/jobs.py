@@ -0,0 +1,119 @@
+"""
+Background jobs, queued in the database with `Job.objects.enqueue()` and run by
+the `run_jobs` command, so that requests only write the bytes and the rows of
+an upload and leave the file work that can wait to the workers.
+
+A task is a function of this module registered with `@task`, called with the
+JSON payload of its job as keyword arguments. A job may run more than once (a
+retry after a failure, or a worker that died after doing the work), so tasks
+must be idempotent.
+"""
+
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Image, Job, StoredFile, UploadSession
+from .renditions import get_rendition
+from .uploads import remove_partial_file
+
+TASKS = {}
+
+
+def task(function):
+    """Register `function` as the task named after it."""
+    TASKS[function.__name__] = function
+    return function
+
+
+@task
+def delete_stored_file(name):
+    # unless it was acquired again since it was released
+    StoredFile.objects.delete_unreferenced(
+        [name], Image._meta.get_field("file").storage
+    )
+
+
+@task
+def drop_derived_files(image_pk):
+    Image(pk=image_pk).drop_derived_files()
+
+
+@task
+def build_renditions(image_pk):
+    image = Image.objects.filter(pk=image_pk).first()
+    if image is not None:
+        for width in settings.RENDITION_PREBUILD_WIDTHS:
+            get_rendition(image, width)
+
+
+@task
+def expire_upload_session(session_id):
+    # finalized and aborted sessions are already gone
+    UploadSession.objects.filter(pk=session_id).delete()
+    remove_partial_file(session_id)
+
+
+def run(job):
+    """Run the claimed `job`, then delete it or schedule its retry. Return True if it succeeded."""
+    try:
+        if job.task not in TASKS:
+            raise LookupError(f"Unknown task {job.task!r}.")
+        TASKS[job.task](**job.payload)
+    except Exception:
+        job.fail(traceback.format_exc(), retry_delay(job.attempts))
+        return False
+    job.complete()
+    return True
+
+
+def retry_delay(attempts):
+    """Seconds before the retry of a job that failed `attempts` times."""
+    delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.JOB_RETRY_MAX_DELAY)
+
+
+def work(threads=1, stop=None, burst=False, report=None):
+    """
+    Claim and run jobs with a pool of `threads` threads, 0 to run them in this
+    thread, until `stop` (a threading.Event) is set, or with `burst` until no job
+    is due. `report` is called with every job run and whether it succeeded.
+    Return the numbers of jobs run and failed.
+    """
+    stop = stop or threading.Event()
+    totals = {"run": 0, "failed": 0}
+    executor = ThreadPoolExecutor(threads) if threads else None
+    try:
+        while not stop.is_set():
+            if executor is not None:
+                # drops the claiming connection if it broke or outlived CONN_MAX_AGE
+                close_old_connections()
+            jobs = Job.objects.claim(max(threads, 1), settings.JOB_LEASE)
+            if not jobs:
+                if burst:
+                    break
+                stop.wait(settings.JOB_POLL_INTERVAL)
+                continue
+
+            results = executor.map(_run_in_thread, jobs) if executor else map(run, jobs)
+            for job, succeeded in zip(jobs, results):
+                totals["run"] += 1
+                totals["failed"] += not succeeded
+                if report is not None:
+                    report(job, succeeded)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return totals
+
+
+def _run_in_thread(job):
+    # every pool thread has its own connection, recycled the same way
+    close_old_connections()
+    try:
+        return run(job)
+    finally:
+        close_old_connections()
@@ -0,0 +1,132 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from dent_image_api.metadata import METADATA_FIELDS, file_metadata
+from dent_image_api.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Record the metadata (dimensions, format, mode, byte size and SHA-256) of "
+        "the images stored before it was read at upload time. The files are read "
+        "by a pool of worker processes, every distinct file once, and each batch "
+        "of images is written with one UPDATE. Images whose file cannot be read "
+        "are reported and skipped; running the command again retries them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes, 0 to work in this process.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of images read and written per batch.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Read the metadata of every image, not only of those without it.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Image.objects.order_by("pk")
+        if not options["all"]:
+            queryset = queryset.filter(content_hash="")
+
+        self.totals = {"images": 0, "errors": 0}
+        self.started = time.monotonic()
+        last_pk = 0
+        with self._executor(options["workers"]) as executor:
+            while rows := list(
+                queryset.filter(pk__gt=last_pk).values_list("pk", "file")[
+                    : options["batch_size"]
+                ]
+            ):
+                last_pk = rows[-1][0]
+                names = sorted({name for _, name in rows if name})
+                results = dict(zip(names, executor.map(read_stored_metadata, names)))
+                self._write(rows, results)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done, metadata of {self.totals['images']} images recorded, "
+                f"{self.totals['errors']} skipped, in "
+                f"{time.monotonic() - self.started:.1f} s."
+            )
+        )
+
+    @staticmethod
+    def _executor(workers):
+        if workers == 0:
+            return _InlineExecutor()
+        # the initializer sets up Django where workers are not forked
+        return ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+    def _write(self, rows, results):
+        metadata = {}
+        for pk, name in rows:
+            values, error = results.get(name, (None, "The image has no file."))
+            if error is None:
+                metadata[pk] = (name, values)
+            else:
+                self.totals["errors"] += 1
+                self.stderr.write(f"Image {pk}: {error}")
+
+        now = timezone.now()
+        with transaction.atomic():
+            # skips the images whose file was replaced while it was read
+            current = dict(
+                Image.objects.select_for_update()
+                .filter(pk__in=metadata)
+                .values_list("pk", "file")
+            )
+            images = [
+                Image(pk=pk, version=F("version") + 1, updated_at=now, **values)
+                for pk, (name, values) in metadata.items()
+                if current.get(pk) == name
+            ]
+            Image.objects.bulk_update(
+                images, [*METADATA_FIELDS, "version", "updated_at"]
+            )
+
+        self.totals["images"] += len(images)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{self.totals['images']} images, {self.totals['errors']} errors, "
+            f"{self.totals['images'] / elapsed:.1f} images/s"
+        )
+
+
+def read_stored_metadata(name):
+    """Metadata of the stored image file `name`, or the error reading it."""
+    storage = Image._meta.get_field("file").storage
+    try:
+        with storage.open(name) as file:
+            return file_metadata(file), None
+    except OSError as exc:
+        return None, f"Cannot read {name}: {exc.strerror or exc}."
+
+
+class _InlineExecutor:
+    """Run the mapped calls in this process."""
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
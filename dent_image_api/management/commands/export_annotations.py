@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from rest_framework import serializers
+
+from dent_image_api.export import EXPORT_FORMATS, Export
+
+
+class Command(BaseCommand):
+    help = (
+        "Write all the images with their annotations as NDJSON or COCO JSON, "
+        "reading them with server-side cursors so that memory stays flat. The "
+        "filters are those of the list endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_FORMATS), default="ndjson"
+        )
+        parser.add_argument(
+            "--output", help="File to write, the standard output by default."
+        )
+        parser.add_argument(
+            "--direction",
+            choices=["external"],
+            help="Only export confirmed annotations.",
+        )
+        parser.add_argument("--class-id", action="append", default=[])
+        parser.add_argument("--tag", action="append", default=[])
+        parser.add_argument("--min-confidence")
+        parser.add_argument("--max-confidence")
+
+    def handle(self, *args, **options):
+        query_params = QueryDict(mutable=True)
+        query_params.setlist("class_id", options["class_id"])
+        query_params.setlist("tag", options["tag"])
+        for name in ("direction", "min_confidence", "max_confidence"):
+            if options[name] is not None:
+                query_params[name] = options[name]
+        try:
+            export = Export(query_params)
+        except serializers.ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        chunks = export.chunks(options["format"])
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
+
+        # the summary must not end up in the exported document
+        self.stderr.write(
+            f"Exported {export.images} images and {export.annotations} annotations.",
+            style_func=self.style.SUCCESS,
+        )
@@ -0,0 +1,240 @@
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from dent_image_api.ingest import (
+    EntryError,
+    discard_files,
+    prepare_entry,
+    read_entries,
+    restore_missing_files,
+)
+from dent_image_api.models import Annotation, Image, IngestCheckpoint, StoredFile
+
+# rows per INSERT, below the limit of 65535 query parameters of PostgreSQL
+INSERT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest the images of a directory, with their annotations when a JSONL or "
+        "CSV manifest is given (see dent_image_api/ingest.py). Files are decoded, "
+        "validated and stored by a pool of worker processes while the rows of the "
+        "previous batch are inserted. Every batch is committed together with the "
+        "position reached, so after a crash running the same command again "
+        "discards the files of the uncommitted batch and continues after the last "
+        "committed one. Invalid entries are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory of the image files.")
+        parser.add_argument(
+            "--manifest",
+            help="JSONL or CSV (by extension) file listing the images to ingest.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes, 0 to work in this process.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of entries committed per transaction.",
+        )
+        parser.add_argument(
+            "--job",
+            help="Name of the saved position, the manifest or directory by default.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start from the first entry instead of the saved position.",
+        )
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options["directory"])
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+        manifest = options["manifest"]
+        if manifest is not None and not os.path.isfile(manifest):
+            raise CommandError(f"{manifest} does not exist.")
+
+        job = options["job"] or os.path.abspath(manifest or directory)
+        if len(job) > IngestCheckpoint._meta.get_field("job").max_length:
+            raise CommandError("The job name is too long, choose one with --job.")
+        checkpoint, _ = IngestCheckpoint.objects.get_or_create(job=job)
+        self._discard_pending(checkpoint)
+        if options["restart"]:
+            checkpoint.position = 0
+            checkpoint.save(update_fields=["position", "updated_at"])
+        elif checkpoint.position:
+            self.stdout.write(f"Resuming after entry {checkpoint.position}.")
+
+        self.job = job
+        self.position = checkpoint.position
+        self.totals = {"images": 0, "annotations": 0, "errors": 0, "bytes": 0}
+        self.started = time.monotonic()
+
+        entries = islice(read_entries(directory, manifest), checkpoint.position, None)
+        with self._executor(options["workers"]) as executor:
+            self._ingest(executor, directory, entries, options["batch_size"])
+
+        totals = self.totals
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done, {totals['images']} images and {totals['annotations']} "
+                f"annotations ingested, {totals['errors']} entries skipped, in "
+                f"{time.monotonic() - self.started:.1f} s."
+            )
+        )
+
+    def _discard_pending(self, checkpoint):
+        if not checkpoint.pending_files:
+            return
+        # stored by a run stopped before it committed its last batch
+        discard_files(checkpoint.pending_files)
+        self.stdout.write(
+            f"Discarded {len(checkpoint.pending_files)} uncommitted files."
+        )
+        checkpoint.pending_files = []
+        checkpoint.save(update_fields=["pending_files", "updated_at"])
+
+    def _ingest(self, executor, directory, entries, batch_size):
+        # the workers prepare a batch while the previous one is inserted
+        pending = submitted = None
+        try:
+            for batch in _batches(entries, batch_size):
+                submitted = [
+                    (line, self._submit(executor, directory, entry))
+                    for line, entry in batch
+                ]
+                if pending is not None:
+                    self._commit(pending)
+                pending = submitted
+            if pending is not None:
+                self._commit(pending)
+        except BaseException:
+            # an error or an interrupt, the files the workers stored for the next
+            # batch are not recorded anywhere yet
+            if submitted is not None:
+                discard_files(_stored_files(submitted))
+            raise
+
+    @staticmethod
+    def _executor(workers):
+        if workers == 0:
+            return _InlineExecutor()
+        # the initializer sets up Django where workers are not forked
+        return ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+    @staticmethod
+    def _submit(executor, directory, entry):
+        if isinstance(entry, EntryError):
+            future = Future()
+            future.set_exception(entry)
+            return future
+        return executor.submit(prepare_entry, directory, entry)
+
+    def _commit(self, batch):
+        prepared = []
+        for line, future in batch:
+            try:
+                prepared.append(future.result())
+            except EntryError as exc:
+                self.totals["errors"] += 1
+                self.stderr.write(f"Entry at line {line}: {exc}")
+
+        position = self.position + len(batch)
+        names = [row["file"] for row in prepared]
+        # committed before the rows, for a run killed before the batch is
+        IngestCheckpoint.objects.filter(job=self.job).update(pending_files=names)
+        try:
+            with transaction.atomic():
+                images = Image.objects.bulk_create(
+                    [
+                        Image(file=row["file"], name=row["name"], **row["metadata"])
+                        for row in prepared
+                    ],
+                    batch_size=INSERT_BATCH_SIZE,
+                )
+                StoredFile.objects.acquire_many(row["file"] for row in prepared)
+                restore_missing_files(prepared)
+                annotations = Annotation.objects.bulk_create(
+                    [
+                        Annotation(image=image, **values)
+                        for image, row in zip(images, prepared)
+                        for values in row["annotations"]
+                    ],
+                    batch_size=INSERT_BATCH_SIZE,
+                )
+                IngestCheckpoint.objects.filter(job=self.job).update(
+                    position=position, pending_files=[]
+                )
+        except BaseException:
+            # also on KeyboardInterrupt, else the files are left unreferenced
+            discard_files(names)
+            raise
+
+        self.position = position
+        self.totals["images"] += len(images)
+        self.totals["annotations"] += len(annotations)
+        self.totals["bytes"] += sum(row["size"] for row in prepared)
+        self._report()
+
+    def _report(self):
+        elapsed = time.monotonic() - self.started
+        totals = self.totals
+        self.stdout.write(
+            f"{self.position} entries: {totals['images']} images, "
+            f"{totals['annotations']} annotations, {totals['errors']} errors, "
+            f"{totals['images'] / elapsed:.1f} images/s, "
+            f"{totals['bytes'] / 2**20 / elapsed:.1f} MiB/s"
+        )
+
+
+class _InlineExecutor:
+    """Run the submitted calls right away, in this process."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def _stored_files(batch):
+    """
+    Names of the files stored by the calls of `batch`, cancelling the ones not
+    started and waiting for the others.
+    """
+    for _, future in batch:
+        future.cancel()
+    names = []
+    for _, future in batch:
+        try:
+            names.append(future.result()["file"])
+        except Exception:
+            pass
+    return names
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,102 @@
+import os
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from dent_image_api.models import Image, StoredFile
+
+
+class Command(BaseCommand):
+    help = (
+        "Move image files into the hash-prefix directory layout of the images "
+        "storage and update the rows, in batches. The API can keep running: every "
+        "file is copied before its row points at it, and the old file is only "
+        "removed once no row references it any more. The command can be stopped "
+        "and run again at any time; images already in the layout are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of images read per batch.",
+        )
+        parser.add_argument(
+            "--start-after",
+            type=int,
+            default=0,
+            help="Only process images with a greater id, to resume a previous run.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the files that would be moved.",
+        )
+
+    def handle(self, *args, **options):
+        storage = Image._meta.get_field("file").storage
+        if not hasattr(storage, "layout_name"):
+            raise CommandError(
+                "The images storage does not use a hashed directory layout, "
+                "configure STORAGES['images'] first."
+            )
+
+        last_id = options["start_after"]
+        moved = 0
+        while True:
+            batch = list(
+                Image.objects.filter(pk__gt=last_id)
+                .exclude(file="")
+                .order_by("pk")
+                .values_list("pk", "file")[: options["batch_size"]]
+            )
+            if not batch:
+                break
+
+            for image_id, name in batch:
+                new_name = storage.layout_name(name)
+                if new_name == name:
+                    continue
+                if options["dry_run"]:
+                    self.stdout.write(f"{image_id}: {name} -> {new_name}")
+                elif self._move(storage, image_id, name, new_name):
+                    moved += 1
+
+            last_id = batch[-1][0]
+            self.stdout.write(f"Processed images up to id {last_id}, {moved} moved.")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {moved} images moved."))
+
+    @staticmethod
+    def _move(storage, image_id, name, new_name):
+        old_path = storage.path(name)
+        new_path = storage.path(new_name)
+        if not os.path.exists(new_path):
+            if not os.path.exists(old_path):
+                return False
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            try:
+                os.link(old_path, new_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                # another file system: copy under a temporary name first, so an
+                # interrupted run never leaves a partial file at the new name
+                shutil.copy2(old_path, new_path + ".tmp")
+                os.replace(new_path + ".tmp", new_path)
+
+        with transaction.atomic():
+            # the row may have changed since the batch was read
+            # a new version, so that cached representations and writes based on
+            # the old name are not taken for the current ones
+            if not Image.objects.filter(pk=image_id, file=name).update(
+                file=new_name, version=F("version") + 1, updated_at=timezone.now()
+            ):
+                return False
+            StoredFile.objects.acquire(new_name)
+            StoredFile.objects.release(name)
+        return True
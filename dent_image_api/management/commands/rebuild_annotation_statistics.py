@@ -0,0 +1,68 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+
+from dent_image_api.models import Annotation, ClassStatistics, ImageStatistics
+from dent_image_api.statistics import confidence_bucket
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the annotation statistics of every image and class from the "
+        "annotations. The statistics are kept up to date by every annotation "
+        "write; run this periodically to repair them after writes that bypass "
+        "the models, such as raw SQL or bulk image deletes. Annotation writes "
+        "wait until the recount is committed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of statistics rows inserted per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "LOCK TABLE {}, {} IN SHARE ROW EXCLUSIVE MODE".format(
+                        connection.ops.quote_name(ImageStatistics._meta.db_table),
+                        connection.ops.quote_name(ClassStatistics._meta.db_table),
+                    )
+                )
+
+            ImageStatistics.objects.all().delete()
+            ClassStatistics.objects.all().delete()
+
+            rows = (
+                Annotation.objects.values("image_id", "class_id", "confirmed")
+                .annotate(
+                    confidence_bucket=confidence_bucket(), count=models.Count("pk")
+                )
+                .order_by()
+                .iterator(chunk_size=batch_size)
+            )
+            while batch := list(islice(rows, batch_size)):
+                ImageStatistics.objects.bulk_create(
+                    [ImageStatistics(**row) for row in batch]
+                )
+
+            totals = (
+                ImageStatistics.objects.values(
+                    "class_id", "confirmed", "confidence_bucket"
+                )
+                .annotate(count=models.Sum("count"))
+                .order_by()
+            )
+            ClassStatistics.objects.bulk_create(
+                [ClassStatistics(**row) for row in totals], batch_size=batch_size
+            )
+
+        self.stdout.write(
+            f"Done, {ImageStatistics.objects.count()} image and "
+            f"{ClassStatistics.objects.count()} class statistics rows."
+        )
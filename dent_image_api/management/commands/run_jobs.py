@@ -0,0 +1,111 @@
+import contextlib
+import multiprocessing
+import os
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from dent_image_api.jobs import work
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the background jobs queued in the database (see dent_image_api/jobs.py) "
+        "with a pool of worker processes, each running jobs in a pool of threads. "
+        "Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number "
+        "of them may run on any number of nodes. Failed jobs are retried with an "
+        "exponential backoff. SIGTERM or SIGINT stops claiming jobs and exits once "
+        "the running ones are done."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes, 0 to work in this process.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Number of threads per process, 0 to run the jobs in the main thread.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if options["processes"] == 0:
+            with _signals_handled(stop.set):
+                totals = work(options["threads"], stop, options["burst"], self._report)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Done, {totals['run']} jobs run, {totals['failed']} failed."
+                )
+            )
+            return
+
+        # forked workers must not share the connections of this process
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(
+                target=self._work, args=(options["threads"], options["burst"])
+            )
+            for _ in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(
+            f"Started {len(workers)} worker processes of {options['threads']} "
+            f"threads, pids {', '.join(str(worker.pid) for worker in workers)}."
+        )
+
+        def stop_workers():
+            for worker in workers:
+                if worker.is_alive():
+                    os.kill(worker.pid, signal.SIGTERM)
+
+        with _signals_handled(stop_workers):
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS("Done, all workers stopped."))
+
+    def _work(self, threads, burst):
+        stop = threading.Event()
+        with _signals_handled(stop.set):
+            work(threads, stop, burst, self._report)
+
+    def _report(self, job, succeeded):
+        if succeeded:
+            self.stdout.write(f"{job} done.")
+            return
+
+        error = job.last_error.strip().splitlines()[-1]
+        if job.status == job.Status.FAILED:
+            self.stderr.write(
+                f"{job} failed for good after {job.attempts} attempts: {error}"
+            )
+        else:
+            self.stderr.write(
+                f"{job} failed (attempt {job.attempts} of {job.max_attempts}), "
+                f"retried at {job.run_at:%Y-%m-%d %H:%M:%S}: {error}"
+            )
+
+
+@contextlib.contextmanager
+def _signals_handled(handler):
+    """Call `handler` on SIGTERM and SIGINT instead of exiting."""
+    signals = (signal.SIGTERM, signal.SIGINT)
+    previous = [signal.signal(signum, lambda *args: handler()) for signum in signals]
+    try:
+        yield
+    finally:
+        for signum, previous_handler in zip(signals, previous):
+            signal.signal(signum, previous_handler)
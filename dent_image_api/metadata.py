@@ -0,0 +1,76 @@
+"""
+Metadata of image files, stored with every image so that nothing has to open
+and decode the file again to know its dimensions.
+
+`file_metadata()` reuses what an upload already computed: the image Pillow
+opened to validate it (the `image` attribute set by Django's `ImageField`) and
+the SHA-256 hashed while it streamed in (`content_hash`, see uploadhandlers.py).
+Whatever is missing is read in one pass over the file, in which Pillow only
+parses the header of the image.
+"""
+
+import hashlib
+import io
+
+from PIL import Image as PILImage
+
+# columns of Image set from its file
+METADATA_FIELDS = ["width", "height", "format", "mode", "byte_size", "content_hash"]
+
+# bytes read at most to find the header, past that the file is opened again
+HEADER_MAX_SIZE = 1024 * 1024
+
+
+def file_metadata(file):
+    """
+    Return the values of `METADATA_FIELDS` for the Django `File` of an image.
+    Sets `content_hash` and `image` on `file`, so that a content addressed
+    storage does not hash it again, nor this function read it again.
+    """
+    image = getattr(file, "image", None)
+    content_hash = getattr(file, "content_hash", None)
+    if image is None or content_hash is None:
+        image, content_hash = _read(file, image, content_hash)
+        file.image, file.content_hash = image, content_hash
+
+    return {
+        "width": image.width if image else None,
+        "height": image.height if image else None,
+        "format": (image.format or "") if image else "",
+        "mode": image.mode if image else "",
+        "byte_size": file.size,
+        "content_hash": content_hash,
+    }
+
+
+def _read(file, image, content_hash):
+    hasher = hashlib.sha256() if content_hash is None else None
+    header = bytearray()
+    file.seek(0)
+    for chunk in file.chunks():
+        if hasher is not None:
+            hasher.update(chunk)
+        if image is None and len(header) < HEADER_MAX_SIZE:
+            header += chunk
+            image = _open(header)
+        if hasher is None and image is not None:
+            break
+
+    if image is None:
+        # the header was not found at the start, e.g. a TIFF with its IFD last
+        file.seek(0)
+        image = _open(file)
+    file.seek(0)
+    return image, content_hash or hasher.hexdigest()
+
+
+def _open(data):
+    """The lazily opened image in `data`, None if it is not (yet) an image."""
+    if isinstance(data, bytearray):
+        data = io.BytesIO(bytes(data))
+    try:
+        with PILImage.open(data) as image:
+            # size, mode and format stay available once closed
+            return image
+    except Exception:
+        return None
@@ -0,0 +1,60 @@
+# Generated by Django 5.0 on 2026-10-18 11:22
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import dent_image_api.storage
+
+
+def count_stored_files(apps, schema_editor):
+    ImageModel = apps.get_model("dent_image_api", "Image")
+    StoredFileModel = apps.get_model("dent_image_api", "StoredFile")
+
+    references = (
+        ImageModel.objects.exclude(file="")
+        .values("file")
+        .annotate(ref_count=Count("id"))
+        .order_by()
+    )
+    StoredFileModel.objects.bulk_create(
+        (
+            StoredFileModel(name=reference["file"], ref_count=reference["ref_count"])
+            for reference in references.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0002_load_test_data_20240110_0642"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="image",
+            name="file",
+            field=models.ImageField(
+                storage=dent_image_api.storage.image_storage, upload_to="images/"
+            ),
+        ),
+        migrations.RunPython(
+            count_stored_files, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0003_storedfile_alter_image_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="annotation",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0004_version_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="confidence_percent",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="annotation",
+            name="confirmed",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="annotation",
+            index=models.Index(
+                fields=["image", "confirmed"], name="annotation_image_confirmed_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="annotation",
+            index=models.Index(
+                fields=["confirmed", "confidence_percent"],
+                name="annotation_confirmed_idx",
+            ),
+        ),
+    ]
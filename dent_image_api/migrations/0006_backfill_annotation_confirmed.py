@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-18 11:31
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_confirmed(apps, schema_editor):
+    AnnotationModel = apps.get_model("dent_image_api", "Annotation")
+
+    batch = []
+    for annotation in AnnotationModel.objects.only("meta").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        meta = annotation.meta if isinstance(annotation.meta, dict) else {}
+        annotation.confirmed = meta.get("confirmed") is True
+        annotation.confidence_percent = meta.get("confidence_percent")
+        batch.append(annotation)
+        if len(batch) == BATCH_SIZE:
+            AnnotationModel.objects.bulk_update(
+                batch, ["confirmed", "confidence_percent"]
+            )
+            batch = []
+
+    if batch:
+        AnnotationModel.objects.bulk_update(batch, ["confirmed", "confidence_percent"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0005_annotation_confirmed"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_confirmed, reverse_code=migrations.RunPython.noop
+        ),
+    ]
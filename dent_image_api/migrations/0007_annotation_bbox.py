@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0006_backfill_annotation_confirmed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="max_x",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="annotation",
+            name="max_y",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="annotation",
+            name="min_x",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="annotation",
+            name="min_y",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="annotation",
+            index=models.Index(
+                fields=["image", "min_x"],
+                include=("max_x", "min_y", "max_y"),
+                name="annotation_image_bbox_idx",
+            ),
+        ),
+    ]
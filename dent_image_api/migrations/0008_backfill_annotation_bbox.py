@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 11:34
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+BBOX_FIELDS = ["min_x", "min_y", "max_x", "max_y"]
+
+
+def backfill_bbox(apps, schema_editor):
+    AnnotationModel = apps.get_model("dent_image_api", "Annotation")
+
+    batch = []
+    for annotation in AnnotationModel.objects.only("shape").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        shape = annotation.shape if isinstance(annotation.shape, dict) else {}
+        x = [shape.get("start_x"), shape.get("end_x")]
+        y = [shape.get("start_y"), shape.get("end_y")]
+        if None in x or None in y:
+            continue
+
+        annotation.min_x, annotation.max_x = min(x), max(x)
+        annotation.min_y, annotation.max_y = min(y), max(y)
+        batch.append(annotation)
+        if len(batch) == BATCH_SIZE:
+            AnnotationModel.objects.bulk_update(batch, BBOX_FIELDS)
+            batch = []
+
+    if batch:
+        AnnotationModel.objects.bulk_update(batch, BBOX_FIELDS)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0007_annotation_bbox"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_bbox, reverse_code=migrations.RunPython.noop),
+    ]
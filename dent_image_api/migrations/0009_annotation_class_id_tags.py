@@ -0,0 +1,27 @@
+# Generated by Django 5.0 on 2026-10-18 11:29
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0008_backfill_annotation_bbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="annotation",
+            index=models.Index(
+                fields=["class_id", "image"], name="annotation_class_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="annotation",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["tags"],
+                name="annotation_tags_idx",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.0 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from dent_image_api.statistics import confidence_bucket
+
+
+def backfill_statistics(apps, schema_editor):
+    AnnotationModel = apps.get_model("dent_image_api", "Annotation")
+    ImageStatisticsModel = apps.get_model("dent_image_api", "ImageStatistics")
+    ClassStatisticsModel = apps.get_model("dent_image_api", "ClassStatistics")
+
+    rows = (
+        AnnotationModel.objects.values("image_id", "class_id", "confirmed")
+        .annotate(confidence_bucket=confidence_bucket(), count=models.Count("pk"))
+        .order_by()
+    )
+    ImageStatisticsModel.objects.bulk_create(
+        [ImageStatisticsModel(**row) for row in rows], batch_size=1000
+    )
+
+    totals = (
+        ImageStatisticsModel.objects.values(
+            "class_id", "confirmed", "confidence_bucket"
+        )
+        .annotate(count=models.Sum("count"))
+        .order_by()
+    )
+    ClassStatisticsModel.objects.bulk_create(
+        [ClassStatisticsModel(**row) for row in totals], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0009_annotation_class_id_tags"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClassStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("class_id", models.CharField(max_length=100)),
+                ("confirmed", models.BooleanField()),
+                ("confidence_bucket", models.SmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ImageStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("class_id", models.CharField(max_length=100)),
+                ("confirmed", models.BooleanField()),
+                ("confidence_bucket", models.SmallIntegerField()),
+                ("count", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="classstatistics",
+            constraint=models.UniqueConstraint(
+                fields=("class_id", "confirmed", "confidence_bucket"),
+                name="class_statistics_unique",
+            ),
+        ),
+        migrations.AddField(
+            model_name="imagestatistics",
+            name="image",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="statistics",
+                to="dent_image_api.image",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="imagestatistics",
+            constraint=models.UniqueConstraint(
+                fields=("image", "class_id", "confirmed", "confidence_bucket"),
+                name="image_statistics_unique",
+            ),
+        ),
+        migrations.RunPython(
+            backfill_statistics, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0011_ingestcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="byte_size",
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="format",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=16
+            ),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="height",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="mode",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=16
+            ),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="width",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dent_image_api", "0014_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingestcheckpoint",
+            name="pending_files",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,27 +1,306 @@
-import os
+import uuid
+from collections import Counter
+from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, transaction
+from django.utils import timezone
 
-from dent_image import settings
+from .metadata import file_metadata
+from .renditions import drop_renditions
+from .statistics import confidence_bucket, count_by_key
+from .storage import image_storage
+from .tiles import drop_tiles
+
+
+class StoredFileManager(models.Manager):
+    def acquire(self, name):
+        """Record one more reference to the stored file `name`."""
+        if self.filter(name=name).update(ref_count=models.F("ref_count") + 1):
+            return
+
+        _, created = self.get_or_create(name=name)
+        if not created:
+            # created concurrently by another transaction
+            self.filter(name=name).update(ref_count=models.F("ref_count") + 1)
+
+    def release(self, name):
+        """
+        Drop one reference to the stored file `name`. When it was the last one, a
+        job deleting the file is queued, which runs once the transaction commits.
+        """
+        if self.filter(name=name, ref_count__gt=1).update(
+            ref_count=models.F("ref_count") - 1
+        ):
+            return
+
+        self.filter(name=name).delete()
+        Job.objects.enqueue("delete_stored_file", name=name)
+
+    def delete_unreferenced(self, names, storage):
+        """
+        Delete from `storage` the files of `names` that no image references. Every
+        name is locked until the transaction commits, by its row or by a row with
+        no reference that is never committed, so that `acquire()` and
+        `acquire_many()` of the same name wait for the deletion: a deduplicating
+        storage may have returned the file to an upload just before it was
+        deleted, and the upload then stores it again, see `Image.save()`.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with transaction.atomic(using=self.db):
+            # rows are locked in the same order by every transaction, to avoid deadlocks
+            for name in sorted(set(names)):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"INSERT INTO {table} (name, ref_count) VALUES (%s, 0) "
+                        "ON CONFLICT (name) DO NOTHING",
+                        [name],
+                    )
+                referenced = (
+                    self.select_for_update().filter(name=name, ref_count__gt=0).exists()
+                )
+                if not referenced:
+                    storage.delete(name)
+            self.filter(name__in=names, ref_count=0).delete()
+
+    def acquire_many(self, names):
+        """Record one more reference to every name in `names`, in one upsert."""
+        # rows are locked in the same order by every transaction, to avoid deadlocks
+        rows = sorted(Counter(names).items())
+        if not rows:
+            return
+
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ", ".join(["(%s, %s)"] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (name, ref_count) VALUES {values} "
+                "ON CONFLICT (name) "
+                f"DO UPDATE SET ref_count = {table}.ref_count + EXCLUDED.ref_count",
+                [value for row in rows for value in row],
+            )
+
+
+class StoredFile(models.Model):
+    """
+    Number of `Image` rows referencing a stored file.
+
+    With a deduplicating storage several images may share one file, so a file is
+    only deleted when its last reference goes away. Files without a row are
+    treated as referenced once.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=1)
+
+    objects = StoredFileManager()
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+class VersionConflict(Exception):
+    """A write based on a version of a row that is no longer the current one."""
+
+
+class VersionedQuerySet(models.QuerySet):
+    def claim(self, pk, version):
+        """
+        Check that the row `pk` is still at `version` with one conditional UPDATE,
+        which also locks it until the end of the transaction, so that the writes
+        that follow are based on that version. Raise VersionConflict if the row
+        changed or was deleted. Must run in a transaction.
+        """
+        if not self.filter(pk=pk, version=version).update(version=models.F("version")):
+            raise VersionConflict
+
+
+class ImageQuerySet(VersionedQuerySet):
+    def lock(self, image_ids):
+        """
+        Lock the images with `image_ids` (ids or a subquery of ids) until the end
+        of the transaction, in pk order. Annotation writes lock their images
+        before any annotation row, so that concurrent writers take their row
+        locks in the same order and cannot deadlock. Must run in a transaction.
+        """
+        return list(
+            self.select_for_update()
+            .filter(pk__in=image_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def touch(self, image_ids):
+        """
+        Mark the images with `image_ids` as modified, so that their version and
+        Last-Modified validators change, which also makes their cached annotation
+        lists unreachable, and their annotation statistics are recounted. Called
+        for every write to their annotations.
+        """
+        image_ids = set(image_ids)
+        if not image_ids:
+            return 0
+
+        # the row locks taken here also serialize the statistics updates of an
+        # image, until the end of the transaction of the caller
+        touched = self.filter(pk__in=image_ids).update(
+            version=models.F("version") + 1, updated_at=timezone.now()
+        )
+        ImageStatistics.objects.refresh(image_ids)
+        return touched
 
 
 class Image(models.Model):
-    file = models.ImageField(upload_to="images/")
+    file = models.ImageField(upload_to="images/", storage=image_storage)
     name = models.CharField(max_length=200, blank=False)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # read from the file when it is assigned, see metadata.py
+    width = models.PositiveIntegerField(null=True, editable=False)
+    height = models.PositiveIntegerField(null=True, editable=False)
+    format = models.CharField(max_length=16, blank=True, default="", editable=False)
+    mode = models.CharField(max_length=16, blank=True, default="", editable=False)
+    byte_size = models.PositiveBigIntegerField(null=True, editable=False)
+    content_hash = models.CharField(
+        max_length=64, blank=True, default="", editable=False
+    )
+
+    objects = ImageQuerySet.as_manager()
+
+    # name of the file referenced by the database row, None if unknown (deferred)
+    _stored_file_name = ""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_file_name = instance.__dict__.get("file")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            # incremented in the database, as annotation writes also touch the row
+            self.version = models.F("version") + 1
+        new_file = self.file and not self.file._committed
+        content = self.file.file if new_file else None
+        if new_file:
+            for key, value in file_metadata(content).items():
+                setattr(self, key, value)
+
+        if self._stored_file_name is None or (
+            self.file._committed and self.file.name == self._stored_file_name
+        ):
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if self.file.name != self._stored_file_name:
+                    self._replace_stored_file(
+                        self._stored_file_name, self.file.name, content
+                    )
+
+        if isinstance(self.version, models.expressions.Combinable):
+            self.refresh_from_db(fields=["version"])
+        if new_file and settings.RENDITION_PREBUILD_WIDTHS:
+            Job.objects.enqueue("build_renditions", image_pk=self.pk)
 
     def delete(self, *args, **kwargs):
-        if self.file:
-            file_path = os.path.join(settings.MEDIA_ROOT, self.file.name)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        with transaction.atomic():
+            # nothing serves the derived files of a deleted image, so they may
+            # be removed later
+            Job.objects.enqueue("drop_derived_files", image_pk=self.pk)
+            ImageStatistics.objects.discard(self.pk)
+            deleted = super().delete(*args, **kwargs)
+            if self._stored_file_name:
+                StoredFile.objects.release(self._stored_file_name)
+
+        return deleted
+
+    def _replace_stored_file(self, old_name, new_name, content=None):
+        if new_name:
+            StoredFile.objects.acquire(new_name)
+            storage = self.file.storage
+            if content is not None and not storage.exists(new_name):
+                # a deduplicating storage returned a file that was deleted as
+                # unreferenced before acquire() (which waits for deletions)
+                storage.save(new_name, content)
+        if old_name:
+            StoredFile.objects.release(old_name)
+            # the old file is served until the transaction commits, and its
+            # renditions are kept under its own key until then, see renditions.py
+            transaction.on_commit(self.drop_derived_files)
+        self._stored_file_name = new_name
 
-        super().delete(*args, **kwargs)
+    def drop_derived_files(self):
+        """Remove the cached renditions and tiles made from the files of the image."""
+        drop_renditions(self.pk)
+        drop_tiles(self.pk)
 
     def __str__(self):
         return self.name
 
 
+class AnnotationQuerySet(VersionedQuerySet):
+    """
+    Bulk operations bypass `Annotation.save()` and `Annotation.delete()`, so they
+    run the model validation on every object and touch the parent images
+    themselves, in the transaction of the write. The images are locked first,
+    see `ImageQuerySet.lock()`.
+    """
+
+    def claim(self, pk, version):
+        Image.objects.lock(self.filter(pk=pk).values("image_id"))
+        super().claim(pk, version)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.clean()
+            obj.sync_derived_fields()
+        with transaction.atomic():
+            Image.objects.lock({obj.image_id for obj in objs})
+            created = super().bulk_create(objs, *args, **kwargs)
+            Image.objects.touch(obj.image_id for obj in objs)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.clean()
+            obj.sync_derived_fields()
+            obj.version += 1
+            obj.updated_at = now
+        with transaction.atomic():
+            # the images annotations are moved away from as well
+            image_ids = Image.objects.lock(
+                {obj.image_id for obj in objs}.union(
+                    self.filter(pk__in=[obj.pk for obj in objs]).values_list(
+                        "image_id", flat=True
+                    )
+                )
+            )
+            updated = super().bulk_update(
+                objs,
+                [*fields, *Annotation.DERIVED_FIELDS, "version", "updated_at"],
+                *args,
+                **kwargs,
+            )
+            Image.objects.touch(image_ids)
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            image_ids = Image.objects.lock(self.values("image_id"))
+            deleted = super().delete()
+            Image.objects.touch(image_ids)
+        return deleted
+
+
 class Annotation(models.Model):
     image = models.ForeignKey(
         Image, related_name="annotations", on_delete=models.CASCADE
@@ -33,6 +312,53 @@ class Annotation(models.Model):
 
     relations = models.JSONField(null=True, blank=True)
     surface = models.JSONField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # typed copies of `meta` values, kept in sync on every write so they can be indexed
+    confirmed = models.BooleanField(default=False, editable=False)
+    confidence_percent = models.FloatField(null=True, blank=True, editable=False)
+
+    # bounding box of `shape`, with min <= max whatever the drawing direction
+    min_x = models.IntegerField(null=True, blank=True, editable=False)
+    min_y = models.IntegerField(null=True, blank=True, editable=False)
+    max_x = models.IntegerField(null=True, blank=True, editable=False)
+    max_y = models.IntegerField(null=True, blank=True, editable=False)
+
+    DERIVED_FIELDS = [
+        "confirmed",
+        "confidence_percent",
+        "min_x",
+        "min_y",
+        "max_x",
+        "max_y",
+    ]
+
+    objects = AnnotationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["image", "confirmed"], name="annotation_image_confirmed_idx"
+            ),
+            models.Index(
+                fields=["confirmed", "confidence_percent"],
+                name="annotation_confirmed_idx",
+            ),
+            models.Index(fields=["class_id", "image"], name="annotation_class_id_idx"),
+            # serves `tags @> '["36"]'`, i.e. the tags__contains lookup
+            GinIndex(
+                fields=["tags"],
+                opclasses=["jsonb_path_ops"],
+                name="annotation_tags_idx",
+            ),
+            # bounding box queries of an image are answered from the index alone
+            models.Index(
+                fields=["image", "min_x"],
+                include=["max_x", "min_y", "max_y"],
+                name="annotation_image_bbox_idx",
+            ),
+        ]
 
     def clean(self):
         # Validate shape
@@ -47,6 +373,13 @@ class Annotation(models.Model):
             if k in required_shape_keys
         ):
             raise ValidationError("Shape coordinates must be integers.")
+        # the range of the integer columns of the bounding box
+        if self.shape and not all(
+            -(2**31) <= self.shape[k] < 2**31 for k in required_shape_keys
+        ):
+            raise ValidationError(
+                "Shape coordinates must be between -2147483648 and 2147483647."
+            )
 
         # Validate tags
         if self.tags and not isinstance(self.tags, list):
@@ -71,12 +404,302 @@ class Annotation(models.Model):
             ):
                 raise ValidationError("'confidence_percent' must be between 0 and 1.")
 
+    def sync_derived_fields(self):
+        """Copy the values of `DERIVED_FIELDS` from the JSON fields."""
+        meta = self.meta if isinstance(self.meta, dict) else {}
+        self.confirmed = meta.get("confirmed") is True
+        self.confidence_percent = meta.get("confidence_percent")
+
+        shape = self.shape if isinstance(self.shape, dict) else {}
+        x = [shape.get("start_x"), shape.get("end_x")]
+        y = [shape.get("start_y"), shape.get("end_y")]
+        if None in x or None in y:
+            self.min_x = self.min_y = self.max_x = self.max_y = None
+        else:
+            self.min_x, self.max_x = min(x), max(x)
+            self.min_y, self.max_y = min(y), max(y)
+
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        self.sync_derived_fields()
+        if not self._state.adding:
+            self.version += 1
+        # the statistics are recounted under the lock of the image row taken by
+        # touch(), which is only held until the end of a transaction
+        with transaction.atomic():
+            image_ids = {self.image_id}
+            if not self._state.adding:
+                # the image the annotation is moved away from as well
+                image_ids.update(
+                    Annotation.objects.filter(pk=self.pk).values_list(
+                        "image_id", flat=True
+                    )
+                )
+            image_ids = Image.objects.lock(image_ids)
+            super().save(*args, **kwargs)
+            Image.objects.touch(image_ids)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Image.objects.lock([self.image_id])
+            deleted = super().delete(*args, **kwargs)
+            Image.objects.touch([self.image_id])
+        return deleted
 
     def is_confirmed(self):
         return self.meta.get("confirmed", False)
 
     def __str__(self):
         return f"Annotation {self.id} for {self.image.name}"
+
+
+class ImageStatisticsManager(models.Manager):
+    def refresh(self, image_ids):
+        """
+        Recount the annotations of the images with `image_ids` and add the
+        difference to the per-class totals.
+        """
+        old_rows = self.filter(image_id__in=image_ids)
+        new_rows = [
+            ImageStatistics(**row)
+            for row in Annotation.objects.filter(image_id__in=image_ids)
+            .values("image_id", "class_id", "confirmed")
+            .annotate(confidence_bucket=confidence_bucket(), count=models.Count("pk"))
+            .order_by()
+        ]
+        delta = count_by_key(new_rows)
+        delta.subtract(count_by_key(old_rows))
+
+        old_rows.delete()
+        self.bulk_create(new_rows)
+        ClassStatistics.objects.add(delta)
+
+    def discard(self, image_id):
+        """Remove the annotations of the image from the per-class totals."""
+        Image.objects.select_for_update().filter(pk=image_id).exists()
+        rows = self.filter(image_id=image_id)
+        delta = Counter()
+        delta.subtract(count_by_key(rows))
+        ClassStatistics.objects.add(delta)
+        rows.delete()
+
+
+class ImageStatistics(models.Model):
+    """
+    Number of annotations of an image by class, confirmation and confidence
+    histogram bucket. Kept up to date by `ImageQuerySet.touch()`.
+    """
+
+    image = models.ForeignKey(
+        Image, related_name="statistics", on_delete=models.CASCADE
+    )
+    class_id = models.CharField(max_length=100)
+    confirmed = models.BooleanField()
+    confidence_bucket = models.SmallIntegerField()
+    count = models.PositiveIntegerField()
+
+    objects = ImageStatisticsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["image", "class_id", "confirmed", "confidence_bucket"],
+                name="image_statistics_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.class_id} annotations of image {self.image_id}"
+
+
+class ClassStatisticsManager(models.Manager):
+    def add(self, delta):
+        """
+        Add the counts of `delta`, a mapping of (class_id, confirmed, bucket) to a
+        possibly negative number, to the totals in one upsert.
+        """
+        # rows are locked in the same order by every transaction, to avoid deadlocks
+        rows = sorted((key, count) for key, count in delta.items() if count)
+        if not rows:
+            return
+
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        params = [value for key, count in rows for value in (*key, count)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (class_id, confirmed, confidence_bucket, count) "
+                f"VALUES {values} "
+                "ON CONFLICT (class_id, confirmed, confidence_bucket) "
+                f"DO UPDATE SET count = {table}.count + EXCLUDED.count",
+                params,
+            )
+
+
+class ClassStatistics(models.Model):
+    """
+    Number of annotations of all the images by class, confirmation and confidence
+    histogram bucket, so that dashboards read one row per bucket and class.
+    """
+
+    class_id = models.CharField(max_length=100)
+    confirmed = models.BooleanField()
+    confidence_bucket = models.SmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    objects = ClassStatisticsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["class_id", "confirmed", "confidence_bucket"],
+                name="class_statistics_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.class_id} annotations"
+
+
+class IngestCheckpoint(models.Model):
+    """
+    Number of entries of a bulk ingest committed so far, updated in the same
+    transaction as the rows, see the `ingest_images` command. `pending_files`
+    holds the names stored for the batch being committed, for a resumed run to
+    discard them when the batch was not.
+    """
+
+    job = models.CharField(max_length=255, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    pending_files = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job} at entry {self.position}"
+
+
+class JobManager(models.Manager):
+    def enqueue(self, task, delay=0, **payload):
+        """
+        Queue a run of `task` (a task of jobs.py) with the JSON `payload` as its
+        keyword arguments, due in `delay` seconds. Queued in a transaction, the
+        job only exists if the transaction commits.
+        """
+        return self.create(
+            task=task,
+            payload=payload,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+        )
+
+    def claim(self, limit, lease):
+        """
+        Reserve up to `limit` due jobs for `lease` seconds and return them. Rows
+        locked by workers claiming at the same time are skipped instead of waited
+        for, and jobs whose lease expired (their worker died) are claimed again.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                self.select_for_update(skip_locked=True)
+                .filter(
+                    models.Q(status=Job.Status.QUEUED)
+                    | models.Q(status=Job.Status.RUNNING, locked_until__lt=now),
+                    run_at__lte=now,
+                )
+                .order_by("run_at", "pk")[:limit]
+            )
+            locked_until = now + timedelta(seconds=lease)
+            self.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.Status.RUNNING,
+                attempts=models.F("attempts") + 1,
+                locked_until=locked_until,
+            )
+
+        for job in jobs:
+            job.status = Job.Status.RUNNING
+            job.attempts += 1
+            job.locked_until = locked_until
+        return jobs
+
+
+class Job(models.Model):
+    """
+    A background job, see jobs.py. Finished jobs are deleted, jobs that failed
+    `max_attempts` times are kept with their last error.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        FAILED = "failed"
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = JobManager()
+
+    class Meta:
+        indexes = [
+            # the due jobs, what workers poll for
+            models.Index(
+                fields=["run_at"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="job_due_idx",
+            ),
+        ]
+
+    def complete(self):
+        """Delete the job, unless its lease expired and another worker claimed it."""
+        Job.objects.filter(pk=self.pk, attempts=self.attempts).delete()
+
+    def fail(self, error, retry_delay):
+        """Record `error` and retry the job in `retry_delay` seconds, if attempts remain."""
+        if self.attempts < self.max_attempts:
+            self.status = Job.Status.QUEUED
+            self.run_at = timezone.now() + timedelta(seconds=retry_delay)
+        else:
+            self.status = Job.Status.FAILED
+        self.last_error = error
+        Job.objects.filter(pk=self.pk, attempts=self.attempts).update(
+            status=self.status, run_at=self.run_at, last_error=error
+        )
+
+    def __str__(self):
+        return f"Job {self.pk} {self.task}"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload, see uploads.py: the first `offset` bytes of the file of
+    `size` bytes are stored in its partial file.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # image whose file is replaced when the upload is finalized, a new image
+    # is created without
+    image = models.ForeignKey(
+        Image,
+        related_name="upload_sessions",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Upload {self.pk} of {self.filename}, {self.offset}/{self.size} bytes"
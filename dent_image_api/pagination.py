@@ -0,0 +1,58 @@
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.request import Request
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key.
+
+    Every page is fetched with `WHERE id > <cursor> ORDER BY id LIMIT <size>`, so
+    its cost does not depend on how deep the page is or on the table size, and no
+    `COUNT(*)` is issued. The `next`/`previous` links carry opaque cursors.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async variant of `paginate_queryset()` for plain Django requests, reading
+        the page with the async ORM. The cursors are the same as the sync ones;
+        as `id` is unique, they never need an offset.
+        """
+        request = Request(request)
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+        position = self.cursor.position if self.cursor else None
+
+        if reverse:
+            queryset = queryset.order_by("-id")
+            if position is not None:
+                queryset = queryset.filter(id__lt=position)
+        else:
+            queryset = queryset.order_by("id")
+            if position is not None:
+                queryset = queryset.filter(id__gt=position)
+
+        results = [row async for row in queryset[: self.page_size + 1]]
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        return self.page
+
+    def get_paginated_data(self, data):
+        """The body of `get_paginated_response()` after `apaginate_queryset()`."""
+        next_link = previous_link = None
+        if self.page and self.has_next:
+            position = self._get_position_from_instance(self.page[-1], ["id"])
+            next_link = self.encode_cursor(Cursor(0, False, position))
+        if self.page and self.has_previous:
+            position = self._get_position_from_instance(self.page[0], ["id"])
+            previous_link = self.encode_cursor(Cursor(0, True, position))
+        return {"next": next_link, "previous": previous_link, "results": data}
@@ -0,0 +1,156 @@
+"""
+Downscaled JPEG renditions of images, rendered once and kept in a size-bounded
+cache directory.
+
+Renditions live in `RENDITION_CACHE_ROOT/<image id>/<file key>/<width>.jpg`,
+the file key naming the file they were rendered from (see `file_key()`): a
+rendition of a replaced file, even one finished after the replacement, is never
+served for the new file. Reading a rendition touches its mtime, and when the
+cache grows over `RENDITION_CACHE_MAX_BYTES` the least recently used renditions
+are evicted.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from PIL import Image as PILImage
+
+
+# bytes in the cache as last counted by this process, None before the first count
+_cache_size = None
+_cache_size_lock = threading.Lock()
+
+
+def get_rendition(image, width):
+    """
+    Return the path of the `width` pixels wide rendition of `image`, rendering it
+    if it is not cached yet.
+    """
+    path = _rendition_path(image, width)
+    try:
+        # mark as recently used for the LRU eviction
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    _render(image, width, path)
+    _count_rendition(os.path.getsize(path), settings.RENDITION_CACHE_MAX_BYTES, path)
+    return path
+
+
+def drop_renditions(image_pk):
+    """Remove all cached renditions of the image with `image_pk`."""
+    shutil.rmtree(
+        os.path.join(settings.RENDITION_CACHE_ROOT, str(image_pk)), ignore_errors=True
+    )
+
+
+def file_key(image):
+    """
+    Key of the file of `image` in the paths of the files derived from it, which
+    changes when the file is replaced.
+    """
+    return hashlib.md5(image.file.name.encode(), usedforsecurity=False).hexdigest()[:16]
+
+
+def to_8bit(picture):
+    """
+    Return 16-bit and floating point pictures, such as "I;16" radiographs, as
+    8-bit grayscale stretched over their range of values, which convert() would
+    clip to white instead. Other pictures are returned as they are.
+    """
+    if picture.mode != "F" and not picture.mode.startswith("I"):
+        return picture
+
+    if picture.mode != "F":
+        picture = picture.convert("I")
+    low, high = picture.getextrema()
+    scale = 255 / (high - low) if high > low else 0
+    return picture.point(lambda value: (value - low) * scale).convert("L")
+
+
+def _rendition_path(image, width):
+    return os.path.join(
+        settings.RENDITION_CACHE_ROOT, str(image.pk), file_key(image), f"{width}.jpg"
+    )
+
+
+def _render(image, width, path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    with image.file.open("rb") as source, PILImage.open(source) as picture:
+        picture = to_8bit(picture)
+        # thumbnail() never upscales and lets the JPEG decoder skip the full decode
+        picture.thumbnail((width, picture.height))
+        if picture.mode not in ("L", "RGB"):
+            picture = picture.convert("RGB")
+
+        # write to a temporary file first so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                picture.save(tmp_file, format="JPEG", quality=85)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _count_rendition(size, max_bytes, keep):
+    """
+    Add a rendition of `size` bytes to the size of the cache, evicting renditions
+    when it is over `max_bytes`. The cache directory is only scanned on the
+    first rendition of the process and when the count is over the limit, so
+    renditions written by other processes meanwhile may take the cache over the
+    limit until then.
+    """
+    global _cache_size
+    with _cache_size_lock:
+        if _cache_size is not None:
+            _cache_size += size
+            if _cache_size <= max_bytes:
+                return
+
+    total_size = _evict(max_bytes, keep)
+    with _cache_size_lock:
+        _cache_size = total_size
+
+
+def _evict(max_bytes, keep):
+    """Evict renditions until the cache fits `max_bytes`, return its size."""
+    renditions = []
+    total_size = 0
+    for path, stat in _scan_cache():
+        total_size += stat.st_size
+        # renditions being written and the one just rendered are never evicted
+        if path != keep and not path.endswith(".tmp"):
+            renditions.append((stat.st_mtime, stat.st_size, path))
+
+    if total_size <= max_bytes:
+        return total_size
+
+    renditions.sort()
+    for _, size, path in renditions:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+        if total_size <= max_bytes:
+            break
+    return total_size
+
+
+def _scan_cache():
+    for directory, _, filenames in os.walk(settings.RENDITION_CACHE_ROOT):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                yield path, os.stat(path)
+            except FileNotFoundError:
+                continue
@@ -0,0 +1,131 @@
+"""
+Read-only representations built straight from `.values()` rows.
+
+They produce exactly the output of `ImageSerializer` and `AnnotationSerializer`
+without instantiating a serializer and its fields per object, which dominates
+the cost of the list endpoints. Any change to the fields of those serializers
+must be mirrored here; tests/test_representations.py checks that both agree.
+"""
+
+from rest_framework.response import Response
+
+from .metadata import METADATA_FIELDS
+from .models import Annotation, Image
+
+ANNOTATION_VALUES = [
+    "id",
+    "image_id",
+    "class_id",
+    "shape",
+    "tags",
+    "meta",
+    "relations",
+    "surface",
+]
+IMAGE_VALUES = ["id", "file", "name", *METADATA_FIELDS]
+
+
+def _tags(tags):
+    # ListField(child=CharField())
+    return [str(tag) if tag is not None else None for tag in tags]
+
+
+def annotation_representation(row):
+    return {
+        "id": row["id"],
+        "image": row["image_id"],
+        "class_id": row["class_id"],
+        "shape": row["shape"],
+        "tags": _tags(row["tags"]),
+        "meta": row["meta"],
+        "relations": row["relations"],
+        "surface": row["surface"],
+    }
+
+
+def annotation_representations(rows):
+    return [annotation_representation(row) for row in rows]
+
+
+def image_representations(rows, request=None):
+    """
+    Represent the image rows with their annotations, which are read with one
+    query for all of them.
+    """
+    rows = list(rows)
+    annotation_rows = _annotation_rows([row["id"] for row in rows]) if rows else []
+    return _image_representations(rows, annotation_rows, request)
+
+
+async def aimage_representations(rows, request=None):
+    """Async variant of `image_representations()`, for a list of rows."""
+    annotation_rows = []
+    if rows:
+        annotation_rows = [
+            row async for row in _annotation_rows([row["id"] for row in rows])
+        ]
+    return _image_representations(rows, annotation_rows, request)
+
+
+def _annotation_rows(image_ids):
+    return (
+        Annotation.objects.filter(image_id__in=image_ids)
+        .order_by("id")
+        .values(*ANNOTATION_VALUES)
+    )
+
+
+def _image_representations(rows, annotation_rows, request):
+    annotations = {row["id"]: [] for row in rows}
+    for annotation in annotation_rows:
+        annotations[annotation["image_id"]].append(
+            annotation_representation(annotation)
+        )
+
+    return [image_representation(row, annotations[row["id"]], request) for row in rows]
+
+
+def image_representation(row, annotations, request=None):
+    """Represent an image row with its already represented `annotations`."""
+    return {
+        "id": row["id"],
+        "file": file_url(row["file"], request),
+        "name": row["name"],
+        "width": row["width"],
+        "height": row["height"],
+        "format": row["format"],
+        "mode": row["mode"],
+        "byte_size": row["byte_size"],
+        "content_hash": row["content_hash"],
+        "annotations": annotations,
+    }
+
+
+def file_url(name, request=None):
+    """URL of the image file `name`, like `ImageSerializer` (UPLOADED_FILES_USE_URL)."""
+    if not name:
+        return None
+    url = Image._meta.get_field("file").storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class ValuesListMixin:
+    """
+    List action reading `list_values` of every object with `.values()` and
+    turning the rows into the serializer output with `represent_rows()`, which
+    returns the rows as they are unless overridden.
+    """
+
+    list_values = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.list_values)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.represent_rows(page))
+
+        return Response(self.represent_rows(queryset))
+
+    def represent_rows(self, rows):
+        return [{field: row[field] for field in self.list_values} for row in rows]
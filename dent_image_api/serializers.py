@@ -1,11 +1,18 @@
 import json
-import os
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from rest_framework import serializers
 from rest_framework.fields import empty
 
-from .models import Annotation, Image
+from .formats import json_loads
+from .metadata import METADATA_FIELDS
+from .models import Annotation, Image, UploadSession
+from .uploads import start_session, validate_filename
+
+# annotation columns that nested writes may change
+ANNOTATION_DATA_FIELDS = ["class_id", "shape", "tags", "meta", "relations", "surface"]
 
 
 class StrictFieldsMixin:
@@ -54,9 +61,11 @@ class AnnotationSerializer(StrictFieldsMixin, serializers.ModelSerializer):
 
 
 class AnnotationsInImageSerializer(AnnotationSerializer):
-    image = serializers.PrimaryKeyRelatedField(
-        queryset=Image.objects.all(), required=False
-    )
+    # nested annotations always belong to the parent image, so there is nothing to
+    # look up per annotation
+    image = serializers.PrimaryKeyRelatedField(read_only=True)
+    # writable, so that ImageSerializer.update can match annotations to existing rows
+    id = serializers.IntegerField(required=False)
 
 
 class ImageSerializer(StrictFieldsMixin, serializers.ModelSerializer):
@@ -66,12 +75,12 @@ class ImageSerializer(StrictFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Image
-        fields = ["id", "file", "name", "annotations"]
+        fields = ["id", "file", "name", *METADATA_FIELDS, "annotations"]
 
     def to_internal_value(self, data):
         if "annotations" in data and isinstance(data["annotations"], str):
             try:
-                data["annotations"] = json.loads(data["annotations"])
+                data["annotations"] = json_loads(data["annotations"])
             except json.JSONDecodeError:
                 raise serializers.ValidationError(
                     {"annotations": ["Invalid JSON format for annotations"]}
@@ -88,59 +97,171 @@ class ImageSerializer(StrictFieldsMixin, serializers.ModelSerializer):
         return super().validate(attrs)
 
     def create(self, validated_data):
+        annotations = [
+            self._build_annotation(Annotation(), annotation_data)
+            for annotation_data in validated_data.pop("annotations", [])
+        ]
+        self._clean_annotations(annotations)
+
         with transaction.atomic():
-            annotations_data = validated_data.pop("annotations", [])
             image = Image.objects.create(**validated_data)
-
-            for annotation_data in annotations_data:
-                Annotation.objects.create(image=image, **annotation_data)
+            for annotation in annotations:
+                annotation.image = image
+            Annotation.objects.bulk_create(annotations)
 
         return image
 
     def update(self, instance, validated_data):
-        old_file_path = None
-
-        if "name" in validated_data:
-            instance.name = validated_data.get("name", instance.name)
-
-        if "file" in validated_data:
-            old_file_path = instance.file.path
-            instance.file = validated_data.get("file")
-
-        instance.save()
-
-        # after save we will got a new copy of file, so we can remove old one
-        new_file_path = instance.file.path if instance.file else None
-        if (
-            old_file_path
-            and old_file_path != new_file_path
-            and os.path.isfile(old_file_path)
-        ):
-            os.remove(old_file_path)
-
-        if "annotations" in validated_data:
-            annotations_data = validated_data.pop("annotations")
-            existing_annotations = {
-                anno.id: anno for anno in instance.annotations.all()
-            }
-
-            for annotation_data in annotations_data:
-                annotation_id = annotation_data.get("id")
-                if annotation_id and annotation_id in existing_annotations:
-                    anno_instance = existing_annotations[annotation_id]
-                    for key, value in annotation_data.items():
-                        setattr(anno_instance, key, value)
-                    anno_instance.save()
-                elif not annotation_id:
-                    Annotation.objects.create(image=instance, **annotation_data)
-
-            incoming_ids = set(
-                anno_data.get("id")
-                for anno_data in annotations_data
-                if "id" in anno_data
-            )
-            for anno_id, anno_instance in existing_annotations.items():
-                if anno_id not in incoming_ids:
-                    anno_instance.delete()
+        with transaction.atomic():
+            if "annotations" in validated_data:
+                self._update_annotations(instance, validated_data.pop("annotations"))
+
+            if "name" in validated_data:
+                instance.name = validated_data.get("name", instance.name)
+
+            if "file" in validated_data:
+                # the replaced file is released by Image.save()
+                instance.file = validated_data.get("file")
+
+            instance.save()
 
         return instance
+
+    def _update_annotations(self, instance, annotations_data):
+        """
+        Replace the annotations of `instance` with `annotations_data` using one bulk
+        insert, one bulk update and one delete, whatever the number of annotations.
+        """
+        existing_annotations = {anno.id: anno for anno in instance.annotations.all()}
+        to_create = []
+        to_update = []
+
+        for annotation_data in annotations_data:
+            annotation_id = annotation_data.get("id")
+            if annotation_id and annotation_id in existing_annotations:
+                annotation = existing_annotations[annotation_id]
+                to_update.append(annotation)
+            elif not annotation_id:
+                annotation = Annotation(image=instance)
+                to_create.append(annotation)
+            else:
+                continue
+            self._build_annotation(annotation, annotation_data)
+
+        self._clean_annotations(to_update + to_create)
+
+        incoming_ids = set(
+            anno_data.get("id") for anno_data in annotations_data if "id" in anno_data
+        )
+        stale_ids = [
+            anno_id for anno_id in existing_annotations if anno_id not in incoming_ids
+        ]
+
+        if stale_ids:
+            Annotation.objects.filter(id__in=stale_ids).delete()
+        if to_update:
+            Annotation.objects.bulk_update(to_update, ANNOTATION_DATA_FIELDS)
+        if to_create:
+            Annotation.objects.bulk_create(to_create)
+
+    @staticmethod
+    def _build_annotation(annotation, annotation_data):
+        for key, value in annotation_data.items():
+            if key != "id":
+                setattr(annotation, key, value)
+        return annotation
+
+    @staticmethod
+    def _clean_annotations(annotations):
+        """
+        Run the model validation on all annotations before anything is written.
+        Failures are reported per annotation, the same way nested serializers do.
+        """
+        errors = []
+        for annotation in annotations:
+            try:
+                annotation.clean()
+            except DjangoValidationError as exc:
+                errors.append({"non_field_errors": exc.messages})
+            else:
+                errors.append({})
+
+        if any(errors):
+            raise serializers.ValidationError({"annotations": errors})
+
+
+class PreloadedImageField(serializers.PrimaryKeyRelatedField):
+    """
+    Image looked up in `context["images"]`, a mapping of the images preloaded for
+    a whole batch of annotations, instead of with one query per annotation.
+    """
+
+    def to_internal_value(self, data):
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.context["images"][pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+class BatchAnnotationSerializer(AnnotationSerializer):
+    image = PreloadedImageField(queryset=Image.objects.all())
+
+
+class AnnotationOperationSerializer(serializers.Serializer):
+    OPERATIONS = ["create", "update", "partial_update", "delete"]
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.IntegerField(required=False)
+    # version the operation is based on, checked like an If-Match header
+    version = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs["op"] == "create" and "id" in attrs:
+            raise serializers.ValidationError(
+                {"id": ["Created annotations get their id from the server."]}
+            )
+        if attrs["op"] == "create" and "version" in attrs:
+            raise serializers.ValidationError(
+                {"version": ["Created annotations have no version yet."]}
+            )
+        if attrs["op"] != "create" and "id" not in attrs:
+            raise serializers.ValidationError({"id": ["This field is required."]})
+        if attrs["op"] != "delete" and "data" not in attrs:
+            raise serializers.ValidationError({"data": ["This field is required."]})
+        return attrs
+
+
+class AnnotationBatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=AnnotationOperationSerializer(),
+        allow_empty=False,
+        max_length=settings.ANNOTATION_BATCH_MAX_OPERATIONS,
+    )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(min_value=1, max_value=settings.UPLOAD_MAX_SIZE)
+    image = serializers.PrimaryKeyRelatedField(
+        queryset=Image.objects.all(), required=False, allow_null=True
+    )
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "size", "offset", "image", "expires_at"]
+        read_only_fields = ["offset", "expires_at"]
+
+    def validate_filename(self, value):
+        return validate_filename(value)
+
+    def create(self, validated_data):
+        return start_session(**validated_data)
+
+
+class UploadFinalizeSerializer(serializers.Serializer):
+    # required for a new image, renames an existing one
+    name = serializers.CharField(max_length=200, required=False)
@@ -0,0 +1,65 @@
+from collections import Counter
+
+from django.db import models
+from django.db.models.functions import Cast, Floor, Least
+
+# confidence histograms have buckets [0.0, 0.1), [0.1, 0.2), ..., [0.9, 1.0]
+CONFIDENCE_BUCKETS = 10
+# bucket of the annotations without a confidence_percent
+UNKNOWN_CONFIDENCE = -1
+
+
+def confidence_bucket(field="confidence_percent"):
+    """Database expression of the histogram bucket of the confidence in `field`."""
+    # not Coalesce(Least(...)), LEAST ignores NULL arguments in PostgreSQL
+    return models.Case(
+        models.When(**{f"{field}__isnull": True}, then=UNKNOWN_CONFIDENCE),
+        default=Least(
+            Cast(
+                Floor(models.F(field) * CONFIDENCE_BUCKETS),
+                output_field=models.IntegerField(),
+            ),
+            models.Value(CONFIDENCE_BUCKETS - 1),
+        ),
+    )
+
+
+def count_by_key(rows):
+    """Sum the `count` of statistics rows by (class_id, confirmed, bucket)."""
+    counts = Counter()
+    for row in rows:
+        counts[(row.class_id, row.confirmed, row.confidence_bucket)] += row.count
+    return counts
+
+
+def summarize(rows):
+    """
+    Build the statistics response from (class_id, confirmed, confidence_bucket,
+    count) tuples, with one entry per class.
+    """
+    classes = {}
+    for class_id, confirmed, bucket, count in rows:
+        if not count:
+            continue
+        entry = classes.setdefault(
+            class_id,
+            {
+                "class_id": class_id,
+                "count": 0,
+                "confirmed": 0,
+                "unconfirmed": 0,
+                "confidence_histogram": [0] * CONFIDENCE_BUCKETS,
+                "unknown_confidence": 0,
+            },
+        )
+        entry["count"] += count
+        entry["confirmed" if confirmed else "unconfirmed"] += count
+        if bucket == UNKNOWN_CONFIDENCE:
+            entry["unknown_confidence"] += count
+        else:
+            entry["confidence_histogram"][bucket] += count
+
+    return {
+        "count": sum(entry["count"] for entry in classes.values()),
+        "classes": sorted(classes.values(), key=lambda entry: entry["class_id"]),
+    }
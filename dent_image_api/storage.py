@@ -0,0 +1,124 @@
+import hashlib
+import os
+import posixpath
+import secrets
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.utils import validate_file_name
+
+
+def image_storage():
+    """Storage of `Image.file`, configured by the "images" entry of `STORAGES`."""
+    return storages["images"]
+
+
+class HashedDirectoryStorage(FileSystemStorage):
+    """
+    File system storage that spreads files over nested subdirectories named after
+    a random key, e.g. "images/3f/a2/x-ray.jpeg", so that no directory grows to
+    millions of entries. Files stored before are moved into subdirectories named
+    after a hash of their (unique) name, see `layout_name()`.
+
+    `depth` is the number of nested subdirectories and `width` the number of hex
+    characters in each of them.
+    """
+
+    def __init__(self, *args, depth=2, width=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.depth = depth
+        self.width = width
+
+    def generate_filename(self, filename):
+        # not keyed on the file name, which uploads often share ("image.jpg")
+        return self._prefixed(
+            super().generate_filename(filename), secrets.token_hex(16)
+        )
+
+    def layout_name(self, name):
+        """
+        Return `name` moved into its hash-prefix subdirectories, or `name` itself
+        if it is already in the layout.
+        """
+        if self.in_layout(name):
+            return name
+        return self._prefixed(name, self._fanout_key(posixpath.basename(name)))
+
+    def _prefixed(self, name, key):
+        directory, filename = posixpath.split(name)
+        prefix = [
+            key[level * self.width : (level + 1) * self.width]
+            for level in range(self.depth)
+        ]
+        return posixpath.join(directory, *prefix, filename)
+
+    def in_layout(self, name):
+        directory_parts = posixpath.dirname(name).split("/")
+        if len(directory_parts) <= self.depth:
+            return False
+        return all(
+            len(part) == self.width and _is_hex(part)
+            for part in directory_parts[-self.depth :]
+        )
+
+    def _fanout_key(self, filename):
+        return hashlib.md5(filename.encode(), usedforsecurity=False).hexdigest()
+
+
+class ContentAddressedStorage(HashedDirectoryStorage):
+    """
+    File system storage that names every file after the SHA-256 of its content,
+    in hash-prefix subdirectories taken from the hash itself.
+
+    Saving content that is already stored returns the name of the existing file
+    instead of writing a copy, so the same file may be shared by several rows.
+    Callers must only delete a file once nothing references it any more, see
+    `StoredFile`.
+    """
+
+    def generate_filename(self, filename):
+        # the final name only depends on the content, see get_content_name()
+        return FileSystemStorage.generate_filename(self, filename)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = self.get_content_name(name, content)
+        if not self.exists(name):
+            # if the same content is written concurrently, _save() stores it under
+            # an alternative name, which is still a valid (if not shared) copy
+            name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    def get_content_name(self, name, content):
+        """
+        Return the name of `content` in this storage: the hash of the content in
+        the directory of `name`, keeping the extension of `name`.
+        """
+        content_hash = getattr(content, "content_hash", None) or self._hash(content)
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return self.layout_name(posixpath.join(directory, content_hash + extension))
+
+    def _fanout_key(self, filename):
+        stem = os.path.splitext(filename)[0]
+        if _is_hex(stem):
+            return stem
+        # files stored before switching to this storage
+        return super()._fanout_key(filename)
+
+    @staticmethod
+    def _hash(content):
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+
+def _is_hex(value):
+    return bool(value) and all(char in "0123456789abcdef" for char in value)
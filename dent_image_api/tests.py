@@ -51,6 +51,17 @@ def test_annotation_shape_validation(db, image):
         )
 
 
+def test_annotation_shape_range_validation(db, image):
+    with pytest.raises(ValidationError):
+        Annotation.objects.create(
+            image=image,
+            class_id="caries",
+            shape={"start_x": 10, "start_y": 20, "end_x": 2**31, "end_y": 40},
+            tags=["49"],
+            meta={"confirmed": False, "confidence_percent": 0.87},
+        )
+
+
 def test_annotation_meta_validation(db, image):
     with pytest.raises(ValidationError):
         Annotation.objects.create(
@@ -74,3 +85,61 @@ def test_annotation_confidence_percent_validation(db, image):
                 "confidence_percent": 1.5,  # Invalid confidence_percent
             },
         )
+
+
+def test_annotation_bulk_create_validation(db, image):
+    with pytest.raises(ValidationError):
+        Annotation.objects.bulk_create(
+            [
+                Annotation(
+                    image=image,
+                    class_id="caries",
+                    shape={"start_x": 10, "start_y": 20, "end_x": 30},
+                    tags=["49"],
+                    meta={"confirmed": False, "confidence_percent": 0.87},
+                )
+            ]
+        )
+    assert not Annotation.objects.exists()
+
+
+def test_annotation_bulk_update_validation(db, annotation):
+    annotation.meta = {"confirmed": True, "confidence_percent": 1.5}
+    with pytest.raises(ValidationError):
+        Annotation.objects.bulk_update([annotation], ["meta"])
+    annotation.refresh_from_db()
+    assert annotation.meta["confidence_percent"] == 0.99
+
+
+def test_annotation_meta_columns_synced_on_save(db, annotation):
+    assert annotation.confirmed is True
+    assert annotation.confidence_percent == 0.99
+
+    annotation.meta = {"confidence_percent": 0.5}
+    annotation.save()
+    annotation.refresh_from_db()
+    assert annotation.confirmed is False
+    assert annotation.confidence_percent == 0.5
+
+
+def test_annotation_meta_columns_synced_on_bulk_writes(db, image):
+    (annotation,) = Annotation.objects.bulk_create(
+        [
+            Annotation(
+                image=image,
+                class_id="caries",
+                shape={"start_x": 10, "start_y": 20, "end_x": 30, "end_y": 40},
+                tags=["49"],
+                meta={"confirmed": True, "confidence_percent": 0.87},
+            )
+        ]
+    )
+    annotation.refresh_from_db()
+    assert annotation.confirmed is True
+    assert annotation.confidence_percent == 0.87
+
+    annotation.meta = {"confirmed": False}
+    Annotation.objects.bulk_update([annotation], ["meta"])
+    annotation.refresh_from_db()
+    assert annotation.confirmed is False
+    assert annotation.confidence_percent is None
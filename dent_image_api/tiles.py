@@ -0,0 +1,149 @@
+"""
+Deep-zoom tile pyramids of images.
+
+A pyramid is built once per image file with Pillow and stored in
+`IMAGE_TILES_ROOT/<image id>/<file key>/`, the file key naming the file it was
+built from (see `renditions.file_key()`). It follows the Deep Zoom layout: the
+highest level is the image at full resolution, every level below is half the
+size of the one above, and level 0 is a single pixel. Every level is cut into
+`IMAGE_TILE_SIZE` square JPEG tiles stored as `<level>/<x>_<y>.jpg`, so a viewer
+only fetches the tiles visible at the current zoom.
+
+A viewer opening an image requests many tiles at once: one request builds the
+pyramid, under a lock file, and the others raise PyramidBuilding meanwhile
+instead of building it too.
+"""
+import fcntl
+import json
+import math
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from PIL import Image as PILImage
+
+from .renditions import file_key, to_8bit
+
+DESCRIPTOR_NAME = "pyramid.json"
+
+
+class PyramidBuilding(Exception):
+    """The pyramid of an image is being built by another request."""
+
+
+def get_pyramid(image):
+    """
+    Return the descriptor of the tile pyramid of `image`, building the pyramid on
+    first use. Raise PyramidBuilding while another request builds it.
+    """
+    descriptor_path = os.path.join(_pyramid_directory(image), DESCRIPTOR_NAME)
+    if not os.path.isfile(descriptor_path):
+        _build_once(image)
+
+    with open(descriptor_path) as descriptor_file:
+        return json.load(descriptor_file)
+
+
+def get_tile_path(image, level, x, y):
+    """
+    Return the path of a tile of `image`, or None if the pyramid has no such tile.
+    """
+    path = os.path.join(_pyramid_directory(image), str(level), f"{x}_{y}.jpg")
+    if not os.path.isfile(path):
+        # make sure the pyramid is built before deciding the tile does not exist
+        get_pyramid(image)
+        if not os.path.isfile(path):
+            return None
+    return path
+
+
+def drop_tiles(image_pk):
+    """Remove the tile pyramids of the image with `image_pk`."""
+    shutil.rmtree(
+        os.path.join(settings.IMAGE_TILES_ROOT, str(image_pk)), ignore_errors=True
+    )
+
+
+def _pyramid_directory(image):
+    return os.path.join(settings.IMAGE_TILES_ROOT, str(image.pk), file_key(image))
+
+
+def _build_once(image):
+    directory = _pyramid_directory(image)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    with open(f"{directory}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise PyramidBuilding()
+        # built by the request that held the lock until now
+        if not os.path.isfile(os.path.join(directory, DESCRIPTOR_NAME)):
+            _build(image, directory)
+
+
+def _build(image, directory):
+    tile_size = settings.IMAGE_TILE_SIZE
+    # build into a temporary directory and move it in place at the end, so readers
+    # never see a half-built pyramid
+    build_directory = tempfile.mkdtemp(
+        dir=os.path.dirname(directory), prefix=f"{image.pk}.", suffix=".tmp"
+    )
+    try:
+        with image.file.open("rb") as source, PILImage.open(source) as picture:
+            picture = to_8bit(picture)
+            if picture.mode not in ("L", "RGB"):
+                picture = picture.convert("RGB")
+            width, height = picture.size
+            max_level = math.ceil(math.log2(max(width, height, 1)))
+
+            level_picture = picture
+            for level in range(max_level, -1, -1):
+                _write_level(
+                    level_picture, os.path.join(build_directory, str(level)), tile_size
+                )
+                if level == 0:
+                    break
+                level_picture = level_picture.resize(
+                    (
+                        math.ceil(level_picture.width / 2),
+                        math.ceil(level_picture.height / 2),
+                    ),
+                    PILImage.LANCZOS,
+                )
+
+        descriptor = {
+            "width": width,
+            "height": height,
+            "tile_size": tile_size,
+            "levels": max_level + 1,
+            "format": "jpg",
+        }
+        with open(
+            os.path.join(build_directory, DESCRIPTOR_NAME), "w"
+        ) as descriptor_file:
+            json.dump(descriptor, descriptor_file)
+
+        try:
+            os.rename(build_directory, directory)
+        except OSError:
+            # another request has built the same pyramid in the meantime
+            shutil.rmtree(build_directory, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(build_directory, ignore_errors=True)
+        raise
+
+
+def _write_level(picture, directory, tile_size):
+    os.makedirs(directory)
+    for x in range(math.ceil(picture.width / tile_size)):
+        for y in range(math.ceil(picture.height / tile_size)):
+            box = (
+                x * tile_size,
+                y * tile_size,
+                min((x + 1) * tile_size, picture.width),
+                min((y + 1) * tile_size, picture.height),
+            )
+            picture.crop(box).save(
+                os.path.join(directory, f"{x}_{y}.jpg"), format="JPEG", quality=85
+            )
@@ -0,0 +1,40 @@
+"""
+Upload handlers that compute the SHA-256 of uploaded files while they stream in.
+
+The hex digest is stored as `content_hash` on the resulting uploaded file, so the
+storage does not have to read the file again to hash it.
+"""
+import hashlib
+
+from django.core.files import uploadhandler
+
+
+class HashingUploadMixin:
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        # the chunk is only hashed by the handler that actually stores it
+        if data is None:
+            self.hasher.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.content_hash = self.hasher.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadMixin, uploadhandler.MemoryFileUploadHandler
+):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadMixin, uploadhandler.TemporaryFileUploadHandler
+):
+    pass
@@ -0,0 +1,353 @@
+"""
+Resumable uploads of large image files, sent in chunks of one request each.
+
+An `UploadSession` is started with the name and size of the file. Chunks are
+then sent with PUT requests carrying `Content-Range: bytes start-end/size`, and
+written from the request stream straight to the partial file of the session in
+`UPLOAD_SESSION_ROOT`, so memory stays flat whatever the size of the file. The
+offset of the session only moves once a whole chunk is on disk: after a failed
+request the client reads the offset back and resumes from there. No row lock is
+held while a chunk is read from the client, chunks of a session are serialized
+by a lock on its partial file. Finalizing a complete upload stores a hard link
+to the file in the image storage, as the file of a new image or the new file of
+an existing one, and removes the partial file once the transaction commits.
+
+The SHA-256 of the file is updated with every chunk by the process receiving
+it. When a chunk lands on another process (or the process restarted), the
+state is lost and the file is hashed once more when it is finalized.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.core.validators import get_available_image_extensions
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .metadata import file_metadata
+from .models import Image, Job, StoredFile, UploadSession
+
+# bytes read from the request stream at a time
+READ_SIZE = 64 * 1024
+
+# largest number of sessions whose hash state a process keeps
+HASHERS_MAX_SIZE = 1000
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+# SHA-256 of the sessions this process received the last chunk of, by session
+# id, with the offset they hashed up to
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    """A chunk or a finalization that does not match the offset of the session."""
+
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class PartialFileMissing(Exception):
+    """The partial file of a session with received bytes no longer exists."""
+
+
+def partial_path(session_id):
+    return os.path.join(settings.UPLOAD_SESSION_ROOT, f"{session_id}.part")
+
+
+def remove_partial_file(session_id):
+    try:
+        os.remove(partial_path(session_id))
+    except FileNotFoundError:
+        pass
+
+
+def validate_filename(filename):
+    """The base name of `filename`, which must have an image file extension."""
+    filename = os.path.basename(filename)
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    allowed = get_available_image_extensions()
+    if extension not in allowed:
+        raise serializers.ValidationError(
+            f"File extension “{extension}” is not allowed. "
+            f"Allowed extensions are: {', '.join(allowed)}."
+        )
+    return filename
+
+
+def start_session(filename, size, image=None):
+    """Create a session and queue its deletion once it expires."""
+    now = timezone.now()
+    with transaction.atomic():
+        session = UploadSession.objects.create(
+            filename=filename,
+            size=size,
+            image=image,
+            expires_at=now + timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+        )
+        Job.objects.enqueue(
+            "expire_upload_session",
+            delay=settings.UPLOAD_SESSION_TTL,
+            session_id=str(session.pk),
+        )
+    return session
+
+
+def abort_session(session):
+    session_id = session.pk
+    with transaction.atomic():
+        session.delete()
+        transaction.on_commit(partial(remove_partial_file, session_id))
+
+
+def parse_content_range(header):
+    """
+    Return the first and last byte positions and the total size of a
+    `Content-Range: bytes start-end/size` header, the size None for `*`.
+    """
+    match = _CONTENT_RANGE.match(header)
+    if match is None:
+        raise serializers.ValidationError(
+            {"Content-Range": ["Expected “bytes start-end/size”."]}
+        )
+    start, end, size = match.groups()
+    if int(end) < int(start):
+        raise serializers.ValidationError(
+            {"Content-Range": ["The last byte position is before the first one."]}
+        )
+    return int(start), int(end), None if size == "*" else int(size)
+
+
+def append_chunk(session_id, stream, start, end, size=None):
+    """
+    Write the bytes `start` to `end` (inclusive) of the file of the session from
+    `stream`, and return the session with its new offset. Raise OffsetMismatch if
+    `start` is not the offset of the session, or while another chunk of the
+    session is received.
+
+    No transaction is held while the chunk is read from the client: chunks of a
+    session are serialized by an exclusive lock on its partial file, released by
+    the system if the process dies, and the offset is then moved with one
+    conditional UPDATE.
+    """
+    length = end - start + 1
+    session = UploadSession.objects.get(pk=session_id)
+    _check_range(session, start, end, size)
+
+    with _open_partial_file(session, start) as file:
+        # the chunk that held the lock may have moved the offset meanwhile
+        session.refresh_from_db(fields=["offset"])
+        if start != session.offset:
+            raise OffsetMismatch(session.offset)
+
+        hasher = _take_hasher(session.pk, start)
+        file.truncate(start)
+        file.seek(start)
+        written = _copy(stream, file, length, hasher)
+        # the offset must never count bytes a crash could lose
+        file.flush()
+        os.fsync(file.fileno())
+        if written != length:
+            raise serializers.ValidationError(
+                {"Content-Range": [f"{length} bytes announced, {written} received."]}
+            )
+
+        # still under the file lock, so nothing else moved the offset; no row
+        # means the session was aborted or expired meanwhile
+        if not UploadSession.objects.filter(pk=session.pk, offset=start).update(
+            offset=start + length
+        ):
+            raise UploadSession.DoesNotExist()
+        session.offset = start + length
+
+    if hasher is not None:
+        _keep_hasher(session.pk, session.offset, hasher)
+    return session
+
+
+def finalize_session(session_id, name=None, check_image=None):
+    """
+    Attach the file of the complete upload to the image of the session, or to a
+    new image named `name`, delete the session and return the image and whether
+    it was created. The existing image is passed to `check_image` in the
+    transaction before it is written, see `claim_version()`.
+
+    The partial file is only removed once the transaction commits. When it
+    fails, the file stored meanwhile is deleted again unless something else
+    references it, and the session can be finalized once more.
+    """
+    image = stored_name = None
+    try:
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session_id)
+            if session.offset != session.size:
+                raise OffsetMismatch(session.offset)
+
+            image = _session_image(session, name, check_image)
+            stored_name = image.file.name
+            with _PartialFile(session) as file:
+                hasher = _take_hasher(session.pk, session.size)
+                if hasher is not None:
+                    file.content_hash = hasher.hexdigest()
+                if file_metadata(file)["width"] is None:
+                    raise serializers.ValidationError(
+                        {
+                            "file": [
+                                "Upload a valid image. The file you uploaded was "
+                                "either not an image or a corrupted image."
+                            ]
+                        }
+                    )
+                image.file = file
+                image.save()
+
+            session.delete()
+            transaction.on_commit(partial(remove_partial_file, session_id))
+    except BaseException:
+        if image is not None and image.file._committed:
+            _discard_stored_file(image.file.name, stored_name)
+        raise
+    return image, session.image_id is None
+
+
+def _check_range(session, start, end, size):
+    if end - start + 1 > settings.UPLOAD_CHUNK_MAX_SIZE:
+        raise serializers.ValidationError(
+            {
+                "Content-Range": [
+                    f"Chunks are at most {settings.UPLOAD_CHUNK_MAX_SIZE} bytes."
+                ]
+            }
+        )
+    if size is not None and size != session.size:
+        raise serializers.ValidationError(
+            {"Content-Range": [f"The size of the upload is {session.size}."]}
+        )
+    if end >= session.size:
+        raise serializers.ValidationError(
+            {"Content-Range": [f"The upload ends at byte {session.size - 1}."]}
+        )
+    if start != session.offset:
+        raise OffsetMismatch(session.offset)
+
+
+def _open_partial_file(session, start):
+    """
+    Open the partial file of the session for writing, locked exclusively until
+    it is closed. Raise OffsetMismatch if it is locked by another chunk.
+    """
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    # opened without truncating, the bytes past the offset are the rest of a
+    # chunk that failed
+    flags = os.O_WRONLY if start else os.O_WRONLY | os.O_CREAT
+    try:
+        fd = os.open(partial_path(session.pk), flags, 0o600)
+    except FileNotFoundError:
+        raise PartialFileMissing()
+    file = os.fdopen(fd, "wb")
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        file.close()
+        raise OffsetMismatch(session.offset)
+    return file
+
+
+def _session_image(session, name, check_image):
+    """The image the file of the session is attached to, renamed to `name`."""
+    if session.image_id is None:
+        if not name:
+            raise serializers.ValidationError({"name": ["This field is required."]})
+        return Image(name=name)
+
+    image = Image.objects.get(pk=session.image_id)
+    if check_image is not None:
+        check_image(image)
+    if name:
+        image.name = name
+    return image
+
+
+def _discard_stored_file(name, previous_name):
+    """Delete the file `name` stored by a finalization that was not committed."""
+    if not name or name == previous_name:
+        return
+    # a deduplicating storage may have returned the file of an existing image,
+    # the ones stored before StoredFile are only referenced by their image
+    if not Image.objects.filter(file=name).exists():
+        StoredFile.objects.delete_unreferenced(
+            [name], Image._meta.get_field("file").storage
+        )
+
+
+class _PartialFile(File):
+    """
+    The partial file of a complete session. A file system storage moves the
+    file it is given in place, so it is given a hard link to the partial file,
+    which stays until the session is deleted.
+    """
+
+    def __init__(self, session):
+        path = partial_path(session.pk)
+        self.path = f"{path}.{secrets.token_hex(8)}"
+        try:
+            os.link(path, self.path)
+        except FileNotFoundError:
+            raise PartialFileMissing()
+        except OSError:
+            # no hard links on this file system
+            shutil.copyfile(path, self.path)
+        super().__init__(open(self.path, "rb"), name=session.filename)
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        super().close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            # moved into the storage
+            pass
+
+
+def _copy(stream, file, length, hasher):
+    written = 0
+    while written < length:
+        chunk = stream.read(min(READ_SIZE, length - written))
+        if not chunk:
+            break
+        file.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        written += len(chunk)
+    return written
+
+
+def _take_hasher(session_id, offset):
+    """The hash of the first `offset` bytes of the session, None if unknown."""
+    if offset == 0:
+        return hashlib.sha256()
+    with _hashers_lock:
+        hashed_offset, hasher = _hashers.pop(session_id, (None, None))
+    return hasher if hashed_offset == offset else None
+
+
+def _keep_hasher(session_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        while len(_hashers) > HASHERS_MAX_SIZE:
+            _hashers.popitem(last=False)
@@ -1,10 +1,18 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import AnnotationViewSet, ImageViewSet
+from .views import (
+    AnnotationBatchView,
+    AnnotationStatisticsView,
+    AnnotationViewSet,
+    ImageViewSet,
+    UploadViewSet,
+    export_annotations,
+)
 
 router = DefaultRouter()
 router.register(r"images", ImageViewSet)
+router.register(r"uploads", UploadViewSet)
 
 annotations_list = AnnotationViewSet.as_view({"get": "list", "post": "create"})
 annotation_detail = AnnotationViewSet.as_view(
@@ -13,6 +21,20 @@ annotation_detail = AnnotationViewSet.as_view(
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("statistics/", AnnotationStatisticsView.as_view(), name="statistics"),
+    path("annotations/batch/", AnnotationBatchView.as_view(), name="annotation-batch"),
+    path(
+        "export/ndjson/",
+        export_annotations,
+        {"export_format": "ndjson"},
+        name="export-ndjson",
+    ),
+    path(
+        "export/coco/",
+        export_annotations,
+        {"export_format": "coco"},
+        name="export-coco",
+    ),
     path(
         "images/<int:image_id>/annotations/", annotations_list, name="image-annotations"
     ),
@@ -1,16 +1,289 @@
-from rest_framework import viewsets
-from .models import Annotation, Image
-from .serializers import AnnotationSerializer, ImageSerializer
+import io
 
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-class ImageViewSet(viewsets.ModelViewSet):
-    queryset = Image.objects.all()
+from .batch import BatchError, apply_operations
+from .caching import AnnotationListCacheMixin
+from .conditional import (
+    ConditionalGetMixin,
+    ConditionalWriteMixin,
+    claim_version,
+    resource_validators,
+    set_validators,
+)
+from .delivery import file_response
+from .export import EXPORT_FORMATS, Export
+from .filters import filter_annotations, filter_by_bbox, filter_images
+from .models import Annotation, ClassStatistics, Image, ImageStatistics, UploadSession
+from .renditions import get_rendition
+from .representations import (
+    ANNOTATION_VALUES,
+    IMAGE_VALUES,
+    ValuesListMixin,
+    annotation_representations,
+    image_representations,
+)
+from .serializers import (
+    AnnotationBatchSerializer,
+    AnnotationSerializer,
+    ImageSerializer,
+    UploadFinalizeSerializer,
+    UploadSessionSerializer,
+)
+from .statistics import summarize
+from .tiles import PyramidBuilding, get_pyramid, get_tile_path
+from .uploads import (
+    OffsetMismatch,
+    PartialFileMissing,
+    abort_session,
+    append_chunk,
+    finalize_session,
+    parse_content_range,
+)
+
+
+class ImageViewSet(
+    ConditionalGetMixin,
+    ConditionalWriteMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
+    # annotations of the whole page are loaded with one extra query instead of one per image
+    queryset = Image.objects.prefetch_related("annotations")
     serializer_class = ImageSerializer
+    list_values = IMAGE_VALUES
+    # actions that do not serialize the annotations, or read them themselves
+    actions_without_annotations = ("list", "rendition", "tiles", "tile", "statistics")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.actions_without_annotations:
+            queryset = queryset.prefetch_related(None)
+        if self.action == "list":
+            queryset = filter_images(queryset, self.request.query_params)
+        return queryset
+
+    def get_validators(self):
+        if self.action != "retrieve":
+            return None
+        return (
+            Image.objects.filter(pk=self.kwargs["pk"])
+            .values_list("version", "updated_at")
+            .first()
+        )
+
+    def represent_rows(self, rows):
+        return image_representations(rows, self.request)
+
+    @action(detail=True, methods=["get"])
+    def rendition(self, request, pk=None):
+        width = request.query_params.get("w", "")
+        allowed_widths = [str(w) for w in settings.RENDITION_WIDTHS]
+        if width not in allowed_widths:
+            raise serializers.ValidationError(
+                {"w": [f"Width must be one of {', '.join(allowed_widths)}."]}
+            )
+
+        image = self.get_object()
+        path = get_rendition(image, int(width))
+        return file_response(request, path)
+
+    @action(detail=True, methods=["get"])
+    def tiles(self, request, pk=None):
+        if not settings.IMAGE_TILES_ENABLED:
+            raise Http404
+
+        try:
+            return Response(get_pyramid(self.get_object()))
+        except PyramidBuilding:
+            return self._pyramid_building()
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"tiles/(?P<level>\d+)/(?P<x>\d+)/(?P<y>\d+)",
+    )
+    def tile(self, request, pk=None, level=None, x=None, y=None):
+        if not settings.IMAGE_TILES_ENABLED:
+            raise Http404
+
+        try:
+            path = get_tile_path(self.get_object(), int(level), int(x), int(y))
+        except PyramidBuilding:
+            return self._pyramid_building()
+        if path is None:
+            raise Http404
+        return file_response(request, path)
+
+    @action(detail=True, methods=["get"])
+    def statistics(self, request, pk=None):
+        image = self.get_object()
+        rows = ImageStatistics.objects.filter(image=image).values_list(
+            "class_id", "confirmed", "confidence_bucket", "count"
+        )
+        return Response(summarize(rows))
+
+    @staticmethod
+    def _pyramid_building():
+        return Response(
+            {"detail": "The tiles of the image are being built, retry shortly."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+
+
+class AnnotationStatisticsView(APIView):
+    """Annotation counts of all the images by class, read from the precomputed totals."""
+
+    def get(self, request):
+        rows = ClassStatistics.objects.values_list(
+            "class_id", "confirmed", "confidence_bucket", "count"
+        )
+        return Response(summarize(rows))
+
+
+class AnnotationBatchView(APIView):
+    """
+    Apply an ordered list of annotation operations in one transaction:
+
+        {"operations": [
+            {"op": "create", "data": {"image": 1, "class_id": "tooth", ...}},
+            {"op": "update", "id": 12, "data": {...}},
+            {"op": "partial_update", "id": 13, "data": {"meta": {...}}},
+            {"op": "delete", "id": 14}
+        ]}
 
+    Answers with the result of every operation, in order. When one of them fails
+    nothing is applied and the response is 400 Bad Request.
+    """
 
-class AnnotationViewSet(viewsets.ModelViewSet):
+    def post(self, request):
+        serializer = AnnotationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = apply_operations(serializer.validated_data["operations"])
+        except BatchError as exc:
+            return Response({"results": exc.results}, status=400)
+        return Response({"results": results})
+
+
+class UploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable uploads of large files (see uploads.py):
+
+        POST /uploads/ {"filename": "x-ray.tiff", "size": 734003200}
+        PUT /uploads/{id}/ with Content-Range: bytes 0-8388607/734003200
+        GET /uploads/{id}/ for the offset to resume from after a failed chunk
+        POST /uploads/{id}/finalize/ {"name": "X-ray"}
+
+    With "image": {id} the upload replaces the file of that image, checked
+    against If-Match like any other image update.
+    """
+
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    lookup_value_regex = "[0-9a-f-]{36}"
+
+    def update(self, request, pk=None):
+        start, end, size = parse_content_range(request.headers.get("Content-Range", ""))
+        try:
+            # read from the request stream (None when empty), never parsed into
+            # request.data
+            stream = request.stream or io.BytesIO()
+            session = append_chunk(pk, stream, start, end, size)
+        except UploadSession.DoesNotExist:
+            raise Http404
+        except OffsetMismatch as exc:
+            return self._offset_mismatch(exc)
+        except PartialFileMissing:
+            return self._partial_file_missing()
+        return Response(self.get_serializer(session).data)
+
+    def perform_destroy(self, instance):
+        abort_session(instance)
+
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        serializer = UploadFinalizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            image, created = finalize_session(
+                pk,
+                serializer.validated_data.get("name"),
+                check_image=lambda image: claim_version(request, image),
+            )
+        except (UploadSession.DoesNotExist, Image.DoesNotExist):
+            raise Http404
+        except OffsetMismatch as exc:
+            return self._offset_mismatch(exc)
+        except PartialFileMissing:
+            return self._partial_file_missing()
+
+        data = ImageSerializer(image, context=self.get_serializer_context()).data
+        if created:
+            return Response(data, status=status.HTTP_201_CREATED)
+        etag, last_modified = resource_validators(
+            image.version, image.updated_at, request.accepted_renderer.format
+        )
+        return set_validators(Response(data), etag, last_modified)
+
+    @staticmethod
+    def _offset_mismatch(exc):
+        return Response(
+            {"detail": "The upload is not at this offset.", "offset": exc.offset},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    @staticmethod
+    def _partial_file_missing():
+        return Response(
+            {"detail": "The received data of the upload is lost, start a new one."},
+            status=status.HTTP_410_GONE,
+        )
+
+
+@require_safe
+def export_annotations(request, export_format):
+    """
+    Stream all the images with their annotations as NDJSON or COCO, filtered like
+    the list endpoints. Not a DRF view: the document is written as it is read
+    and takes no part in content negotiation.
+    """
+    try:
+        export = Export(request.GET, request)
+    except serializers.ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+
+    content_type, filename = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        export.chunks(export_format), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class AnnotationViewSet(
+    ConditionalGetMixin,
+    ConditionalWriteMixin,
+    AnnotationListCacheMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Annotation.objects.all()
     serializer_class = AnnotationSerializer
+    list_values = ANNOTATION_VALUES
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -20,5 +293,32 @@ class AnnotationViewSet(viewsets.ModelViewSet):
 
         direction = self.request.query_params.get("direction")
         if direction == "external":
-            queryset = queryset.filter(meta__confirmed=True)
-        return queryset
+            queryset = queryset.filter(confirmed=True)
+
+        queryset = filter_annotations(queryset, self.request.query_params)
+        return filter_by_bbox(queryset, self.request.query_params)
+
+    def get_validators(self):
+        image_id = self.kwargs.get("image_id")
+        if self.action == "retrieve":
+            queryset = Annotation.objects.filter(pk=self.kwargs["pk"])
+            if image_id is not None:
+                queryset = queryset.filter(image_id=image_id)
+        elif self.action == "list" and image_id is not None:
+            # every annotation write touches the image, so its version covers the list
+            queryset = Image.objects.filter(pk=image_id)
+        else:
+            return None
+        return queryset.values_list("version", "updated_at").first()
+
+    def perform_update(self, serializer):
+        image = serializer.validated_data.get("image")
+        with transaction.atomic():
+            if image is not None:
+                # the image the annotation moves to is locked with its current
+                # one, before the annotation row, see `ImageQuerySet.lock()`
+                Image.objects.lock([image.pk, serializer.instance.image_id])
+            super().perform_update(serializer)
+
+    def represent_rows(self, rows):
+        return annotation_representations(rows)
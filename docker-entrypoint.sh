@@ -11,6 +11,21 @@ case "${1}" in
         echo "Starting application, node $(hostname)..."
         /app/wait-for-it.sh database:5432 -- make full_run
         ;;
+    "serve")
+        shift
+        echo "Starting production server, node $(hostname)..."
+        exec make serve
+        ;;
+    "full_serve")
+        shift
+        echo "Starting production server, node $(hostname)..."
+        exec /app/wait-for-it.sh database:5432 -- make full_serve
+        ;;
+    "worker")
+        shift
+        echo "Starting background jobs worker, node $(hostname)..."
+        exec /app/wait-for-it.sh database:5432 -- python manage.py run_jobs "${@}"
+        ;;
     "lint")
         shift
         isort . -c
@@ -41,7 +56,7 @@ case "${1}" in
         exec python manage.py migrate
         ;;
     "help")
-        echo "Available commands: run lint fmt test migrations migrate help"
+        echo "Available commands: run full_run serve full_serve worker lint fmt test migrations migrate help"
         ;;
     *)
         exec "${@}"
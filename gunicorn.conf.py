@@ -0,0 +1,47 @@
+"""
+Gunicorn settings of the production server (`make serve`, `docker-entrypoint.sh serve`).
+
+    GUNICORN_WORKERS   worker processes, 2 * CPU cores + 1 by default
+    GUNICORN_THREADS   threads per worker, 1 by default (sync workers); more switches
+                       to the threaded worker, which suits slow clients and I/O waits
+    GUNICORN_MAX_REQUESTS  requests served by a worker before it is replaced, 0 to
+                       keep workers forever
+    GUNICORN_TIMEOUT   seconds a worker may spend on a request before it is restarted
+
+Every worker thread keeps one database connection open (`CONN_MAX_AGE`), so
+workers * threads must stay below the `max_connections` of PostgreSQL.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = "dent_image.wsgi:application"
+bind = f"0.0.0.0:{os.environ.get('APP_PORT', '8080')}"
+
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+
+# import the application once in the master, workers are forked with it loaded
+preload_app = True
+
+# recycle workers to bound the growth of their memory, at random offsets so that
+# they do not all restart at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+
+# the heartbeat file of the workers, on disk in Docker images by default
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # a connection opened while preloading must not be shared by the workers
+    from django.db import connections
+
+    connections.close_all()
@@ -0,0 +1,9 @@
+def annotation_payload(**overrides):
+    """The data of a valid annotation as sent to the API, with `overrides`."""
+    return {
+        "class_id": "tooth",
+        "shape": {"start_x": 100, "start_y": 100, "end_x": 200, "end_y": 200},
+        "tags": ["48"],
+        "meta": {"confirmed": True, "confidence_percent": 0.99},
+        **overrides,
+    }
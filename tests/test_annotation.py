@@ -70,7 +70,10 @@ class AnnotationTests(APITestCase):
             response.status_code,
             f"Expected HTTP 200 OK, got HTTP {response.status_code}. Response data: {response.data}",
         )
-        self.assertIn(self.annotation.id, [item["id"] for item in response.data])
+        self.assertIn(
+            self.annotation.id, [item["id"] for item in response.data["results"]]
+        )
+        self.assertIsNone(response.data["next"])
 
     def test_patch_annotation(self):
         # Only update class_id and the confidence_percent part of the meta
@@ -224,7 +227,86 @@ class AnnotationTests(APITestCase):
             f"Expected HTTP 200 OK, got HTTP {response.status_code}. Response data: {response.context}",
         )
         # Iterate through annotations and check if all are confirmed
-        for annotation in response.data:
+        for annotation in response.data["results"]:
             self.assertTrue(
                 annotation["meta"]["confirmed"], "Unconfirmed annotation was returned."
             )
+        self.assertEqual(
+            [self.annotation.id], [item["id"] for item in response.data["results"]]
+        )
+
+    def get_annotation_ids(self, query):
+        response = self.client.get(self.all_annotations_url + query)
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            f"Expected HTTP 200 OK, got HTTP {response.status_code}. Response data: {response.data}",
+        )
+        return {item["id"] for item in response.data["results"]}
+
+    def test_get_annotations_in_bbox(self):
+        # drawn from the bottom right to the top left corner
+        reversed_annotation = Annotation.objects.create(
+            image=self.image,
+            class_id="caries",
+            shape={"start_x": 400, "start_y": 400, "end_x": 300, "end_y": 300},
+            tags=["47"],
+            meta={"confirmed": True, "confidence_percent": 0.80},
+        )
+
+        self.assertEqual(
+            {self.annotation.id}, self.get_annotation_ids("?bbox=0,0,150,150")
+        )
+        self.assertEqual(
+            {self.annotation.id, reversed_annotation.id},
+            self.get_annotation_ids("?bbox=350,350,150,150"),
+        )
+        self.assertEqual(
+            {reversed_annotation.id},
+            self.get_annotation_ids("?bbox=250,250,500,500&bbox_mode=contains"),
+        )
+        self.assertEqual(set(), self.get_annotation_ids("?bbox=0,0,99,99"))
+
+    def test_get_annotations_with_invalid_bbox(self):
+        for query in ["?bbox=1,2,3", "?bbox=a,b,c,d", "?bbox=0,0,1,1&bbox_mode=x"]:
+            response = self.client.get(self.all_annotations_url + query)
+            self.assertEqual(
+                status.HTTP_400_BAD_REQUEST,
+                response.status_code,
+                f"Expected HTTP 400 Bad Request for {query}, got HTTP {response.status_code}.",
+            )
+
+    def test_get_annotations_by_class_id_tag_and_confidence(self):
+        caries_36 = Annotation.objects.create(
+            image=self.image,
+            class_id="caries",
+            shape={"start_x": 10, "start_y": 10, "end_x": 20, "end_y": 20},
+            tags=["36", "distal"],
+            meta={"confirmed": True, "confidence_percent": 0.6},
+        )
+        caries_int_tag = Annotation.objects.create(
+            image=self.image,
+            class_id="caries",
+            shape={"start_x": 10, "start_y": 10, "end_x": 20, "end_y": 20},
+            tags=[36],
+            meta={"confirmed": False, "confidence_percent": 0.9},
+        )
+
+        self.assertEqual(
+            {caries_36.id, caries_int_tag.id},
+            self.get_annotation_ids("?class_id=caries&tag=36"),
+        )
+        self.assertEqual({caries_36.id}, self.get_annotation_ids("?tag=36&tag=distal"))
+        self.assertEqual(
+            {self.annotation.id, caries_36.id},
+            self.get_annotation_ids(
+                "?class_id=tooth&class_id=caries&max_confidence=0.99&min_confidence=0.5&direction=external"
+            ),
+        )
+        self.assertEqual(
+            {caries_int_tag.id},
+            self.get_annotation_ids("?min_confidence=0.7&class_id=caries"),
+        )
+
+        response = self.client.get(self.all_annotations_url + "?min_confidence=high")
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
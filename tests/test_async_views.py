@@ -0,0 +1,176 @@
+from urllib.parse import parse_qs, urlparse
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.models import Annotation, Image
+from tests import constants
+from tests.factories import annotation_payload
+
+
+def cursor(link):
+    return parse_qs(urlparse(link).query).get("cursor") if link else None
+
+
+class AsyncReadViewTests(APITestCase):
+    """The async read endpoints answer like their sync counterparts."""
+
+    def setUp(self):
+        self.images = [self.create_image() for _ in range(3)]
+        for image in self.images:
+            Annotation.objects.create(image=image, **annotation_payload())
+            Annotation.objects.create(
+                image=image,
+                **annotation_payload(class_id="caries", meta={"confirmed": False}),
+            )
+        self.image = self.images[0]
+        self.annotation = self.image.annotations.order_by("id").first()
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def create_image(self):
+        return Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        sync_response = self.client.get(sync_url, params)
+        async_response = self.client.get(async_url, params)
+
+        self.assertEqual(sync_response.status_code, async_response.status_code)
+        sync_data, async_data = dict(sync_response.json()), dict(async_response.json())
+        if "results" in sync_data:
+            for link in ("next", "previous"):
+                self.assertEqual(
+                    cursor(sync_data.pop(link)), cursor(async_data.pop(link))
+                )
+        self.assertEqual(sync_data, async_data)
+        return async_response
+
+    def test_image_list(self):
+        self.assertSameResponse(reverse("image-list"), reverse("async-image-list"))
+
+    def test_image_list_pages(self):
+        params = {"page_size": 1}
+        while True:
+            response = self.assertSameResponse(
+                reverse("image-list"), reverse("async-image-list"), params
+            )
+            next_link = response.json()["next"]
+            if next_link is None:
+                break
+            params = {"page_size": 1, "cursor": cursor(next_link)[0]}
+
+        previous_link = response.json()["previous"]
+        self.assertSameResponse(
+            reverse("image-list"),
+            reverse("async-image-list"),
+            {"page_size": 1, "cursor": cursor(previous_link)[0]},
+        )
+
+    def test_image_list_filter(self):
+        Annotation.objects.filter(image=self.images[1], class_id="caries").delete()
+
+        response = self.assertSameResponse(
+            reverse("image-list"), reverse("async-image-list"), {"class_id": "caries"}
+        )
+        self.assertEqual(2, len(response.json()["results"]))
+
+    def test_image_detail(self):
+        self.assertSameResponse(
+            reverse("image-detail", kwargs={"pk": self.image.pk}),
+            reverse("async-image-detail", kwargs={"pk": self.image.pk}),
+        )
+
+    def test_annotation_list(self):
+        for params in (None, {"direction": "external"}, {"bbox": "0,0,150,150"}):
+            self.assertSameResponse(
+                reverse("image-annotations", kwargs={"image_id": self.image.pk}),
+                reverse("async-image-annotations", kwargs={"image_id": self.image.pk}),
+                params,
+            )
+
+    def test_annotation_detail(self):
+        kwargs = {"image_id": self.image.pk, "pk": self.annotation.pk}
+        self.assertSameResponse(
+            reverse("image-annotation-detail", kwargs=kwargs),
+            reverse("async-image-annotation-detail", kwargs=kwargs),
+        )
+
+    def test_not_found(self):
+        for url in (
+            reverse("async-image-detail", kwargs={"pk": 0}),
+            reverse("async-image-file", kwargs={"pk": 0}),
+            reverse(
+                "async-image-annotation-detail",
+                kwargs={"image_id": self.images[1].pk, "pk": self.annotation.pk},
+            ),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+            self.assertEqual({"detail": "Not found."}, response.json())
+
+    def test_invalid_cursor(self):
+        response = self.assertSameResponse(
+            reverse("image-list"), reverse("async-image-list"), {"cursor": "garbage"}
+        )
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_invalid_filter(self):
+        response = self.client.get(
+            reverse("async-image-annotations", kwargs={"image_id": self.image.pk}),
+            {"bbox": "1,2"},
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("bbox", response.json())
+
+    def test_not_modified(self):
+        sync_url = reverse("image-detail", kwargs={"pk": self.image.pk})
+        async_url = reverse("async-image-detail", kwargs={"pk": self.image.pk})
+        etag = self.client.get(sync_url)["ETag"]
+
+        response = self.client.get(async_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+
+    def test_read_only(self):
+        response = self.client.post(reverse("async-image-list"), {})
+
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+
+    async def test_image_file(self):
+        url = reverse("async-image-file", kwargs={"pk": self.image.pk})
+
+        response = await self.async_client.get(url)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual("image/jpeg", response["Content-Type"])
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            self.assertEqual(image_file.read(), content)
+        self.assertEqual(str(len(content)), response["Content-Length"])
+
+        response = await self.async_client.get(
+            url, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    async def test_image_file_without_file(self):
+        await Image.objects.filter(pk=self.image.pk).aupdate(file="")
+
+        response = await self.async_client.get(
+            reverse("async-image-file", kwargs={"pk": self.image.pk})
+        )
+
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
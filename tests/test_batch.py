@@ -0,0 +1,233 @@
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.models import Annotation, ClassStatistics, Image, ImageStatistics
+from tests.factories import annotation_payload
+
+
+class AnnotationBatchTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("annotation-batch")
+        self.images = [
+            Image.objects.create(name=f"Image {i}", file=f"images/batch_{i}.jpg")
+            for i in range(2)
+        ]
+        self.annotations = [
+            Annotation.objects.create(image=self.images[0], **annotation_payload())
+            for _ in range(3)
+        ]
+
+    def post(self, operations):
+        return self.client.post(self.url, {"operations": operations}, format="json")
+
+    def test_mixed_operations(self):
+        first, second, third = self.annotations
+        response = self.post(
+            [
+                {
+                    "op": "create",
+                    "data": {"image": self.images[1].pk, **annotation_payload()},
+                },
+                {
+                    "op": "update",
+                    "id": first.pk,
+                    "data": {
+                        "image": self.images[0].pk,
+                        **annotation_payload(tags=["47"]),
+                    },
+                },
+                {
+                    "op": "partial_update",
+                    "id": second.pk,
+                    "data": {"class_id": "caries"},
+                },
+                {"op": "delete", "id": third.pk},
+            ]
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        results = response.json()["results"]
+        self.assertEqual([201, 200, 200, 204], [result["status"] for result in results])
+        created = results[0]["data"]
+        self.assertEqual(self.images[1].pk, created["image"])
+        self.assertTrue(Annotation.objects.filter(pk=created["id"]).exists())
+        self.assertEqual(["47"], results[1]["data"]["tags"])
+        self.assertEqual({"op": "delete", "status": 204, "id": third.pk}, results[3])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(["47"], first.tags)
+        self.assertEqual(2, first.version)
+        self.assertEqual("caries", second.class_id)
+        self.assertEqual(["48"], second.tags)
+        self.assertFalse(Annotation.objects.filter(pk=third.pk).exists())
+
+    def test_failed_operation_rolls_back(self):
+        first, second, _ = self.annotations
+        response = self.post(
+            [
+                {"op": "partial_update", "id": first.pk, "data": {"tags": ["11"]}},
+                {"op": "delete", "id": second.pk},
+                {"op": "delete", "id": 0},
+                {
+                    "op": "create",
+                    "data": annotation_payload(
+                        image=self.images[0].pk,
+                        meta={"confirmed": True, "confidence_percent": 1.5},
+                    ),
+                },
+            ]
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        results = response.json()["results"]
+        self.assertEqual([424, 424, 404, 400], [result["status"] for result in results])
+        self.assertEqual(0, results[2]["id"])
+        self.assertIn("errors", results[3])
+        self.assertTrue(all("data" not in result for result in results))
+        first.refresh_from_db()
+        self.assertEqual(["48"], first.tags)
+        self.assertEqual(3, Annotation.objects.count())
+
+    def test_unknown_image(self):
+        response = self.post(
+            [
+                {
+                    "op": "create",
+                    "data": annotation_payload(image=self.images[1].pk + 100),
+                }
+            ]
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("image", response.json()["results"][0]["errors"])
+
+    def test_annotation_in_two_operations(self):
+        annotation = self.annotations[0]
+        response = self.post(
+            [
+                {"op": "partial_update", "id": annotation.pk, "data": {"tags": ["11"]}},
+                {"op": "delete", "id": annotation.pk},
+            ]
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(
+            [424, 400], [result["status"] for result in response.json()["results"]]
+        )
+        self.assertTrue(Annotation.objects.filter(pk=annotation.pk).exists())
+
+    def test_version_mismatch(self):
+        annotation = self.annotations[0]
+        response = self.post(
+            [
+                {
+                    "op": "partial_update",
+                    "id": annotation.pk,
+                    "version": annotation.version,
+                    "data": {"tags": ["11"]},
+                },
+                {"op": "delete", "id": self.annotations[1].pk, "version": 0},
+            ]
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(
+            [424, 412], [result["status"] for result in response.json()["results"]]
+        )
+
+    def test_invalid_operations(self):
+        for operations in (
+            [],
+            [{"op": "create", "id": self.annotations[0].pk, "data": {}}],
+            [{"op": "delete"}],
+            [{"op": "update", "id": self.annotations[0].pk}],
+            [{"op": "move", "id": self.annotations[0].pk}],
+        ):
+            with self.subTest(operations=operations):
+                response = self.post(operations)
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+                self.assertNotIn("results", response.json())
+
+    def test_images_touched(self):
+        source, target = self.images
+        response = self.post(
+            [
+                {
+                    "op": "partial_update",
+                    "id": self.annotations[0].pk,
+                    "data": {"image": target.pk},
+                }
+            ]
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(target.pk, response.json()["results"][0]["data"]["image"])
+        for image in (source, target):
+            version = image.version
+            image.refresh_from_db()
+            self.assertGreater(image.version, version)
+        self.assertEqual(2, source.annotations.count())
+        self.assertEqual(1, target.annotations.count())
+        for image, count in ((source, 2), (target, 1)):
+            self.assertEqual(
+                count,
+                ImageStatistics.objects.filter(image=image).aggregate(Sum("count"))[
+                    "count__sum"
+                ],
+            )
+
+    def test_statistics(self):
+        self.post(
+            [
+                {"op": "delete", "id": self.annotations[0].pk},
+                {
+                    "op": "partial_update",
+                    "id": self.annotations[1].pk,
+                    "data": {"class_id": "caries"},
+                },
+            ]
+        )
+
+        counts = dict(
+            ClassStatistics.objects.values("class_id")
+            .annotate(total=Sum("count"))
+            .values_list("class_id", "total")
+        )
+        self.assertEqual(1, counts["tooth"])
+        self.assertEqual(1, counts["caries"])
+
+    def test_query_count_independent_of_batch_size(self):
+        def count_queries(count):
+            operations = [
+                {"op": "create", "data": annotation_payload(image=self.images[1].pk)}
+                for _ in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(operations)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            return len(queries)
+
+        self.assertEqual(count_queries(1), count_queries(50))
+
+    def test_images_locked_before_annotations(self):
+        first, second, _ = self.annotations
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(
+                [
+                    {"op": "partial_update", "id": first.pk, "data": {"tags": []}},
+                    {"op": "delete", "id": second.pk},
+                ]
+            )
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+
+        locked_tables = [
+            query["sql"].split('"')[1]
+            for query in queries
+            if query["sql"].endswith("FOR UPDATE")
+        ]
+        self.assertEqual(Image._meta.db_table, locked_tables[0])
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.models import Annotation, Image
+from tests import constants
+from tests.factories import annotation_payload
+
+
+class AnnotationListCacheTests(APITestCase):
+    def setUp(self):
+        caches[settings.ANNOTATION_CACHE_ALIAS].clear()
+        self.image = self.create_image()
+        self.other_image = self.create_image()
+        Annotation.objects.create(image=self.image, **annotation_payload())
+        Annotation.objects.create(image=self.other_image, **annotation_payload())
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def create_image(self):
+        return Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+
+    def annotations_url(self, image=None, direction=None):
+        url = reverse(
+            "image-annotations", kwargs={"image_id": (image or self.image).pk}
+        )
+        return f"{url}?direction={direction}" if direction else url
+
+    def get_annotations(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"GET {url} failed. Response data: {response.data}",
+        )
+        # a cache hit only runs the query of the conditional GET validators
+        cached = len(context.captured_queries) == 1
+        return [item["class_id"] for item in response.data["results"]], cached
+
+    def assertCached(self, url):
+        _, cached = self.get_annotations(url)
+        self.assertTrue(cached, msg=f"GET {url} was not served from the cache.")
+
+    def assertNotCached(self, url):
+        _, cached = self.get_annotations(url)
+        self.assertFalse(
+            cached, msg=f"GET {url} was unexpectedly served from the cache."
+        )
+
+    def test_annotation_list_cached(self):
+        url = self.annotations_url()
+        self.assertNotCached(url)
+        self.assertCached(url)
+        # each direction has its own entry
+        self.assertNotCached(self.annotations_url(direction="external"))
+        self.assertCached(self.annotations_url(direction="external"))
+
+    def test_annotation_write_invalidates_image_only(self):
+        url = self.annotations_url()
+        other_url = self.annotations_url(self.other_image)
+        self.get_annotations(url)
+        self.get_annotations(other_url)
+
+        response = self.client.post(
+            url,
+            {"image": self.image.pk, **annotation_payload(class_id="caries")},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        class_ids, cached = self.get_annotations(url)
+        self.assertFalse(cached)
+        self.assertEqual(["tooth", "caries"], class_ids)
+        self.assertCached(other_url)
+
+    def test_annotation_update_invalidates_external_direction(self):
+        url = self.annotations_url(direction="external")
+        class_ids, _ = self.get_annotations(url)
+        self.assertEqual(["tooth"], class_ids)
+
+        annotation = self.image.annotations.get()
+        response = self.client.patch(
+            reverse(
+                "image-annotation-detail",
+                kwargs={"image_id": self.image.pk, "pk": annotation.pk},
+            ),
+            {"meta": {"confirmed": False}},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        class_ids, _ = self.get_annotations(url)
+        self.assertEqual([], class_ids)
+
+    def test_image_update_invalidates(self):
+        url = self.annotations_url()
+        self.get_annotations(url)
+
+        response = self.client.patch(
+            reverse("image-detail", kwargs={"pk": self.image.pk}),
+            {"annotations": [annotation_payload(class_id="caries")]},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        class_ids, _ = self.get_annotations(url)
+        self.assertEqual(["caries"], class_ids)
+
+    def test_image_delete_invalidates(self):
+        url = self.annotations_url()
+        self.get_annotations(url)
+        self.image.delete()
+
+        class_ids, _ = self.get_annotations(url)
+        self.assertEqual([], class_ids)
+
+    def test_write_in_another_process(self):
+        url = self.annotations_url()
+        self.get_annotations(url)
+
+        # written by a worker with its own cache, which this one never sees
+        with override_settings(ANNOTATION_CACHE_ALIAS="default"):
+            Annotation.objects.create(
+                image=self.image, **annotation_payload(class_id="caries")
+            )
+
+        class_ids, cached = self.get_annotations(url)
+        self.assertFalse(cached)
+        self.assertEqual(["tooth", "caries"], class_ids)
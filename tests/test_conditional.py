@@ -0,0 +1,281 @@
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image import views
+from dent_image_api.models import Annotation, Image
+from dent_image_api.serializers import AnnotationSerializer
+from tests import constants
+
+
+class ConditionalTestCase(APITestCase):
+    def setUp(self):
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        self.annotation = Annotation.objects.create(
+            image=self.image,
+            class_id="tooth",
+            shape={"start_x": 100, "start_y": 100, "end_x": 200, "end_y": 200},
+            tags=["48"],
+            meta={"confirmed": True, "confidence_percent": 0.99},
+        )
+
+        self.image_url = reverse("image-detail", kwargs={"pk": self.image.pk})
+        self.annotations_url = reverse(
+            "image-annotations", kwargs={"image_id": self.image.pk}
+        )
+        self.annotation_url = reverse(
+            "image-annotation-detail",
+            kwargs={"image_id": self.image.pk, "pk": self.annotation.pk},
+        )
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"GET {url} failed. Response data: {response.data}",
+        )
+        self.assertIn("Accept", response["Vary"])
+        return response["ETag"]
+
+
+class ConditionalGetTests(ConditionalTestCase):
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            status.HTTP_304_NOT_MODIFIED,
+            response.status_code,
+            msg=f"GET {url} with a matching ETag was not answered with 304.",
+        )
+        self.assertEqual(b"", response.content)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_image_detail(self):
+        etag = self.get_etag(self.image_url)
+        self.assertNotModified(self.image_url, etag)
+
+        self.client.patch(self.image_url, {"name": "Renamed"}, format="json")
+        self.assertModified(self.image_url, etag)
+
+    def test_image_detail_changes_with_annotations(self):
+        etag = self.get_etag(self.image_url)
+        self.client.patch(self.annotation_url, {"class_id": "caries"}, format="json")
+        self.assertModified(self.image_url, etag)
+
+    def test_image_detail_if_modified_since(self):
+        self.image.refresh_from_db()
+        response = self.client.get(
+            self.image_url,
+            HTTP_IF_MODIFIED_SINCE=http_date(self.image.updated_at.timestamp() + 1),
+        )
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_annotation_list(self):
+        etag = self.get_etag(self.annotations_url)
+        self.assertNotModified(self.annotations_url, etag)
+
+        self.client.delete(self.annotation_url)
+        self.assertModified(self.annotations_url, etag)
+
+    def test_annotation_detail(self):
+        etag = self.get_etag(self.annotation_url)
+        self.assertNotModified(self.annotation_url, etag)
+
+        self.client.patch(self.annotation_url, {"class_id": "caries"}, format="json")
+        self.assertModified(self.annotation_url, etag)
+
+    def test_etag_depends_on_representation(self):
+        json_etag = self.get_etag(self.image_url)
+        response = self.client.get(self.image_url, HTTP_ACCEPT="text/html")
+        self.assertNotEqual(json_etag, response["ETag"])
+
+    def test_missing_resource(self):
+        response = self.client.get(
+            reverse("image-detail", kwargs={"pk": self.image.pk + 1000}),
+            HTTP_IF_NONE_MATCH="*",
+        )
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class ConditionalWriteTests(ConditionalTestCase):
+    def test_image_if_match(self):
+        etag = self.get_etag(self.image_url)
+        response = self.client.patch(
+            self.image_url, {"name": "Renamed"}, format="json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(response["ETag"], self.get_etag(self.image_url))
+
+        # the second reviewer edits the version read before the first change
+        response = self.client.patch(
+            self.image_url, {"name": "Lost"}, format="json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+        self.image.refresh_from_db()
+        self.assertEqual("Renamed", self.image.name)
+
+    def test_image_stale_after_annotation_write(self):
+        etag = self.get_etag(self.image_url)
+        self.client.patch(self.annotation_url, {"class_id": "caries"}, format="json")
+
+        response = self.client.patch(
+            self.image_url,
+            {"annotations": []},
+            format="json",
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+        self.assertTrue(Annotation.objects.filter(pk=self.annotation.pk).exists())
+
+    def test_annotation_if_match(self):
+        etag = self.get_etag(self.annotation_url)
+        response = self.client.patch(
+            self.annotation_url, {"tags": ["47"]}, format="json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        response = self.client.patch(
+            self.annotation_url, {"tags": ["46"]}, format="json", HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+        self.annotation.refresh_from_db()
+        self.assertEqual(["47"], self.annotation.tags)
+
+    def test_if_match_any_format(self):
+        etag = self.get_etag(self.annotation_url)
+        html_etag = etag.replace("-json", "-api")
+        response = self.client.patch(
+            self.annotation_url,
+            {"tags": ["47"]},
+            format="json",
+            HTTP_IF_MATCH=f'"0-json", {html_etag}',
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_weak_etag_never_matches(self):
+        etag = self.get_etag(self.annotation_url)
+        response = self.client.delete(self.annotation_url, HTTP_IF_MATCH=f"W/{etag}")
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+
+    def test_delete_if_match(self):
+        etag = self.get_etag(self.image_url)
+        self.client.patch(self.image_url, {"name": "Renamed"}, format="json")
+
+        response = self.client.delete(self.image_url, HTTP_IF_MATCH=etag)
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+        self.assertTrue(Image.objects.filter(pk=self.image.pk).exists())
+
+        response = self.client.delete(self.image_url, HTTP_IF_MATCH="*")
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertFalse(Image.objects.filter(pk=self.image.pk).exists())
+
+    def test_concurrent_write(self):
+        def write_meanwhile(attrs):
+            Annotation.objects.filter(pk=self.annotation.pk).update(
+                version=F("version") + 1
+            )
+            return attrs
+
+        # another request writes between the read and the write of this one
+        with mock.patch.object(
+            AnnotationSerializer, "validate", side_effect=write_meanwhile
+        ):
+            response = self.client.patch(
+                self.annotation_url, {"tags": ["47"]}, format="json"
+            )
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        self.annotation.refresh_from_db()
+        self.assertEqual(["48"], self.annotation.tags)
+
+    def test_image_locked_before_annotation(self):
+        other_image = Image.objects.create(name="Other Image", file=self.image.file)
+
+        for method, data in (
+            ("patch", {"tags": ["47"]}),
+            ("patch", {"image": other_image.pk}),
+            ("delete", None),
+        ):
+            self.annotation.refresh_from_db()
+            url = reverse(
+                "image-annotation-detail",
+                kwargs={"image_id": self.annotation.image_id, "pk": self.annotation.pk},
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(url, data, format="json")
+            self.assertLess(response.status_code, 300, response.content)
+
+            writes = [
+                query["sql"].split('"')[1]
+                for query in queries
+                if query["sql"].startswith(("UPDATE", "DELETE"))
+                or query["sql"].endswith("FOR UPDATE")
+            ]
+            self.assertEqual(Image._meta.db_table, writes[0], (method, data))
+
+
+class MediaConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.image.delete()
+
+    def get_media(self, **headers):
+        request = self.factory.get(f"/media/{self.image.file.name}", **headers)
+        return views.media(
+            request, self.image.file.name, document_root=settings.MEDIA_ROOT
+        )
+
+    def test_media_etag(self):
+        response = self.get_media()
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        etag = response["ETag"]
+
+        response = self.get_media(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+        os.utime(self.image.file.path, ns=(1, 1))
+        response = self.get_media(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_missing_media(self):
+        request = self.factory.get("/media/images/missing.jpeg")
+        with self.assertRaises(Http404):
+            views.media(
+                request, "images/missing.jpeg", document_root=settings.MEDIA_ROOT
+            )
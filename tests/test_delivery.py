@@ -0,0 +1,177 @@
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.delivery import IMMUTABLE_MAX_AGE, parse_range
+from dent_image_api.models import Image
+from tests import constants
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        for header, expected in (
+            ("bytes=0-9", range(0, 10)),
+            ("bytes=10-", range(10, 100)),
+            ("bytes=90-200", range(90, 100)),
+            ("bytes=-10", range(90, 100)),
+            ("bytes=-200", range(0, 100)),
+        ):
+            self.assertEqual(expected, parse_range(header, 100), msg=header)
+
+    def test_unsatisfiable(self):
+        for header in ("bytes=100-", "bytes=200-300", "bytes=-0"):
+            self.assertEqual(range(0), parse_range(header, 100), msg=header)
+
+    def test_ignored(self):
+        for header in (None, "", "bytes=5-1", "bytes=-", "bytes=0-1,5-6", "items=0-1"):
+            self.assertIsNone(parse_range(header, 100), msg=header)
+
+
+class MediaDeliveryTests(APITestCase):
+    def setUp(self):
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            self.content = image_file.read()
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg", content=self.content, content_type="image/jpeg"
+            ),
+        )
+        self.url = f"/media/{self.image.file.name}"
+
+    def tearDown(self):
+        self.image.delete()
+
+    def test_whole_file(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(self.content, b"".join(response.streaming_content))
+        self.assertEqual(str(len(self.content)), response["Content-Length"])
+        self.assertEqual("image/jpeg", response["Content-Type"])
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        self.assertEqual("no-cache", response["Cache-Control"])
+        self.assertFalse(response["ETag"].startswith("W/"))
+
+    def test_head(self):
+        response = self.client.head(self.url)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual(str(len(self.content)), response["Content-Length"])
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(self.content[100:200], b"".join(response.streaming_content))
+        self.assertEqual("100", response["Content-Length"])
+        self.assertEqual(
+            f"bytes 100-199/{len(self.content)}", response["Content-Range"]
+        )
+
+    def test_suffix_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(self.content[-10:], b"".join(response.streaming_content))
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+
+        self.assertEqual(
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, response.status_code
+        )
+        self.assertEqual(f"bytes */{len(self.content)}", response["Content-Range"])
+
+    def test_if_range(self):
+        validators = self.client.head(self.url)
+
+        for if_range, expected_status in (
+            (validators["ETag"], status.HTTP_206_PARTIAL_CONTENT),
+            (validators["Last-Modified"], status.HTTP_206_PARTIAL_CONTENT),
+            ('"stale"', status.HTTP_200_OK),
+            (f"W/{validators['ETag']}", status.HTTP_200_OK),
+            (http_date(0), status.HTTP_200_OK),
+        ):
+            response = self.client.get(
+                self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=if_range
+            )
+            self.assertEqual(expected_status, response.status_code, msg=if_range)
+
+    def test_if_match(self):
+        response = self.client.get(self.url, HTTP_IF_MATCH='"stale"')
+
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+
+    def test_directory(self):
+        response = self.client.get("/media/images/")
+
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_outside_media_root(self):
+        response = self.client.get("/media/../manage.py")
+
+        self.assertIn(
+            response.status_code,
+            (status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND),
+        )
+
+    def test_read_only(self):
+        response = self.client.post(self.url)
+
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+
+    @override_settings(MEDIA_IMMUTABLE_PREFIXES=["images/"])
+    def test_immutable(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(
+            f"public, max-age={IMMUTABLE_MAX_AGE}, immutable", response["Cache-Control"]
+        )
+
+    @override_settings(MEDIA_OFFLOAD="x-accel-redirect")
+    def test_accel_redirect(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual(
+            f"/protected-media/{self.image.file.name}", response["X-Accel-Redirect"]
+        )
+        self.assertEqual("image/jpeg", response["Content-Type"])
+        self.assertIn("ETag", response)
+
+        etag = response["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+    @override_settings(MEDIA_OFFLOAD="x-sendfile")
+    def test_sendfile(self):
+        for url in (
+            self.url,
+            reverse("async-image-file", kwargs={"pk": self.image.pk}),
+        ):
+            response = self.client.get(url)
+
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(b"", response.content)
+            self.assertEqual(
+                os.path.realpath(self.image.file.path),
+                os.path.realpath(response["X-Sendfile"]),
+            )
+
+    def test_rendition_range(self):
+        url = reverse("image-rendition", kwargs={"pk": self.image.pk})
+        whole = b"".join(self.client.get(url, {"w": 64}).streaming_content)
+
+        response = self.client.get(url, {"w": 64}, HTTP_RANGE="bytes=0-1")
+
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(whole[:2], b"".join(response.streaming_content))
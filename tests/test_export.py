@@ -0,0 +1,145 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.models import Annotation, Image
+from tests import constants
+from tests.factories import annotation_payload
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.images = [self.create_image(f"Image {i}") for i in range(3)]
+        for image in self.images[:2]:
+            # drawn from right to left, the bbox is still from the top-left corner
+            shape = {"start_x": 200, "start_y": 100, "end_x": 100, "end_y": 250}
+            Annotation.objects.create(image=image, **annotation_payload(shape=shape))
+            Annotation.objects.create(
+                image=image,
+                **annotation_payload(class_id="caries", meta={"confirmed": False}),
+            )
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def create_image(self, name):
+        return Image.objects.create(
+            name=name,
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+
+    def export(self, export_format, params=None):
+        response = self.client.get(reverse(f"export-{export_format}"), params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content), response
+
+    def ndjson(self, params=None):
+        content, _ = self.export("ndjson", params)
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_ndjson_as_image_list(self):
+        content, response = self.export("ndjson")
+
+        self.assertEqual("application/x-ndjson", response["Content-Type"])
+        self.assertIn("attachment", response["Content-Disposition"])
+        listed = self.client.get(reverse("image-list")).json()["results"]
+        self.assertEqual(
+            listed, [json.loads(line) for line in content.decode().splitlines()]
+        )
+
+    def test_ndjson_small_chunks(self):
+        # the images and annotations cursors are merged across fetches
+        with mock.patch("dent_image_api.export.CHUNK_SIZE", 1), mock.patch(
+            "dent_image_api.export.BUFFER_SIZE", 1
+        ):
+            lines = self.ndjson()
+
+        self.assertEqual([2, 2, 0], [len(line["annotations"]) for line in lines])
+
+    def test_ndjson_filters(self):
+        lines = self.ndjson({"direction": "external"})
+        self.assertEqual(
+            [["tooth"], ["tooth"], []],
+            [[a["class_id"] for a in line["annotations"]] for line in lines],
+        )
+
+        lines = self.ndjson({"class_id": "caries"})
+        self.assertEqual(
+            [self.images[0].pk, self.images[1].pk], [line["id"] for line in lines]
+        )
+        self.assertEqual(
+            [["caries"], ["caries"]],
+            [[a["class_id"] for a in line["annotations"]] for line in lines],
+        )
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse("export-ndjson"), {"min_confidence": "x"})
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("min_confidence", response.json())
+
+    def test_coco(self):
+        content, response = self.export("coco", {"direction": "external"})
+
+        self.assertEqual("application/json", response["Content-Type"])
+        document = json.loads(content)
+        self.assertEqual([{"id": 1, "name": "tooth"}], document["categories"])
+        self.assertEqual(
+            [image.pk for image in self.images],
+            [image["id"] for image in document["images"]],
+        )
+        self.assertEqual(self.images[0].file.name, document["images"][0]["file_name"])
+        self.assertEqual(self.images[0].width, document["images"][0]["width"])
+        annotation = document["annotations"][0]
+        self.assertEqual(self.images[0].pk, annotation["image_id"])
+        self.assertEqual(1, annotation["category_id"])
+        self.assertEqual([100, 100, 100, 150], annotation["bbox"])
+        self.assertEqual(15000, annotation["area"])
+        self.assertEqual(["48"], annotation["attributes"]["tags"])
+        self.assertEqual(2, len(document["annotations"]))
+
+    def test_coco_empty(self):
+        content, _ = self.export("coco", {"class_id": "crown"})
+
+        document = json.loads(content)
+        self.assertEqual(
+            ([], [], []),
+            tuple(document[key] for key in ("categories", "images", "annotations")),
+        )
+
+    def test_command(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            "export_annotations", "--class-id", "tooth", stdout=stdout, stderr=stderr
+        )
+
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(2, len(lines))
+        self.assertIn("Exported 2 images and 2 annotations.", stderr.getvalue())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export.json")
+            call_command(
+                "export_annotations",
+                "--format",
+                "coco",
+                "--output",
+                path,
+                stderr=stderr,
+            )
+            with open(path) as output:
+                self.assertEqual(4, len(json.load(output)["annotations"]))
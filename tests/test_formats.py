@@ -0,0 +1,158 @@
+import datetime
+import decimal
+import json
+import unittest
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from dent_image_api.formats import json_loads, msgpack
+from dent_image_api.models import Annotation, Image
+from dent_image_api.renderers import FastJSONRenderer
+from tests import constants
+from tests.factories import annotation_payload
+
+
+class FastJSONRendererTests(unittest.TestCase):
+    def test_same_document_as_json_renderer(self):
+        data = {
+            "text": "ünïcode  ",
+            "number": 1.5,
+            "decimal": decimal.Decimal("0.25"),
+            "date": datetime.date(2024, 1, 10),
+            "nested": [{"a": None, "b": True}, [], {}],
+        }
+
+        self.assertEqual(
+            json.loads(JSONRenderer().render(data)),
+            json.loads(FastJSONRenderer().render(data)),
+        )
+
+    def test_integer_outside_64_bit_range(self):
+        data = {"meta": {"study": 2**70 + 1}}
+
+        self.assertEqual(JSONRenderer().render(data), FastJSONRenderer().render(data))
+
+    def test_json_loads_keeps_large_integers(self):
+        document = json.dumps(
+            {"study": 2**70 + 1, "negative": -(2**70 + 1), "small": 1}
+        )
+
+        self.assertEqual(json.loads(document), json_loads(document))
+        self.assertEqual(json.loads(document), json_loads(document.encode()))
+
+    def test_indent(self):
+        rendered = FastJSONRenderer().render(
+            {"a": [1]}, accepted_media_type="application/json; indent=4"
+        )
+
+        self.assertEqual(b'{\n    "a": [\n        1\n    ]\n}', rendered)
+
+
+class FormatNegotiationTests(APITestCase):
+    def setUp(self):
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        Annotation.objects.create(image=self.image, **annotation_payload())
+        self.annotations_url = reverse(
+            "image-annotations", kwargs={"image_id": self.image.pk}
+        )
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def test_invalid_json(self):
+        response = self.client.post(
+            self.annotations_url, b'{"class_id": ', content_type="application/json"
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("JSON parse error", response.data["detail"])
+
+    def test_large_integer_round_trip(self):
+        payload = annotation_payload(meta={"study": 2**70 + 1})
+        response = self.client.post(
+            self.annotations_url,
+            json.dumps({"image": self.image.pk, **payload}),
+            content_type="application/json",
+        )
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        response = self.client.get(self.annotations_url)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2**70 + 1, response.json()["results"][-1]["meta"]["study"])
+
+    def test_multipart_annotations(self):
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            response = self.client.post(
+                reverse("image-list"),
+                {
+                    "name": "New Image",
+                    "file": image_file,
+                    "annotations": json.dumps([annotation_payload()] * 3),
+                },
+            )
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(3, len(response.data["annotations"]))
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_response(self):
+        json_response = self.client.get(self.annotations_url)
+        response = self.client.get(
+            self.annotations_url, HTTP_ACCEPT="application/msgpack"
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual("application/msgpack", response["Content-Type"])
+        self.assertEqual(json_response.json(), msgpack.unpackb(response.content))
+        self.assertNotEqual(json_response["ETag"], response["ETag"])
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_format_parameter(self):
+        response = self.client.get(
+            reverse("image-detail", kwargs={"pk": self.image.pk}), {"format": "msgpack"}
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(self.image.pk, msgpack.unpackb(response.content)["id"])
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_request(self):
+        payload = {"image": self.image.pk, **annotation_payload(class_id="caries")}
+        response = self.client.post(
+            self.annotations_url,
+            msgpack.packb(payload),
+            content_type="application/msgpack",
+            HTTP_ACCEPT="application/msgpack",
+        )
+
+        self.assertEqual(
+            status.HTTP_201_CREATED,
+            response.status_code,
+            msg=f"Response data: {response.data}",
+        )
+        self.assertEqual("caries", msgpack.unpackb(response.content)["class_id"])
+        self.assertTrue(
+            Annotation.objects.filter(image=self.image, class_id="caries").exists()
+        )
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_invalid_msgpack(self):
+        response = self.client.post(
+            self.annotations_url, b"\xc1", content_type="application/msgpack"
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("MessagePack parse error", response.data["detail"])
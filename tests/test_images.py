@@ -1,12 +1,15 @@
 import json
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from dent_image_api.models import Image, Annotation
+from dent_image_api.models import Annotation, Image
 from tests import constants
+from tests.factories import annotation_payload
 
 
 class ImageTests(APITestCase):
@@ -124,10 +127,72 @@ class ImageTests(APITestCase):
             msg=f"Failed to get image list. Response data: {response.data}",
         )
         self.assertEqual(
-            4,  # 2 images from migrations and 2 from tests
-            len(response.data),
+            Image.objects.count(),
+            len(response.data["results"]),
             msg="Image list does not contain expected number of entries.",
         )
+        self.assertNotIn("count", response.data)
+
+    def test_get_image_list_with_cursor(self):
+        response = self.client.get(self.list_url, {"page_size": 1})
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"Failed to get image list. Response data: {response.data}",
+        )
+        self.assertEqual(1, len(response.data["results"]))
+        self.assertIsNone(response.data["previous"])
+
+        seen_ids = [item["id"] for item in response.data["results"]]
+        next_url = response.data["next"]
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            seen_ids += [item["id"] for item in response.data["results"]]
+            next_url = response.data["next"]
+
+        self.assertEqual(
+            list(Image.objects.order_by("id").values_list("id", flat=True)),
+            seen_ids,
+            msg="Walking the cursors did not return every image exactly once in id order.",
+        )
+
+    def test_get_image_list_filtered_by_annotations(self):
+        Annotation.objects.create(
+            image=self.image, **annotation_payload(class_id="caries", tags=["36"])
+        )
+        Annotation.objects.create(
+            image=self.image, **annotation_payload(class_id="caries", tags=["36"])
+        )
+        Annotation.objects.create(
+            image=self.image_2,
+            **annotation_payload(
+                class_id="caries",
+                tags=["37"],
+                meta={"confirmed": True, "confidence_percent": 0.4},
+            ),
+        )
+
+        def get_image_ids(params):
+            response = self.client.get(self.list_url, params)
+            self.assertEqual(
+                status.HTTP_200_OK,
+                response.status_code,
+                msg=f"Failed to get image list. Response data: {response.data}",
+            )
+            return [item["id"] for item in response.data["results"]]
+
+        self.assertEqual(
+            [self.image.pk], get_image_ids({"class_id": "caries", "tag": "36"})
+        )
+        self.assertEqual(
+            [self.image.pk, self.image_2.pk], get_image_ids({"class_id": "caries"})
+        )
+        self.assertEqual(
+            [self.image_2.pk],
+            get_image_ids({"class_id": "caries", "max_confidence": "0.5"}),
+        )
+        self.assertEqual([], get_image_ids({"class_id": "tooth", "tag": "37"}))
 
     def test_get_image_detail(self):
         response = self.client.get(self.detail_url)
@@ -225,6 +290,79 @@ class ImageTests(APITestCase):
             )
             assert constants.TEST_IMAGE_2_FILENAME in patched_image.file.path
 
+    def test_patch_image_annotations(self):
+        kept = Annotation.objects.create(image=self.image, **annotation_payload())
+        removed = Annotation.objects.create(image=self.image, **annotation_payload())
+
+        patch_data = {
+            "annotations": [
+                {**annotation_payload(class_id="patched_tooth"), "id": kept.pk},
+                annotation_payload(class_id="new_caries"),
+            ]
+        }
+        response = self.client.patch(self.detail_url, patch_data, format="json")
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"Failed to patch image annotations. Response data: {response.data}",
+        )
+
+        annotations = Annotation.objects.filter(image=self.image)
+        self.assertEqual(
+            {"patched_tooth", "new_caries"},
+            set(annotations.values_list("class_id", flat=True)),
+        )
+        self.assertTrue(annotations.filter(pk=kept.pk).exists())
+        self.assertFalse(annotations.filter(pk=removed.pk).exists())
+
+    def test_patch_image_annotations_query_count(self):
+        def patch_queries(annotations_count):
+            existing = Annotation.objects.bulk_create(
+                Annotation(image=self.image, **annotation_payload())
+                for _ in range(annotations_count)
+            )
+            patch_data = {
+                "annotations": [
+                    {**annotation_payload(class_id="updated"), "id": annotation.pk}
+                    for annotation in existing[::2]
+                ]
+                + [annotation_payload() for _ in range(annotations_count)]
+            }
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.patch(self.detail_url, patch_data, format="json")
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            Annotation.objects.filter(image=self.image).delete()
+            return len(context.captured_queries)
+
+        self.assertEqual(
+            patch_queries(4),
+            patch_queries(40),
+            msg="Nested annotation writes issue a query per annotation.",
+        )
+
+    def test_patch_image_with_invalid_annotation(self):
+        annotation = Annotation.objects.create(image=self.image, **annotation_payload())
+        patch_data = {
+            "annotations": [
+                annotation_payload(class_id="valid"),
+                annotation_payload(meta={"confirmed": "not a boolean"}),
+            ]
+        }
+        response = self.client.patch(self.detail_url, patch_data, format="json")
+        self.assertEqual(
+            status.HTTP_400_BAD_REQUEST,
+            response.status_code,
+            msg=f"Invalid annotation unexpectedly accepted. Response data: {response.data}",
+        )
+        self.assertEqual({}, response.data["annotations"][0])
+        self.assertEqual(
+            [annotation.pk],
+            list(
+                Annotation.objects.filter(image=self.image).values_list("pk", flat=True)
+            ),
+            msg="Annotations changed although the request was rejected.",
+        )
+
     def test_delete_image(self):
         response = self.client.delete(self.detail_url)
         self.assertEqual(
@@ -0,0 +1,206 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from dent_image_api.models import (
+    Annotation,
+    ClassStatistics,
+    Image,
+    IngestCheckpoint,
+    StoredFile,
+)
+from tests import constants
+from tests.factories import annotation_payload
+
+
+class IngestImagesTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.makedirs(os.path.join(self.directory, "clinic"))
+        for path in ("a.jpeg", "clinic/b.jpeg", "clinic/c.jpeg"):
+            shutil.copy(constants.TEST_IMAGE_PATH, os.path.join(self.directory, path))
+        shutil.copy(
+            constants.TEST_INVALID_IMAGE_PATH,
+            os.path.join(self.directory, "invalid.jpeg"),
+        )
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def write_manifest(self, entries, filename="manifest.jsonl"):
+        path = os.path.join(self.directory, filename)
+        with open(path, "w") as manifest:
+            for entry in entries:
+                manifest.write((entry if isinstance(entry, str) else json.dumps(entry)))
+                manifest.write("\n")
+        return path
+
+    def ingest(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            "ingest_images",
+            self.directory,
+            *args,
+            stdout=stdout,
+            stderr=stderr,
+            **{"workers": 0, **options},
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_jsonl_manifest(self):
+        manifest = self.write_manifest(
+            [
+                {
+                    "file": "a.jpeg",
+                    "name": "Patient A",
+                    "annotations": [
+                        annotation_payload(),
+                        annotation_payload(class_id="caries"),
+                    ],
+                },
+                {"file": "clinic/b.jpeg"},
+                {"file": "missing.jpeg"},
+                {"file": "invalid.jpeg"},
+                {"file": "clinic/c.jpeg", "annotations": [{"class_id": "tooth"}]},
+                "{not json",
+            ]
+        )
+
+        stdout, stderr = self.ingest(manifest=manifest, batch_size=2)
+
+        self.assertEqual(
+            ["Patient A", "b.jpeg"],
+            list(Image.objects.order_by("pk").values_list("name", flat=True)),
+        )
+        image = Image.objects.get(name="Patient A")
+        self.assertEqual(
+            ["caries", "tooth"],
+            sorted(image.annotations.values_list("class_id", flat=True)),
+        )
+        self.assertTrue(os.path.exists(image.file.path))
+        self.assertEqual("JPEG", image.format)
+        self.assertEqual(os.path.getsize(image.file.path), image.byte_size)
+        self.assertEqual(2, StoredFile.objects.count())
+        self.assertEqual(
+            2, sum(ClassStatistics.objects.values_list("count", flat=True))
+        )
+        self.assertEqual(4, len(stderr.splitlines()))
+        for line in (3, 4, 5, 6):
+            self.assertIn(f"Entry at line {line}:", stderr)
+        self.assertIn("2 images and 2 annotations ingested, 4 entries skipped", stdout)
+        self.assertEqual(6, IngestCheckpoint.objects.get().position)
+
+    def test_csv_manifest(self):
+        path = os.path.join(self.directory, "manifest.csv")
+        with open(path, "w", newline="") as manifest:
+            writer = csv.writer(manifest)
+            writer.writerow(["file", "name", "annotations"])
+            writer.writerow(["a.jpeg", "", json.dumps([annotation_payload()])])
+            writer.writerow(["clinic/b.jpeg", "Patient B", ""])
+
+        self.ingest(manifest=path)
+
+        self.assertEqual(
+            {"a.jpeg": 1, "Patient B": 0},
+            {image.name: image.annotations.count() for image in Image.objects.all()},
+        )
+
+    def test_directory(self):
+        stdout, stderr = self.ingest()
+
+        self.assertEqual(
+            ["a.jpeg", "b.jpeg", "c.jpeg"],
+            list(Image.objects.order_by("pk").values_list("name", flat=True)),
+        )
+        self.assertIn("invalid.jpeg is not a valid image", stderr)
+
+    def test_resume(self):
+        manifest = self.write_manifest(
+            [{"file": "a.jpeg"}, {"file": "clinic/b.jpeg"}, {"file": "clinic/c.jpeg"}]
+        )
+        # a previous run committed the first entry, then stopped
+        IngestCheckpoint.objects.create(job=os.path.abspath(manifest), position=1)
+
+        stdout, _ = self.ingest(manifest=manifest)
+
+        self.assertIn("Resuming after entry 1.", stdout)
+        self.assertEqual(
+            ["b.jpeg", "c.jpeg"], sorted(Image.objects.values_list("name", flat=True))
+        )
+
+        self.ingest(manifest=manifest)
+        self.assertEqual(2, Image.objects.count())
+
+        self.ingest(manifest=manifest, restart=True)
+        self.assertEqual(5, Image.objects.count())
+
+    def test_failed_batch_discards_its_files(self):
+        manifest = self.write_manifest([{"file": "a.jpeg"}, {"file": "clinic/b.jpeg"}])
+        storage = Image._meta.get_field("file").storage
+        files_before = storage.listdir("images")[1] if storage.exists("images") else []
+
+        with mock.patch.object(
+            StoredFile.objects, "acquire_many", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.ingest(manifest=manifest)
+
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual(sorted(files_before), sorted(storage.listdir("images")[1]))
+        self.assertEqual(0, IngestCheckpoint.objects.get().position)
+
+    def test_interrupted_batch_discards_its_files(self):
+        manifest = self.write_manifest([{"file": "a.jpeg"}, {"file": "clinic/b.jpeg"}])
+        storage = Image._meta.get_field("file").storage
+        files_before = storage.listdir("images")[1] if storage.exists("images") else []
+
+        # the second batch is prepared while the first one is inserted
+        with mock.patch.object(
+            Annotation.objects, "bulk_create", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.ingest(manifest=manifest, batch_size=1)
+
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual(sorted(files_before), sorted(storage.listdir("images")[1]))
+
+    def test_resume_discards_uncommitted_files(self):
+        manifest = self.write_manifest([{"file": "a.jpeg"}])
+        storage = Image._meta.get_field("file").storage
+        orphan = storage.save("images/orphan.jpeg", ContentFile(b"orphan"))
+        # a previous run was killed while committing a batch
+        IngestCheckpoint.objects.create(
+            job=os.path.abspath(manifest), pending_files=[orphan]
+        )
+
+        stdout, _ = self.ingest(manifest=manifest)
+
+        self.assertIn("Discarded 1 uncommitted files.", stdout)
+        self.assertFalse(storage.exists(orphan))
+        self.assertEqual(1, Image.objects.count())
+        self.assertEqual([], IngestCheckpoint.objects.get().pending_files)
+
+    def test_worker_processes(self):
+        manifest = self.write_manifest(
+            [
+                {"file": "a.jpeg", "annotations": [annotation_payload()]},
+                {"file": "clinic/b.jpeg"},
+                {"file": "invalid.jpeg"},
+            ]
+        )
+
+        _, stderr = self.ingest(manifest=manifest, workers=2, batch_size=1)
+
+        self.assertEqual(2, Image.objects.count())
+        self.assertEqual(1, Annotation.objects.count())
+        self.assertIn("Entry at line 3:", stderr)
@@ -0,0 +1,175 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from dent_image_api import jobs
+from dent_image_api.jobs import work
+from dent_image_api.models import Image, Job
+from dent_image_api.renditions import file_key
+from tests import constants
+
+calls = []
+
+
+def record(**payload):
+    calls.append(payload)
+
+
+def broken(**payload):
+    raise ValueError("broken task")
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_DELAY=10, JOB_RETRY_MAX_DELAY=15)
+@mock.patch.dict(jobs.TASKS, {"record": record, "broken": broken})
+class JobTests(APITestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_run(self):
+        Job.objects.enqueue("record", image_pk=1)
+        Job.objects.enqueue("record", image_pk=2)
+
+        self.assertEqual({"run": 2, "failed": 0}, work(threads=0, burst=True))
+        self.assertEqual([{"image_pk": 1}, {"image_pk": 2}], calls)
+        self.assertFalse(Job.objects.exists())
+
+    def test_delayed(self):
+        Job.objects.enqueue("record", delay=60)
+
+        self.assertEqual({"run": 0, "failed": 0}, work(threads=0, burst=True))
+        self.assertEqual(1, Job.objects.count())
+
+    def test_retries_with_backoff(self):
+        job = Job.objects.enqueue("broken")
+
+        for attempt, delay in ((1, 10), (2, 15)):
+            before = timezone.now()
+            self.assertEqual({"run": 1, "failed": 1}, work(threads=0, burst=True))
+            job.refresh_from_db()
+            self.assertEqual(Job.Status.QUEUED, job.status)
+            self.assertEqual(attempt, job.attempts)
+            self.assertGreaterEqual(job.run_at, before + timedelta(seconds=delay))
+            self.assertIn("ValueError: broken task", job.last_error)
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+        work(threads=0, burst=True)
+        job.refresh_from_db()
+        self.assertEqual(Job.Status.FAILED, job.status)
+        self.assertEqual(3, job.attempts)
+        # failed jobs are kept, and never claimed again
+        self.assertEqual([], Job.objects.claim(10, 60))
+
+    def test_unknown_task(self):
+        job = Job.objects.enqueue("missing")
+
+        work(threads=0, burst=True)
+        job.refresh_from_db()
+        self.assertIn("Unknown task 'missing'", job.last_error)
+
+    def test_lease(self):
+        job = Job.objects.enqueue("record")
+        [claimed] = Job.objects.claim(10, 60)
+        self.assertEqual(1, claimed.attempts)
+        self.assertEqual([], Job.objects.claim(10, 60))
+
+        # the worker died, its lease expires
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now())
+        [reclaimed] = Job.objects.claim(10, 60)
+        self.assertEqual(2, reclaimed.attempts)
+
+        # the first worker finishing late leaves the job to the second one
+        claimed.complete()
+        self.assertTrue(Job.objects.filter(pk=job.pk).exists())
+        reclaimed.complete()
+        self.assertFalse(Job.objects.exists())
+
+    def test_command(self):
+        Job.objects.enqueue("record")
+        Job.objects.enqueue("broken")
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command(
+            "run_jobs", processes=0, threads=0, burst=True, stdout=stdout, stderr=stderr
+        )
+
+        self.assertIn("Done, 2 jobs run, 1 failed.", stdout.getvalue())
+        self.assertIn("failed (attempt 1 of 3)", stderr.getvalue())
+        self.assertIn("ValueError: broken task", stderr.getvalue())
+
+
+class RenditionJobTests(APITestCase):
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+        shutil.rmtree(self.cache_root, ignore_errors=True)
+
+    def test_prebuilt_after_upload(self):
+        with override_settings(
+            RENDITION_CACHE_ROOT=self.cache_root, RENDITION_PREBUILD_WIDTHS=[64, 128]
+        ):
+            image = Image.objects.create(
+                name="X-ray",
+                file=SimpleUploadedFile(
+                    "x-ray.jpeg", open(constants.TEST_IMAGE_PATH, "rb").read()
+                ),
+            )
+            # saved again without a new file
+            image.save()
+            self.assertEqual(1, Job.objects.filter(task="build_renditions").count())
+
+            work(threads=0, burst=True)
+
+        for width in (64, 128):
+            path = os.path.join(
+                self.cache_root, str(image.pk), file_key(image), f"{width}.jpg"
+            )
+            self.assertTrue(os.path.isfile(path))
+
+
+@mock.patch.dict(jobs.TASKS, {"record": record})
+class ClaimConcurrencyTests(TransactionTestCase):
+    def test_locked_jobs_skipped(self):
+        first = Job.objects.enqueue("record")
+        second = Job.objects.enqueue("record")
+        locked, release = threading.Event(), threading.Event()
+
+        def claiming_worker():
+            # another worker in the middle of claiming the first job
+            with transaction.atomic():
+                list(Job.objects.select_for_update().filter(pk=first.pk))
+                locked.set()
+                release.wait(10)
+            connection.close()
+
+        thread = threading.Thread(target=claiming_worker)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = Job.objects.claim(10, 60)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual([second.pk], [job.pk for job in claimed])
+
+    def test_threads(self):
+        calls.clear()
+        for number in range(6):
+            Job.objects.enqueue("record", number=number)
+
+        self.assertEqual({"run": 6, "failed": 0}, work(threads=3, burst=True))
+        self.assertEqual(list(range(6)), sorted(call["number"] for call in calls))
@@ -0,0 +1,142 @@
+import hashlib
+import io
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api import metadata
+from dent_image_api.metadata import file_metadata
+from dent_image_api.models import Image
+from tests import constants
+
+
+def expected_metadata(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    with PILImage.open(path) as image:
+        return {
+            "width": image.width,
+            "height": image.height,
+            "format": image.format,
+            "mode": image.mode,
+            "byte_size": len(data),
+            "content_hash": hashlib.sha256(data).hexdigest(),
+        }
+
+
+def image_bytes(image_format, size=(40, 30)):
+    buffer = io.BytesIO()
+    PILImage.new("L", size).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class FileMetadataTests(APITestCase):
+    def test_reads_header_and_hash(self):
+        data = image_bytes("PNG")
+        content = ContentFile(data, name="image.png")
+
+        self.assertEqual(
+            {
+                "width": 40,
+                "height": 30,
+                "format": "PNG",
+                "mode": "L",
+                "byte_size": len(data),
+                "content_hash": hashlib.sha256(data).hexdigest(),
+            },
+            file_metadata(content),
+        )
+        # for the content addressed storage
+        self.assertEqual(hashlib.sha256(data).hexdigest(), content.content_hash)
+
+    def test_header_past_the_buffered_start(self):
+        data = image_bytes("TIFF")
+        content = ContentFile(data, name="image.tiff")
+        content.content_hash = "known"
+
+        with mock.patch.object(metadata, "HEADER_MAX_SIZE", 0):
+            values = file_metadata(content)
+
+        self.assertEqual(
+            (40, 30, "TIFF"), tuple(values[k] for k in ("width", "height", "format"))
+        )
+        self.assertEqual("known", values["content_hash"])
+
+    def test_not_an_image(self):
+        values = file_metadata(ContentFile(b"not an image", name="image.png"))
+
+        self.assertIsNone(values["width"])
+        self.assertEqual("", values["format"])
+        self.assertEqual(12, values["byte_size"])
+
+
+class ImageMetadataTests(APITestCase):
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def test_upload(self):
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            response = self.client.post(
+                reverse("image-list"), {"name": "X-ray", "file": image_file}
+            )
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        expected = expected_metadata(constants.TEST_IMAGE_PATH)
+        self.assertEqual(expected, {key: response.data[key] for key in expected})
+        image = Image.objects.get(pk=response.data["id"])
+        self.assertEqual(expected["width"], image.width)
+        self.assertEqual(expected["content_hash"], image.content_hash)
+
+        detail = self.client.get(reverse("image-detail", kwargs={"pk": image.pk}))
+        listed = self.client.get(reverse("image-list")).json()["results"][0]
+        self.assertEqual(expected, {key: detail.data[key] for key in expected})
+        self.assertEqual(expected, {key: listed[key] for key in expected})
+
+    def test_replaced_file(self):
+        image = Image.objects.create(
+            name="X-ray", file=ContentFile(image_bytes("PNG"), name="image.png")
+        )
+        url = reverse("image-detail", kwargs={"pk": image.pk})
+        with open(constants.TEST_IMAGE_2_PATH, "rb") as image_file:
+            response = self.client.patch(url, {"file": image_file})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        image.refresh_from_db()
+        expected = expected_metadata(constants.TEST_IMAGE_2_PATH)
+        self.assertEqual(expected, {key: getattr(image, key) for key in expected})
+
+        # the metadata is read from the file only
+        response = self.client.patch(url, {"width": 1}, format="json")
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        image.refresh_from_db()
+        self.assertEqual(expected["width"], image.width)
+
+    def test_backfill(self):
+        image = Image.objects.create(
+            name="X-ray", file=ContentFile(image_bytes("PNG"), name="image.png")
+        )
+        missing = Image.objects.create(name="Missing", file="images/missing.png")
+        stored = {key: getattr(image, key) for key in metadata.METADATA_FIELDS}
+        Image.objects.update(
+            width=None, height=None, format="", mode="", byte_size=None, content_hash=""
+        )
+        image.refresh_from_db()
+        version = image.version
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("backfill_image_metadata", workers=0, stdout=stdout, stderr=stderr)
+
+        image.refresh_from_db()
+        self.assertEqual(stored, {key: getattr(image, key) for key in stored})
+        self.assertGreater(image.version, version)
+        self.assertIn(f"Image {missing.pk}", stderr.getvalue())
+        self.assertIn("1 images recorded, 1 skipped", stdout.getvalue())
+        missing.refresh_from_db()
+        self.assertEqual("", missing.content_hash)
+        Image.objects.filter(pk=missing.pk).delete()
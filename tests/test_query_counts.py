@@ -0,0 +1,127 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.models import Annotation, Image
+from tests import constants
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    Checks that the number of SQL queries of a read endpoint does not depend on the
+    amount of data behind it.
+    """
+
+    def setUp(self):
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            self.image_content = image_file.read()
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def create_image(self, annotations_count=1):
+        image = Image.objects.create(
+            name="Query Count Image",
+            file=SimpleUploadedFile(
+                name="query_count.jpg",
+                content=self.image_content,
+                content_type="image/jpeg",
+            ),
+        )
+        for _ in range(annotations_count):
+            Annotation.objects.create(
+                image=image,
+                class_id="tooth",
+                shape={"start_x": 10, "start_y": 10, "end_x": 20, "end_y": 20},
+                tags=["48"],
+                meta={"confirmed": True, "confidence_percent": 0.9},
+            )
+        return image
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"GET {url} failed. Response data: {response.data}",
+        )
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, grow):
+        """
+        Assert that GET `url` runs the same number of queries before and after
+        calling `grow()` to add more rows.
+        """
+        queries_before = self.count_queries(url)
+        grow()
+        queries_after = self.count_queries(url)
+        self.assertEqual(
+            queries_before,
+            queries_after,
+            msg=f"GET {url} ran {queries_before} queries, then {queries_after} after adding data.",
+        )
+
+
+class ImageQueryCountTests(QueryCountTestCase):
+    def test_image_list(self):
+        self.create_image()
+
+        def grow():
+            for _ in range(5):
+                self.create_image(annotations_count=3)
+
+        self.assertConstantQueries(reverse("image-list"), grow)
+
+    def test_image_detail(self):
+        image = self.create_image()
+
+        def grow():
+            for _ in range(10):
+                Annotation.objects.create(
+                    image=image,
+                    class_id="caries",
+                    shape={"start_x": 1, "start_y": 1, "end_x": 2, "end_y": 2},
+                    tags=["36"],
+                    meta={"confirmed": False, "confidence_percent": 0.5},
+                )
+
+        self.assertConstantQueries(
+            reverse("image-detail", kwargs={"pk": image.pk}), grow
+        )
+
+
+class AnnotationQueryCountTests(QueryCountTestCase):
+    def test_annotation_list(self):
+        image = self.create_image()
+
+        def grow():
+            self.create_image(annotations_count=5)
+            for _ in range(5):
+                Annotation.objects.create(
+                    image=image,
+                    class_id="caries",
+                    shape={"start_x": 1, "start_y": 1, "end_x": 2, "end_y": 2},
+                    tags=["36"],
+                    meta={"confirmed": True, "confidence_percent": 0.5},
+                )
+
+        url = reverse("image-annotations", kwargs={"image_id": image.pk})
+        self.assertConstantQueries(url, grow)
+        self.assertConstantQueries(url + "?direction=external", grow)
+
+    def test_annotation_detail(self):
+        image = self.create_image()
+        annotation = image.annotations.get()
+
+        self.assertConstantQueries(
+            reverse(
+                "image-annotation-detail",
+                kwargs={"image_id": image.pk, "pk": annotation.pk},
+            ),
+            lambda: self.create_image(annotations_count=5),
+        )
@@ -0,0 +1,167 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api import renditions
+from dent_image_api.jobs import work
+from dent_image_api.models import Image
+from tests import constants
+
+
+class RenditionTests(APITestCase):
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(RENDITION_CACHE_ROOT=self.cache_root)
+        self.settings_override.enable()
+
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        self.rendition_url = reverse("image-rendition", kwargs={"pk": self.image.pk})
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_root, ignore_errors=True)
+
+    def get_rendition(self, width):
+        response = self.client.get(self.rendition_url, {"w": width})
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"Failed to get rendition. Response: {response}",
+        )
+        self.assertEqual("image/jpeg", response["Content-Type"])
+        return PILImage.open(io.BytesIO(b"".join(response.streaming_content)))
+
+    def rendition_path(self, width, image=None):
+        image = Image.objects.get(pk=(image or self.image).pk)
+        return os.path.join(
+            self.cache_root, str(image.pk), renditions.file_key(image), f"{width}.jpg"
+        )
+
+    def test_get_rendition(self):
+        with PILImage.open(constants.TEST_IMAGE_PATH) as original:
+            original_width, original_height = original.size
+
+        rendition = self.get_rendition(128)
+        self.assertEqual(128, rendition.width)
+        self.assertAlmostEqual(
+            original_height * 128 / original_width, rendition.height, delta=1
+        )
+        self.assertTrue(os.path.isfile(self.rendition_path(128)))
+
+    def test_get_rendition_from_cache(self):
+        self.get_rendition(64)
+        # a cached rendition is served as is, without rendering it again
+        with open(self.rendition_path(64), "wb") as cached:
+            PILImage.new("L", (64, 10)).save(cached, format="JPEG")
+
+        self.assertEqual((64, 10), self.get_rendition(64).size)
+
+    def test_get_rendition_with_invalid_width(self):
+        for width in ["", "abc", "100"]:
+            response = self.client.get(self.rendition_url, {"w": width})
+            self.assertEqual(
+                status.HTTP_400_BAD_REQUEST,
+                response.status_code,
+                msg=f"Invalid width {width!r} unexpectedly accepted.",
+            )
+
+    def test_renditions_evicted_least_recently_used_first(self):
+        self.get_rendition(64)
+        self.get_rendition(128)
+        os.utime(self.rendition_path(64), (1, 1))
+
+        with override_settings(
+            RENDITION_CACHE_MAX_BYTES=os.path.getsize(self.rendition_path(128)) + 1
+        ):
+            self.get_rendition(256)
+
+        self.assertFalse(os.path.exists(self.rendition_path(64)))
+        self.assertFalse(os.path.exists(self.rendition_path(128)))
+        self.assertTrue(os.path.exists(self.rendition_path(256)))
+
+    def test_cache_scanned_only_over_the_limit(self):
+        self.get_rendition(64)
+        with mock.patch.object(
+            renditions, "_scan_cache", wraps=renditions._scan_cache
+        ) as scan_cache:
+            self.get_rendition(128)
+            self.assertFalse(scan_cache.called)
+
+            with override_settings(RENDITION_CACHE_MAX_BYTES=1):
+                self.get_rendition(256)
+            self.assertTrue(scan_cache.called)
+
+    def test_get_rendition_of_16_bit_image(self):
+        picture = PILImage.new("I;16", (200, 100), 1000)
+        picture.paste(4000, (100, 0, 200, 100))
+        buffer = io.BytesIO()
+        picture.save(buffer, format="PNG")
+        image = Image.objects.create(
+            name="16-bit X-ray",
+            file=SimpleUploadedFile(name="x-ray.png", content=buffer.getvalue()),
+        )
+
+        response = self.client.get(
+            reverse("image-rendition", kwargs={"pk": image.pk}), {"w": 64}
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        rendition = PILImage.open(io.BytesIO(b"".join(response.streaming_content)))
+        # stretched over the range of the image instead of clipped to white
+        self.assertLess(rendition.getpixel((0, 0)), 10)
+        self.assertGreater(rendition.getpixel((63, 0)), 245)
+
+    def replace_file(self):
+        with open(constants.TEST_IMAGE_2_PATH, "rb") as image_file_2:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    reverse("image-detail", kwargs={"pk": self.image.pk}),
+                    {"file": image_file_2},
+                    format="multipart",
+                )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_renditions_dropped_when_file_replaced(self):
+        self.get_rendition(64)
+        path = self.rendition_path(64)
+
+        self.replace_file()
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_rendition_of_replaced_file_not_served(self):
+        # a rendition of the old file, finished after the file was replaced
+        self.replace_file()
+        renditions.get_rendition(self.image, 64)
+
+        with PILImage.open(constants.TEST_IMAGE_2_PATH) as new_picture:
+            expected_height = round(new_picture.height * 64 / new_picture.width)
+        self.assertAlmostEqual(expected_height, self.get_rendition(64).height, delta=1)
+
+    def test_renditions_dropped_when_image_deleted(self):
+        self.get_rendition(64)
+        directory = os.path.dirname(self.rendition_path(64))
+        self.image.delete()
+        # dropped by a background job
+        self.assertTrue(os.path.exists(directory))
+
+        work(threads=0, burst=True)
+        self.assertFalse(os.path.exists(directory))
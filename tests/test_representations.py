@@ -0,0 +1,147 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Prefetch
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from dent_image_api.models import Annotation, Image
+from dent_image_api.representations import (
+    ANNOTATION_VALUES,
+    IMAGE_VALUES,
+    ValuesListMixin,
+    annotation_representations,
+    image_representations,
+)
+from dent_image_api.serializers import AnnotationSerializer, ImageSerializer
+from tests import constants
+
+ANNOTATIONS = [
+    {
+        "class_id": "tooth",
+        "shape": {"start_x": 100, "start_y": 100, "end_x": 200, "end_y": 200},
+        "tags": ["48"],
+        "meta": {"confirmed": True, "confidence_percent": 0.99},
+    },
+    {
+        "class_id": "caries",
+        "shape": {"start_x": 5, "start_y": 40, "end_x": 1, "end_y": 2},
+        "tags": [36, "37"],
+        "meta": {},
+        "relations": [{"type": "inside", "id": 1}],
+        "surface": ["mesial", "occlusal"],
+    },
+    {
+        "class_id": "ünïcode",
+        "shape": {"start_x": 0, "start_y": 0, "end_x": 0, "end_y": 0},
+        "tags": [],
+        "meta": {"confirmed": False, "notes": {"nested": [1, 2.5, None]}},
+        "relations": None,
+        "surface": {},
+    },
+]
+
+
+class RepresentationParityTests(APITestCase):
+    """The `.values()` read path returns exactly what the serializers return."""
+
+    def setUp(self):
+        self.images = [self.create_image(name) for name in ("first", "second")]
+        for image in self.images:
+            for annotation in ANNOTATIONS:
+                Annotation.objects.create(image=image, **annotation)
+        self.create_image("without annotations")
+        self.request = Request(APIRequestFactory().get("/api/v1/images/"))
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def create_image(self, name):
+        return Image.objects.create(
+            name=name,
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+
+    def serialized_images(self, request=None):
+        queryset = Image.objects.order_by("id").prefetch_related(
+            Prefetch("annotations", queryset=Annotation.objects.order_by("id"))
+        )
+        return json.loads(
+            json.dumps(
+                ImageSerializer(queryset, many=True, context={"request": request}).data
+            )
+        )
+
+    def test_annotation_parity(self):
+        queryset = Annotation.objects.order_by("id")
+
+        self.assertEqual(
+            json.loads(json.dumps(AnnotationSerializer(queryset, many=True).data)),
+            annotation_representations(queryset.values(*ANNOTATION_VALUES)),
+        )
+
+    def test_image_parity(self):
+        rows = Image.objects.order_by("id").values(*IMAGE_VALUES)
+
+        self.assertEqual(
+            self.serialized_images(self.request),
+            image_representations(rows, self.request),
+        )
+
+    def test_image_parity_without_request(self):
+        rows = Image.objects.order_by("id").values(*IMAGE_VALUES)
+
+        self.assertEqual(self.serialized_images(), image_representations(rows))
+
+    def test_empty_rows(self):
+        self.assertEqual([], image_representations([], self.request))
+        self.assertEqual([], annotation_representations([]))
+
+    def test_default_represent_rows(self):
+        view = ValuesListMixin()
+        view.list_values = ("id", "name")
+        rows = Image.objects.order_by("id").values("id", "name", "width")
+
+        self.assertEqual(
+            list(Image.objects.order_by("id").values("id", "name")),
+            view.represent_rows(rows),
+        )
+
+    def test_image_list_endpoint_parity(self):
+        response = self.client.get(reverse("image-list"))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        self.assertEqual(
+            self.serialized_images(response.wsgi_request),
+            response.json()["results"],
+        )
+
+    def test_annotation_list_endpoint_parity(self):
+        image = self.images[1]
+        response = self.client.get(
+            reverse("image-annotations", kwargs={"image_id": image.pk})
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        serialized = AnnotationSerializer(
+            image.annotations.order_by("id"), many=True
+        ).data
+        self.assertEqual(json.loads(json.dumps(serialized)), response.json()["results"])
+
+    def test_list_matches_detail(self):
+        response = self.client.get(reverse("image-list"))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        for listed in response.json()["results"]:
+            detail = self.client.get(
+                reverse("image-detail", kwargs={"pk": listed["id"]})
+            ).json()
+            detail["annotations"].sort(key=lambda annotation: annotation["id"])
+            self.assertEqual(detail, listed)
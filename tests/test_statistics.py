@@ -0,0 +1,260 @@
+import json
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from dent_image_api.models import (
+    Annotation,
+    ClassStatistics,
+    Image,
+    ImageStatistics,
+    ImageStatisticsManager,
+)
+from tests import constants
+from tests.factories import annotation_payload
+
+
+class AnnotationStatisticsTests(APITestCase):
+    def setUp(self):
+        self.image = self.create_image()
+        self.other_image = self.create_image()
+        self.statistics_url = reverse("statistics")
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+
+    def create_image(self):
+        return Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+
+    def get_statistics(self, url=None):
+        url = url or self.statistics_url
+        response = self.client.get(url)
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"GET {url} failed. Response data: {response.data}",
+        )
+        return response.data
+
+    def get_class(self, statistics, class_id):
+        for entry in statistics["classes"]:
+            if entry["class_id"] == class_id:
+                return entry
+        return None
+
+    def assertConsistent(self):
+        """The incrementally maintained totals match a full recount."""
+        fields = ("class_id", "confirmed", "confidence_bucket", "count")
+        totals = set(ClassStatistics.objects.filter(count__gt=0).values_list(*fields))
+        per_image = set(ImageStatistics.objects.values_list("image_id", *fields))
+
+        call_command("rebuild_annotation_statistics", stdout=StringIO())
+
+        self.assertEqual(set(ClassStatistics.objects.values_list(*fields)), totals)
+        self.assertEqual(
+            set(ImageStatistics.objects.values_list("image_id", *fields)), per_image
+        )
+
+    def test_counts_by_class_confirmation_and_confidence(self):
+        Annotation.objects.create(image=self.image, **annotation_payload())
+        Annotation.objects.create(
+            image=self.image,
+            **annotation_payload(meta={"confirmed": False, "confidence_percent": 0.42}),
+        )
+        Annotation.objects.create(
+            image=self.other_image, **annotation_payload(class_id="caries", meta={})
+        )
+
+        statistics = self.get_statistics()
+
+        self.assertEqual(3, statistics["count"])
+        self.assertEqual(
+            ["caries", "tooth"], [c["class_id"] for c in statistics["classes"]]
+        )
+        tooth = self.get_class(statistics, "tooth")
+        self.assertEqual(2, tooth["count"])
+        self.assertEqual(1, tooth["confirmed"])
+        self.assertEqual(1, tooth["unconfirmed"])
+        self.assertEqual([0, 0, 0, 0, 1, 0, 0, 0, 0, 1], tooth["confidence_histogram"])
+        self.assertEqual(1, self.get_class(statistics, "caries")["unknown_confidence"])
+        self.assertConsistent()
+
+    def test_image_statistics(self):
+        Annotation.objects.create(image=self.image, **annotation_payload())
+        Annotation.objects.create(
+            image=self.other_image, **annotation_payload(class_id="caries")
+        )
+
+        statistics = self.get_statistics(
+            reverse("image-statistics", kwargs={"pk": self.image.pk})
+        )
+
+        self.assertEqual(1, statistics["count"])
+        self.assertEqual(["tooth"], [c["class_id"] for c in statistics["classes"]])
+
+    def test_annotation_writes_update_statistics(self):
+        annotation = Annotation.objects.create(image=self.image, **annotation_payload())
+        url = reverse(
+            "image-annotation-detail",
+            kwargs={"image_id": self.image.pk, "pk": annotation.pk},
+        )
+
+        response = self.client.patch(url, {"class_id": "caries"}, format="json")
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        statistics = self.get_statistics()
+        self.assertEqual(["caries"], [c["class_id"] for c in statistics["classes"]])
+
+        response = self.client.delete(url)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual(0, self.get_statistics()["count"])
+        self.assertConsistent()
+
+    def test_annotation_moved_to_another_image(self):
+        annotation = Annotation.objects.create(image=self.image, **annotation_payload())
+        list_urls = [
+            reverse("image-annotations", kwargs={"image_id": image.pk})
+            for image in (self.image, self.other_image)
+        ]
+        etags = [self.client.get(url)["ETag"] for url in list_urls]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse(
+                    "image-annotation-detail",
+                    kwargs={"image_id": self.image.pk, "pk": annotation.pk},
+                ),
+                {"image": self.other_image.pk},
+                format="json",
+            )
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+
+        self.assertEqual(1, self.get_statistics()["count"])
+        for image, count in ((self.image, 0), (self.other_image, 1)):
+            statistics = self.get_statistics(
+                reverse("image-statistics", kwargs={"pk": image.pk})
+            )
+            self.assertEqual(count, statistics["count"])
+        self.assertConsistent()
+
+        for url, etag, ids in zip(list_urls, etags, ([], [annotation.pk])):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(ids, [row["id"] for row in response.data["results"]])
+
+    def test_image_writes_update_statistics(self):
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            response = self.client.post(
+                reverse("image-list"),
+                {
+                    "name": "New Image",
+                    "file": image_file,
+                    "annotations": json.dumps(
+                        [annotation_payload(), annotation_payload(class_id="caries")]
+                    ),
+                },
+            )
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(2, self.get_statistics()["count"])
+
+        image_url = reverse("image-detail", kwargs={"pk": response.data["id"]})
+        kept = {
+            **annotation_payload(meta={"confirmed": False}),
+            "id": response.data["annotations"][0]["id"],
+        }
+        response = self.client.patch(image_url, {"annotations": [kept]}, format="json")
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        statistics = self.get_statistics()
+        self.assertEqual(1, statistics["count"])
+        self.assertEqual(1, statistics["classes"][0]["unconfirmed"])
+        self.assertConsistent()
+
+        response = self.client.delete(image_url)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual(0, self.get_statistics()["count"])
+        self.assertConsistent()
+
+    def test_statistics_do_not_read_annotations(self):
+        for _ in range(20):
+            Annotation.objects.create(image=self.image, **annotation_payload())
+
+        with self.assertNumQueries(1):
+            statistics = self.get_statistics()
+        self.assertEqual(20, statistics["count"])
+
+    def test_rebuild_repairs_statistics(self):
+        Annotation.objects.create(image=self.image, **annotation_payload())
+        ClassStatistics.objects.all().delete()
+        ImageStatistics.objects.all().delete()
+
+        call_command("rebuild_annotation_statistics", stdout=StringIO())
+
+        self.assertEqual(1, self.get_statistics()["count"])
+        self.assertEqual(
+            1,
+            self.get_statistics(
+                reverse("image-statistics", kwargs={"pk": self.image.pk})
+            )["count"],
+        )
+
+
+class ConcurrentStatisticsTests(TransactionTestCase):
+    refresh = ImageStatisticsManager.refresh
+
+    def setUp(self):
+        self.image = Image.objects.create(name="Test Image", file="images/x-ray.jpg")
+
+    def test_concurrent_annotation_writes(self):
+        url = reverse("image-annotations", kwargs={"image_id": self.image.pk})
+        threads = 4
+        barrier = threading.Barrier(threads)
+        statuses = []
+
+        def post_annotation():
+            try:
+                barrier.wait(10)
+                response = APIClient().post(
+                    url, {"image": self.image.pk, **annotation_payload()}, format="json"
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        with mock.patch.object(
+            ImageStatisticsManager,
+            "refresh",
+            autospec=True,
+            side_effect=self.refresh_in_transaction,
+        ):
+            workers = [threading.Thread(target=post_annotation) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual([status.HTTP_201_CREATED] * threads, statuses)
+        self.assertEqual(threads, ClassStatistics.objects.get().count)
+        self.assertEqual(threads, ImageStatistics.objects.get().count)
+
+    @classmethod
+    def refresh_in_transaction(cls, manager, image_ids):
+        assert connection.in_atomic_block, "statistics refreshed in autocommit"
+        # gives the other writers the time to read the same statistics rows
+        time.sleep(0.05)
+        cls.refresh(manager, image_ids)
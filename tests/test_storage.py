@@ -0,0 +1,248 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api.jobs import work
+from dent_image_api.models import Image, Job, StoredFile
+from dent_image_api.storage import ContentAddressedStorage, HashedDirectoryStorage
+from tests import constants
+
+
+class StoredFileTests(APITestCase):
+    def setUp(self):
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        self.storage = self.image.file.storage
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+        work(threads=0, burst=True)
+
+    def test_file_referenced_once(self):
+        self.assertEqual(1, StoredFile.objects.get(name=self.image.file.name).ref_count)
+
+    def test_replaced_file_deleted(self):
+        old_name = self.image.file.name
+        with open(constants.TEST_IMAGE_2_PATH, "rb") as image_file_2:
+            response = self.client.patch(
+                reverse("image-detail", kwargs={"pk": self.image.pk}),
+                {"file": image_file_2},
+                format="multipart",
+            )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        work(threads=0, burst=True)
+        self.assertFalse(self.storage.exists(old_name))
+        self.assertFalse(StoredFile.objects.filter(name=old_name).exists())
+
+    def test_deleted_image_file_deleted(self):
+        name = self.image.file.name
+        response = self.client.delete(
+            reverse("image-detail", kwargs={"pk": self.image.pk})
+        )
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        work(threads=0, burst=True)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_file_kept_until_job_runs(self):
+        name = self.image.file.name
+        self.image.delete()
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(
+            Job.objects.filter(
+                task="delete_stored_file", payload={"name": name}
+            ).exists()
+        )
+
+        work(threads=0, burst=True)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_file_kept_when_transaction_rolls_back(self):
+        name = self.image.file.name
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Image.objects.get(pk=self.image.pk).delete()
+            raise RuntimeError
+
+        self.assertFalse(Job.objects.exists())
+        work(threads=0, burst=True)
+        self.assertTrue(self.storage.exists(name))
+
+
+class ContentAddressedStorageTests(APITestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.file_field = Image._meta.get_field("file")
+        self.default_storage = self.file_field.storage
+        self.file_field.storage = ContentAddressedStorage(location=self.location)
+
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            self.content = image_file.read()
+        content_hash = hashlib.sha256(self.content).hexdigest()
+        self.content_name = (
+            f"images/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.jpeg"
+        )
+
+    def tearDown(self):
+        self.file_field.storage = self.default_storage
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def upload(self, name):
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            response = self.client.post(
+                reverse("image-list"), {"name": name, "file": image_file}
+            )
+        self.assertEqual(
+            status.HTTP_201_CREATED,
+            response.status_code,
+            msg=f"Failed to upload image. Response data: {response.data}",
+        )
+        return Image.objects.get(pk=response.data["id"])
+
+    def test_duplicate_uploads_share_file(self):
+        first = self.upload("First")
+        second = self.upload("Second")
+
+        self.assertEqual(self.content_name, first.file.name)
+        self.assertEqual(self.content_name, second.file.name)
+        self.assertEqual(2, StoredFile.objects.get(name=self.content_name).ref_count)
+
+    def test_upload_hashed_while_streaming(self):
+        with mock.patch.object(
+            ContentAddressedStorage, "_hash", side_effect=AssertionError
+        ):
+            image = self.upload("Streamed")
+        self.assertEqual(self.content_name, image.file.name)
+
+    def test_shared_file_deleted_with_last_reference(self):
+        first = self.upload("First")
+        second = self.upload("Second")
+        storage = self.file_field.storage
+
+        first.delete()
+        work(threads=0, burst=True)
+        self.assertTrue(storage.exists(self.content_name))
+        self.assertEqual(1, StoredFile.objects.get(name=self.content_name).ref_count)
+
+        second.delete()
+        work(threads=0, burst=True)
+        self.assertFalse(storage.exists(self.content_name))
+        self.assertFalse(StoredFile.objects.filter(name=self.content_name).exists())
+
+    def test_shared_file_deleted_while_uploaded_again(self):
+        first = self.upload("First")
+        first.delete()
+        storage = self.file_field.storage
+        acquire = StoredFile.objects.acquire
+
+        def acquire_after_deletion(name):
+            # the deletion job ran between the storage finding the file and acquire()
+            work(threads=0, burst=True)
+            self.assertFalse(storage.exists(name))
+            acquire(name)
+
+        with mock.patch.object(
+            StoredFile.objects, "acquire", side_effect=acquire_after_deletion
+        ):
+            second = self.upload("Second")
+
+        self.assertEqual(self.content_name, second.file.name)
+        self.assertTrue(storage.exists(self.content_name))
+        self.assertEqual(1, StoredFile.objects.get(name=self.content_name).ref_count)
+
+    def test_hash_computed_without_upload_handler(self):
+        image = Image.objects.create(
+            name="Direct",
+            file=SimpleUploadedFile(
+                name="direct.JPEG", content=self.content, content_type="image/jpeg"
+            ),
+        )
+        self.assertEqual(self.content_name, image.file.name)
+
+
+class HashedDirectoryStorageTests(APITestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.file_field = Image._meta.get_field("file")
+        self.default_storage = self.file_field.storage
+        self.file_field.storage = FileSystemStorage(location=self.location)
+        self.images = [
+            Image.objects.create(
+                name=f"Image {index}",
+                file=SimpleUploadedFile(
+                    name=f"image_{index}.jpg",
+                    content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                    content_type="image/jpeg",
+                ),
+            )
+            for index in range(3)
+        ]
+
+    def tearDown(self):
+        self.file_field.storage = self.default_storage
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def test_layout_name(self):
+        storage = HashedDirectoryStorage(location=self.location)
+        names = [storage.generate_filename("images/x-ray.jpeg") for _ in range(10)]
+
+        for name in names:
+            self.assertRegex(name, r"^images/[0-9a-f]{2}/[0-9a-f]{2}/x-ray.jpeg$")
+            self.assertTrue(storage.in_layout(name))
+            self.assertEqual(name, storage.layout_name(name))
+        # files of the same name are spread like any others
+        self.assertGreater(len({os.path.dirname(name) for name in names}), 1)
+
+        flat_name = storage.layout_name("images/x-ray.jpeg")
+        self.assertRegex(flat_name, r"^images/[0-9a-f]{2}/[0-9a-f]{2}/x-ray.jpeg$")
+        self.assertEqual(flat_name, storage.layout_name("images/x-ray.jpeg"))
+
+    def test_migrate_image_layout(self):
+        flat_names = [image.file.name for image in self.images]
+        storage = HashedDirectoryStorage(location=self.location)
+        self.file_field.storage = storage
+
+        call_command(
+            "migrate_image_layout",
+            batch_size=2,
+            start_after=self.images[0].pk,
+            stdout=io.StringIO(),
+        )
+        work(threads=0, burst=True)
+
+        for image, flat_name in zip(self.images, flat_names):
+            version = image.version
+            image.refresh_from_db()
+            if image == self.images[0]:
+                self.assertEqual(flat_name, image.file.name)
+                self.assertEqual(version, image.version)
+                continue
+            self.assertEqual(version + 1, image.version)
+            self.assertEqual(storage.layout_name(flat_name), image.file.name)
+            self.assertTrue(storage.exists(image.file.name))
+            self.assertFalse(storage.exists(flat_name))
+            self.assertEqual(1, StoredFile.objects.get(name=image.file.name).ref_count)
+
+        output = io.StringIO()
+        call_command("migrate_image_layout", stdout=output)
+        self.assertIn("Done, 1 images moved.", output.getvalue())
+
+    def test_migrate_image_layout_requires_hashed_storage(self):
+        with self.assertRaises(CommandError):
+            call_command("migrate_image_layout", stdout=io.StringIO())
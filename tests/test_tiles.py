@@ -0,0 +1,155 @@
+import fcntl
+import io
+import math
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api import tiles
+from dent_image_api.models import Image
+from tests import constants
+
+
+class TileTests(APITestCase):
+    def setUp(self):
+        self.tiles_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            IMAGE_TILES_ROOT=self.tiles_root, IMAGE_TILE_SIZE=256
+        )
+        self.settings_override.enable()
+
+        self.image = Image.objects.create(
+            name="Test Image",
+            file=SimpleUploadedFile(
+                name="test_image.jpg",
+                content=open(constants.TEST_IMAGE_PATH, "rb").read(),
+                content_type="image/jpeg",
+            ),
+        )
+        with PILImage.open(constants.TEST_IMAGE_PATH) as original:
+            self.width, self.height = original.size
+        self.max_level = math.ceil(math.log2(max(self.width, self.height)))
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+        self.settings_override.disable()
+        shutil.rmtree(self.tiles_root, ignore_errors=True)
+
+    def tile_url(self, level, x, y):
+        return reverse(
+            "image-tile",
+            kwargs={"pk": self.image.pk, "level": level, "x": x, "y": y},
+        )
+
+    def get_tile(self, level, x, y):
+        response = self.client.get(self.tile_url(level, x, y))
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"Failed to get tile {level}/{x}/{y}. Response: {response}",
+        )
+        self.assertEqual("image/jpeg", response["Content-Type"])
+        return PILImage.open(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_get_pyramid(self):
+        response = self.client.get(reverse("image-tiles", kwargs={"pk": self.image.pk}))
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code,
+            msg=f"Failed to get tile pyramid. Response data: {response.data}",
+        )
+        self.assertEqual(
+            {
+                "width": self.width,
+                "height": self.height,
+                "tile_size": 256,
+                "levels": self.max_level + 1,
+                "format": "jpg",
+            },
+            response.data,
+        )
+
+    def test_get_tiles(self):
+        self.assertEqual((256, 256), self.get_tile(self.max_level, 0, 0).size)
+
+        last_x, last_y = self.width // 256, self.height // 256
+        self.assertEqual(
+            (self.width - last_x * 256, self.height - last_y * 256),
+            self.get_tile(self.max_level, last_x, last_y).size,
+        )
+
+        self.assertEqual((1, 1), self.get_tile(0, 0, 0).size)
+
+    def test_get_missing_tile(self):
+        for level, x, y in [
+            (self.max_level, self.width // 256 + 1, 0),
+            (self.max_level + 1, 0, 0),
+            (0, 0, 1),
+        ]:
+            response = self.client.get(self.tile_url(level, x, y))
+            self.assertEqual(
+                status.HTTP_404_NOT_FOUND,
+                response.status_code,
+                msg=f"Tile {level}/{x}/{y} unexpectedly found.",
+            )
+
+    @override_settings(IMAGE_TILES_ENABLED=False)
+    def test_tiles_disabled(self):
+        response = self.client.get(self.tile_url(0, 0, 0))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_tiles_dropped_when_file_replaced(self):
+        self.get_tile(0, 0, 0)
+        with open(constants.TEST_IMAGE_2_PATH, "rb") as image_file_2:
+            # dropped once the new file is committed
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    reverse("image-detail", kwargs={"pk": self.image.pk}),
+                    {"file": image_file_2},
+                    format="multipart",
+                )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        with PILImage.open(constants.TEST_IMAGE_2_PATH) as replacement:
+            expected_size = (min(replacement.width, 256), min(replacement.height, 256))
+        top_level = math.ceil(math.log2(max(replacement.size)))
+        self.assertEqual(expected_size, self.get_tile(top_level, 0, 0).size)
+
+    def test_tiles_of_replaced_file_not_served(self):
+        with open(constants.TEST_IMAGE_2_PATH, "rb") as image_file_2:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(
+                    reverse("image-detail", kwargs={"pk": self.image.pk}),
+                    {"file": image_file_2},
+                    format="multipart",
+                )
+        # a pyramid of the old file, finished after the file was replaced
+        tiles.get_pyramid(self.image)
+
+        response = self.client.get(reverse("image-tiles", kwargs={"pk": self.image.pk}))
+        with PILImage.open(constants.TEST_IMAGE_2_PATH) as replacement:
+            self.assertEqual(replacement.width, response.data["width"])
+
+    def test_pyramid_built_by_another_request(self):
+        image = Image.objects.get(pk=self.image.pk)
+        lock_path = f"{tiles._pyramid_directory(image)}.lock"
+        os.makedirs(os.path.dirname(lock_path))
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            responses = [
+                self.client.get(reverse("image-tiles", kwargs={"pk": self.image.pk})),
+                self.client.get(self.tile_url(0, 0, 0)),
+            ]
+
+        for response in responses:
+            self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+            self.assertEqual("1", response["Retry-After"])
+        self.assertEqual((1, 1), self.get_tile(0, 0, 0).size)
@@ -0,0 +1,258 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import DatabaseError
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from dent_image_api import uploads
+from dent_image_api.jobs import work
+from dent_image_api.models import Image, Job, UploadSession
+from tests import constants
+
+
+class UploadTests(APITestCase):
+    def setUp(self):
+        self.upload_root = tempfile.mkdtemp()
+        settings_override = override_settings(UPLOAD_SESSION_ROOT=self.upload_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with open(constants.TEST_IMAGE_PATH, "rb") as image_file:
+            self.data = image_file.read()
+
+    def tearDown(self):
+        for image in Image.objects.all():
+            image.delete()
+        shutil.rmtree(self.upload_root, ignore_errors=True)
+
+    def start(self, **data):
+        response = self.client.post(
+            reverse("uploadsession-list"),
+            {"filename": "x-ray.jpeg", "size": len(self.data), **data},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, response.data)
+        return response.data["id"]
+
+    def put_chunk(self, session_id, start, end, body=None, size=None):
+        return self.client.put(
+            reverse("uploadsession-detail", kwargs={"pk": session_id}),
+            self.data[start : end + 1] if body is None else body,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{size or len(self.data)}",
+        )
+
+    def upload(self, session_id, chunk_size=1000):
+        for start in range(0, len(self.data), chunk_size):
+            end = min(start + chunk_size, len(self.data)) - 1
+            response = self.put_chunk(session_id, start, end)
+            self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        return response
+
+    def finalize(self, session_id, data=None, **headers):
+        return self.client.post(
+            reverse("uploadsession-finalize", kwargs={"pk": session_id}),
+            data or {},
+            format="json",
+            **headers,
+        )
+
+    def test_new_image(self):
+        session_id = self.start()
+
+        response = self.upload(session_id)
+        self.assertEqual(len(self.data), response.data["offset"])
+
+        # the partial file is removed once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.finalize(session_id, {"name": "X-ray"})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, response.data)
+        image = Image.objects.get(pk=response.data["id"])
+        self.assertEqual("X-ray", image.name)
+        with image.file.open("rb") as stored:
+            self.assertEqual(self.data, stored.read())
+        self.assertEqual(hashlib.sha256(self.data).hexdigest(), image.content_hash)
+        self.assertEqual(len(self.data), image.byte_size)
+        self.assertIsNotNone(image.width)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual([], os.listdir(self.upload_root))
+
+    def test_hashed_again_without_the_hash_state(self):
+        session_id = self.start()
+        self.upload(session_id)
+        # the last chunk was received by another process
+        uploads._hashers.clear()
+
+        response = self.finalize(session_id, {"name": "X-ray"})
+
+        self.assertEqual(
+            hashlib.sha256(self.data).hexdigest(), response.data["content_hash"]
+        )
+
+    def test_resume(self):
+        session_id = self.start()
+        url = reverse("uploadsession-detail", kwargs={"pk": session_id})
+        self.put_chunk(session_id, 0, 999)
+
+        # a chunk cut short is not counted, and overwritten by the next one
+        response = self.put_chunk(session_id, 1000, 1999, body=self.data[1000:1500])
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(1000, self.client.get(url).data["offset"])
+
+        response = self.put_chunk(session_id, 2000, 2999)
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        self.assertEqual(1000, response.data["offset"])
+
+        self.put_chunk(session_id, 1000, len(self.data) - 1)
+        response = self.finalize(session_id, {"name": "X-ray"})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        with Image.objects.get(pk=response.data["id"]).file.open("rb") as stored:
+            self.assertEqual(self.data, stored.read())
+
+    def test_invalid_chunks(self):
+        session_id = self.start()
+
+        for headers in ({}, {"HTTP_CONTENT_RANGE": "bytes 10-0/*"}):
+            response = self.client.put(
+                reverse("uploadsession-detail", kwargs={"pk": session_id}),
+                b"data",
+                content_type="application/octet-stream",
+                **headers,
+            )
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+        response = self.put_chunk(session_id, 0, 9, size=10)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = self.put_chunk(session_id, 0, len(self.data), body=self.data + b".")
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_chunk_while_another_is_received(self):
+        session_id = self.start()
+        self.put_chunk(session_id, 0, 999)
+
+        with open(uploads.partial_path(session_id), "rb") as partial_file:
+            fcntl.flock(partial_file.fileno(), fcntl.LOCK_EX)
+            response = self.put_chunk(session_id, 1000, 1999)
+
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        self.assertEqual(1000, response.data["offset"])
+        response = self.put_chunk(session_id, 1000, 1999)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_partial_file_missing(self):
+        session_id = self.start()
+        self.put_chunk(session_id, 0, 999)
+        os.remove(uploads.partial_path(session_id))
+
+        response = self.put_chunk(session_id, 1000, 1999)
+        self.assertEqual(status.HTTP_410_GONE, response.status_code)
+
+        UploadSession.objects.filter(pk=session_id).update(offset=len(self.data))
+        response = self.finalize(session_id, {"name": "X-ray"})
+        self.assertEqual(status.HTTP_410_GONE, response.status_code)
+        self.assertFalse(Image.objects.exists())
+
+    def test_finalize_again_after_failure(self):
+        session_id = self.start()
+        self.upload(session_id)
+        stored_names = []
+
+        def save_and_fail(image, *args, **kwargs):
+            save(image, *args, **kwargs)
+            stored_names.append(image.file.name)
+            raise DatabaseError("lost connection")
+
+        save = Image.save
+        with mock.patch.object(Image, "save", autospec=True, side_effect=save_and_fail):
+            with self.assertRaises(DatabaseError):
+                uploads.finalize_session(session_id, "X-ray")
+
+        storage = Image._meta.get_field("file").storage
+        self.assertFalse(storage.exists(stored_names[0]))
+        self.assertTrue(os.path.exists(uploads.partial_path(session_id)))
+
+        response = self.finalize(session_id, {"name": "X-ray"})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, response.data)
+        with Image.objects.get(pk=response.data["id"]).file.open("rb") as stored:
+            self.assertEqual(self.data, stored.read())
+
+    def test_finalize_incomplete(self):
+        session_id = self.start()
+        self.put_chunk(session_id, 0, 999)
+
+        response = self.finalize(session_id, {"name": "X-ray"})
+
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        self.assertEqual(1000, response.data["offset"])
+
+    def test_not_an_image(self):
+        self.data = b"not an image"
+        session_id = self.start()
+        self.upload(session_id)
+
+        response = self.finalize(session_id, {"name": "X-ray"})
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("file", response.data)
+        self.assertFalse(Image.objects.exists())
+
+    def test_not_an_image_extension(self):
+        response = self.client.post(
+            reverse("uploadsession-list"),
+            {"filename": "x-ray.exe", "size": 10},
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("filename", response.data)
+
+    def test_replace_image_file(self):
+        image = Image.objects.create(
+            name="X-ray", file=ContentFile(b"old", name="x-ray.png")
+        )
+        session_id = self.start(image=image.pk)
+        self.upload(session_id)
+
+        response = self.finalize(session_id, HTTP_IF_MATCH='"99-json"')
+        self.assertEqual(status.HTTP_412_PRECONDITION_FAILED, response.status_code)
+
+        response = self.finalize(session_id, HTTP_IF_MATCH=f'"{image.version}-json"')
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        image.refresh_from_db()
+        self.assertEqual(f'"{image.version}-json"', response["ETag"])
+        self.assertEqual("X-ray", image.name)
+        self.assertEqual(hashlib.sha256(self.data).hexdigest(), image.content_hash)
+
+    def test_abort(self):
+        session_id = self.start()
+        self.put_chunk(session_id, 0, 999)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse("uploadsession-detail", kwargs={"pk": session_id})
+            )
+
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual([], os.listdir(self.upload_root))
+
+    def test_expired(self):
+        session_id = self.start()
+        self.put_chunk(session_id, 0, 999)
+
+        self.assertEqual({"run": 0, "failed": 0}, work(threads=0, burst=True))
+        Job.objects.update(run_at=timezone.now())
+        work(threads=0, burst=True)
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual([], os.listdir(self.upload_root))
+        response = self.put_chunk(session_id, 1000, 1999)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)